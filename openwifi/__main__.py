@@ -8,6 +8,7 @@ Runs Open WiFi Server.
 
 import argparse
 import logging
+import os
 import sys
 
 import openwifi.__version__
@@ -21,6 +22,28 @@ except ImportError as ex:
     sys.exit(openwifi.helpers.exit_codes.EX_SOFTWARE)
 
 
+def positive_int(value):
+    """
+    Parses a positive integer argument.
+    """
+
+    value = int(value)
+    if value < 1:
+        raise argparse.ArgumentTypeError("should be positive: %s" % value)
+    return value
+
+
+def non_negative_int(value):
+    """
+    Parses a non-negative integer argument.
+    """
+
+    value = int(value)
+    if value < 0:
+        raise argparse.ArgumentTypeError("should not be negative: %s" % value)
+    return value
+
+
 parser = argparse.ArgumentParser(
     prog="python3 -m openwifi",
     description=globals()["__doc__"],
@@ -65,6 +88,124 @@ parser.add_argument(
     help="database name",
     metavar="DATABASE_NAME",
 )
+parser.add_argument(
+    "--workers",
+    default=0,
+    dest="workers",
+    help="number of worker processes (0 serves in the main process)",
+    metavar="COUNT",
+    type=non_negative_int,
+)
+parser.add_argument(
+    "--db-pool-size",
+    default=8,
+    dest="db_pool_size",
+    help="number of database connections and worker threads",
+    metavar="SIZE",
+    type=int,
+)
+parser.add_argument(
+    "--db-queue-size",
+    default=256,
+    dest="db_queue_size",
+    help="maximum number of queued database calls",
+    metavar="SIZE",
+    type=int,
+)
+parser.add_argument(
+    "--max-upload-size",
+    default=64 * 1024 * 1024,
+    dest="max_upload_size",
+    help="maximum size of an uploaded request body in bytes, also after decompression",
+    metavar="SIZE",
+    type=int,
+)
+parser.add_argument(
+    "--merge-window",
+    default=0,
+    dest="merge_window",
+    help="merge sightings of a BSSID by a client in windows of this number of seconds (0 disables merging)",
+    metavar="SECONDS",
+    type=float,
+)
+parser.add_argument(
+    "--merge-distance",
+    default=50,
+    dest="merge_distance",
+    help="maximum distance between merged sightings in meters",
+    metavar="METERS",
+    type=float,
+)
+parser.add_argument(
+    "--redis-url",
+    default="redis://localhost:6379/0",
+    dest="redis_url",
+    help="Redis URL",
+    metavar="URL",
+)
+parser.add_argument(
+    "--redis-pool-size",
+    default=32,
+    dest="redis_pool_size",
+    help="maximum number of Redis connections per process",
+    metavar="SIZE",
+    type=int,
+)
+parser.add_argument(
+    "--redis-timeout",
+    default=0.5,
+    dest="redis_timeout",
+    help="Redis connection and socket timeout in seconds",
+    metavar="SECONDS",
+    type=float,
+)
+parser.add_argument(
+    "--local-cache-size",
+    default=10000,
+    dest="local_cache_size",
+    help="number of authentication tokens kept in the in-process cache",
+    metavar="SIZE",
+    type=int,
+)
+parser.add_argument(
+    "--ingest-queue-depth",
+    default=0,
+    dest="ingest_queue_depth",
+    help="maximum number of upload batches queued for background insertion (0 inserts synchronously)",
+    metavar="DEPTH",
+    type=int,
+)
+parser.add_argument(
+    "--get-rate-limit",
+    default=0,
+    dest="get_rate_limit",
+    help="synchronization pages of 1024 scan results or tiles per second per client and per user (0 is unlimited)",
+    metavar="RATE",
+    type=float,
+)
+parser.add_argument(
+    "--post-rate-limit",
+    default=0,
+    dest="post_rate_limit",
+    help="uploaded scan results per second per client and per user (0 is unlimited)",
+    metavar="RATE",
+    type=float,
+)
+parser.add_argument(
+    "--rate-limit-burst",
+    default=60,
+    dest="rate_limit_burst",
+    help="number of seconds of the rate limit that may be used at once",
+    metavar="SECONDS",
+    type=float,
+)
+parser.add_argument(
+    "--token-info-url",
+    default="https://www.googleapis.com/oauth2/v1/tokeninfo",
+    dest="token_info_url",
+    help="authentication token verification endpoint",
+    metavar="URL",
+)
 mode_group = parser.add_mutually_exclusive_group()
 mode_group.add_argument(
     "--fork",
@@ -79,6 +220,70 @@ mode_group.add_argument(
     dest="cleanup_db",
     help="delete old scan results from the database",
 )
+mode_group.add_argument(
+    "--backfill-statistics",
+    action="store_true",
+    dest="backfill_statistics",
+    help="seed the statistics counters from the database",
+)
+mode_group.add_argument(
+    "--backfill-networks",
+    action="store_true",
+    dest="backfill_networks",
+    help="rebuild the networks collection from the scan results",
+)
+mode_group.add_argument(
+    "--build-snapshots",
+    action="store_true",
+    dest="build_snapshots",
+    help="write dataset snapshots for the initial client synchronization",
+)
+parser.add_argument(
+    "--snapshots-path",
+    default=os.path.abspath("snapshots"),
+    dest="snapshots_path",
+    help="dataset snapshots directory",
+    metavar="PATH",
+)
+parser.add_argument(
+    "--snapshot-interval",
+    default=0,
+    dest="snapshot_interval",
+    help="repeat building snapshots with this interval in seconds (0 builds once)",
+    metavar="SECONDS",
+    type=float,
+)
+parser.add_argument(
+    "--cleanup-keep",
+    default=3,
+    dest="cleanup_keep",
+    help="number of the most recent scan results to keep per BSSID",
+    metavar="COUNT",
+    type=positive_int,
+)
+parser.add_argument(
+    "--cleanup-batch-size",
+    default=10000,
+    dest="cleanup_batch_size",
+    help="number of scan results scanned per cleanup batch",
+    metavar="SIZE",
+    type=positive_int,
+)
+parser.add_argument(
+    "--cleanup-rate",
+    default=0,
+    dest="cleanup_rate",
+    help="maximum number of scan results scanned per second (0 is unlimited)",
+    metavar="RATE",
+    type=int,
+)
+parser.add_argument(
+    "--cleanup-continuous",
+    action="store_true",
+    dest="cleanup_continuous",
+    default=False,
+    help="repeat cleanup passes forever",
+)
 parser.add_argument(
     "--enable-gzip",
     action="store_true",
@@ -86,6 +291,21 @@ parser.add_argument(
     default=False,
     help="enable GZip compression for HTTP(S)",
 )
+parser.add_argument(
+    "--enable-spatial-index",
+    action="store_true",
+    dest="enable_spatial_index",
+    default=False,
+    help="keep the networks in memory for the nearest networks and position queries",
+)
+parser.add_argument(
+    "--locate-cache-size",
+    default=10000,
+    dest="locate_cache_size",
+    help="number of position estimates kept in the in-process cache",
+    metavar="SIZE",
+    type=int,
+)
 
 
 try:
@@ -96,7 +316,7 @@ try:
         level=getattr(logging, args.log_level),
         stream=args.log_file,
     )
-    logging.getLogger("requests").setLevel(logging.WARNING)
+    logging.getLogger("tornado.curl_httpclient").setLevel(logging.WARNING)
     # Run the main function.
     logging.getLogger(__name__).info(
         "Starting Open WiFi server %s ...",
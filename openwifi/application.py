@@ -3,19 +3,35 @@
 
 import logging
 import os
+import signal
 import sys
 
 import pymongo
 import pymongo.database
 
-import redis
-
+import tornado.httpclient
 import tornado.httpserver
 import tornado.ioloop
 import tornado.locale
+import tornado.netutil
 
+import openwifi.helpers.cache
+import openwifi.helpers.executor
 import openwifi.helpers.exit_codes
+import openwifi.helpers.ingest_queue
+import openwifi.helpers.ingestor
+import openwifi.helpers.json_codec
+import openwifi.helpers.locator
+import openwifi.helpers.metrics
+import openwifi.helpers.networks
+import openwifi.helpers.rate_limiter
+import openwifi.helpers.spatial_index
+import openwifi.helpers.watermark
 import openwifi.static
+import openwifi.supervisor
+import openwifi.utils.backfill_networks
+import openwifi.utils.backfill_statistics
+import openwifi.utils.build_snapshots
 import openwifi.utils.cleanup_db
 import openwifi.web.web_application
 
@@ -25,13 +41,22 @@ class Application:
     Open WiFi Server application.
     """
 
+    # Time given to in-flight requests on shutdown in seconds.
+    _STOP_DELAY = 5.0
+    # Interval of publishing metrics in seconds.
+    _METRICS_PUBLISH_INTERVAL = 5.0
+    # Interval of checking the watermark against the database in seconds.
+    _WATERMARK_REFRESH_INTERVAL = 5.0
+    # Interval of retrying failed tile invalidations in seconds.
+    _TILES_FLUSH_INTERVAL = 5.0
+
     def __init__(self):
         self._logger = logging.getLogger(Application.__name__)
 
     def main(self, args):
         # Initializing the database connection.
         self._logger.info("Connecting to the database ...")
-        mongo_client = pymongo.MongoClient()
+        mongo_client = pymongo.MongoClient(max_pool_size=args.db_pool_size)
         db = pymongo.database.Database(mongo_client, args.database_name)
         self._logger.info("Creating indexes ...")
         db.scan_results.ensure_index([
@@ -48,56 +73,206 @@ class Application:
             # For micro-synchronization feature.
             ("loc", pymongo.GEO2D),
         ])
+        # For walking scan results BSSID by BSSID.
+        db.scan_results.ensure_index(openwifi.utils.cleanup_db.CleanupDB.INDEX)
+        # For networks synchronization.
+        db.networks.ensure_index(openwifi.helpers.networks.SEQ_INDEX)
         # Check for cleanup mode.
         if args.cleanup_db:
-            return openwifi.utils.cleanup_db.CleanupDB().main(args, db=db)
-        # Initializing the cache.
-        cache = redis.StrictRedis()
-        # Initializing the web application.
-        self._logger.info("Initializing the web application ...")
-        web_application = openwifi.web.web_application.WebApplication(
-            db,
-            cache,
-            enable_gzip=args.enable_gzip,
-        )
-        # Set up HTTP server.
+            cache = self._connect_cache(args)
+            return openwifi.utils.cleanup_db.CleanupDB().main(args, db=db, cache=cache)
+        # Check for snapshots mode.
+        if args.build_snapshots:
+            return openwifi.utils.build_snapshots.BuildSnapshots().main(args, db=db)
+        # Check for statistics backfill mode.
+        if args.backfill_statistics:
+            cache = self._connect_cache(args)
+            return openwifi.utils.backfill_statistics.BackfillStatistics().main(args, db=db, cache=cache)
+        # Check for networks backfill mode.
+        if args.backfill_networks:
+            return openwifi.utils.backfill_networks.BackfillNetworks().main(args, db=db)
+        # Connections are made again by the serving process.
+        mongo_client.close()
+        # Bind sockets.
         self._logger.info("HTTP port %s.", args.http_port)
-        http_server = tornado.httpserver.HTTPServer(web_application)
-        http_server.listen(args.http_port, address="127.0.0.1")
-        # Set up HTTPS server if possible.
+        http_sockets = tornado.netutil.bind_sockets(args.http_port, address="127.0.0.1")
+        # Bind HTTPS sockets if possible.
         application_path = os.path.abspath(os.path.dirname(__file__))
         certificate_path, key_path = (
             os.path.join(application_path, "cacert.pem"),
             os.path.join(application_path, "privkey.pem"),
         )
         if args.https_port and certificate_path and key_path:
-            https_server = tornado.httpserver.HTTPServer(
-                web_application,
-                ssl_options={
-                    "certfile": certificate_path,
-                    "keyfile": key_path,
-                },
-            )
             self._logger.info("HTTPS port: %s.", args.https_port)
-            https_server.listen(args.https_port, address="127.0.0.1")
+            https_sockets = tornado.netutil.bind_sockets(args.https_port, address="127.0.0.1")
+            ssl_options = {
+                "certfile": certificate_path,
+                "keyfile": key_path,
+            }
         else:
             self._logger.info("Not using HTTPS.")
+            https_sockets, ssl_options = [], None
         # Load translations.
         self._logger.info("Loading translations ...")
         tornado.locale.load_translations(
             os.path.join(os.path.dirname(openwifi.static.__file__), "translations"),
         )
         tornado.locale.set_default_locale("en")
+        # Fail before forking if the HTTP client is unavailable.
+        self._configure_http_client()
         # Fork if requested.
         if args.fork:
             self._fork()
+        # Run worker processes if requested.
+        if args.workers:
+            return openwifi.supervisor.Supervisor(
+                args.workers,
+                lambda: self._serve(args, http_sockets, https_sockets, ssl_options),
+            ).main()
+        return self._serve(args, http_sockets, https_sockets, ssl_options)
+
+    def _serve(self, args, http_sockets, https_sockets, ssl_options):
+        """
+        Serves requests on the bound sockets until stopped.
+        """
+
+        # Initializing the database connection.
+        mongo_client = pymongo.MongoClient(max_pool_size=args.db_pool_size)
+        db = pymongo.database.Database(mongo_client, args.database_name)
+        # Initializing the cache.
+        cache = self._connect_cache(args)
+        # Initializing the database executor.
+        executor = openwifi.helpers.executor.BoundedExecutor(
+            args.db_pool_size,
+            args.db_queue_size,
+        )
+        # Initializing the ingestion.
+        watermark = openwifi.helpers.watermark.Watermark(cache)
+        watermark.seed(db)
+        ingestor = openwifi.helpers.ingestor.Ingestor(db, cache, args.merge_window, args.merge_distance)
+        ingestor.add_hook(watermark.update)
+        if args.ingest_queue_depth:
+            self._logger.info("Write-behind ingestion, maximum queue depth: %s.", args.ingest_queue_depth)
+            ingest_queue = openwifi.helpers.ingest_queue.IngestQueue(cache.redis, args.ingest_queue_depth)
+            ingest_consumer = openwifi.helpers.ingest_queue.IngestConsumer(ingest_queue, ingestor)
+            ingest_consumer.start()
+        else:
+            ingest_queue = ingest_consumer = None
+        # Initializing the rate limiter.
+        rate_limiter = openwifi.helpers.rate_limiter.RateLimiter(cache, {
+            "get": (args.get_rate_limit, args.get_rate_limit * args.rate_limit_burst),
+            "post": (args.post_rate_limit, args.post_rate_limit * args.rate_limit_burst),
+        })
+        # Initializing the spatial index.
+        if args.enable_spatial_index:
+            spatial_index = openwifi.helpers.spatial_index.SpatialIndex()
+            spatial_index_loader = openwifi.helpers.spatial_index.SpatialIndexLoader(db, spatial_index)
+            spatial_index_loader.start()
+            locator = openwifi.helpers.locator.Locator(spatial_index, args.locate_cache_size)
+        else:
+            spatial_index = spatial_index_loader = locator = None
+        # Initializing the web application.
+        self._logger.info("Initializing the web application, JSON codec: %s ...", openwifi.helpers.json_codec.NAME)
+        web_application = openwifi.web.web_application.WebApplication(
+            db,
+            cache,
+            executor,
+            ingestor,
+            ingest_queue,
+            watermark,
+            rate_limiter,
+            spatial_index,
+            locator,
+            args.token_info_url,
+            args.max_upload_size,
+            args.snapshots_path,
+            enable_gzip=args.enable_gzip,
+        )
+        # Set up HTTP(S) servers.
+        http_servers = [tornado.httpserver.HTTPServer(web_application)]
+        http_servers[0].add_sockets(http_sockets)
+        if https_sockets:
+            http_servers.append(tornado.httpserver.HTTPServer(web_application, ssl_options=ssl_options))
+            http_servers[1].add_sockets(https_sockets)
+        # Restore watermark updates lost while Redis was unavailable.
+        tornado.ioloop.PeriodicCallback(
+            lambda: self._submit(executor, watermark.refresh, db),
+            1000.0 * self._WATERMARK_REFRESH_INTERVAL,
+        ).start()
+        # Retry failed tile invalidations.
+        tornado.ioloop.PeriodicCallback(ingestor.flush, 1000.0 * self._TILES_FLUSH_INTERVAL).start()
+        # Publish metrics for aggregation across processes.
+        tornado.ioloop.PeriodicCallback(
+            lambda: openwifi.helpers.metrics.publish(cache),
+            1000.0 * self._METRICS_PUBLISH_INTERVAL,
+        ).start()
+        # Stop gracefully on SIGTERM.
+        io_loop = tornado.ioloop.IOLoop.instance()
+        signal.signal(signal.SIGTERM, lambda signum, frame: io_loop.add_callback_from_signal(
+            self._stop, io_loop, http_servers,
+        ))
         # Start I/O loop.
         self._logger.info("I/O loop is being started.")
         try:
-            tornado.ioloop.IOLoop.instance().start()
+            io_loop.start()
         except KeyboardInterrupt:
             self._logger.info("Keyboard interrupt.")
-            return openwifi.helpers.exit_codes.EX_OK
+        finally:
+            if ingest_consumer is not None:
+                ingest_consumer.stop()
+            if spatial_index_loader is not None:
+                spatial_index_loader.stop()
+            executor.shutdown(wait=False)
+            mongo_client.close()
+        return openwifi.helpers.exit_codes.EX_OK
+
+    def _stop(self, io_loop, http_servers):
+        """
+        Stops accepting connections and lets in-flight requests finish.
+        """
+
+        self._logger.info("Stopping in %.1fs ...", self._STOP_DELAY)
+        for http_server in http_servers:
+            http_server.stop()
+        io_loop.call_later(self._STOP_DELAY, io_loop.stop)
+
+    def _submit(self, executor, fn, *args):
+        """
+        Runs the periodic task in the executor unless it is busy.
+        """
+
+        def run():
+            try:
+                fn(*args)
+            except Exception:
+                self._logger.exception("%s has failed.", fn.__name__)
+
+        try:
+            executor.submit(run)
+        except openwifi.helpers.executor.ExecutorBusyError:
+            self._logger.warning("Executor is busy, skipped %s.", fn.__name__)
+
+    def _connect_cache(self, args):
+        return openwifi.helpers.cache.Cache.from_url(
+            args.redis_url,
+            args.redis_pool_size,
+            args.redis_timeout,
+            args.local_cache_size,
+        )
+
+    def _configure_http_client(self):
+        """
+        Uses the cURL client since it keeps connections alive.
+        """
+
+        try:
+            # Importing the client imports pycurl.
+            tornado.httpclient.AsyncHTTPClient.configure(
+                "tornado.curl_httpclient.CurlAsyncHTTPClient",
+            )
+        except ImportError as ex:
+            # The simple client opens a connection for every token verification.
+            raise RuntimeError("pycurl is required for the token verification client: %s." % ex) from ex
 
     def _fork(self):
         # Do the first fork.
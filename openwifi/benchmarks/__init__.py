@@ -0,0 +1,26 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Benchmarks and load tests of the API hot paths.
+"""
+
+import random
+
+
+def make_scan_results(count, seed=0, start_timestamp=1388534400000):
+    """
+    Makes valid scan result documents as uploaded by the client.
+    """
+
+    generator = random.Random(seed)
+    return [{
+        "bssid": ":".join("%02x" % generator.randrange(256) for _ in range(6)),
+        "ssid": "Network %d" % generator.randrange(count),
+        "ts": start_timestamp + index,
+        "acc": generator.uniform(5.0, 100.0),
+        "loc": {
+            "lat": generator.uniform(59.8, 60.1),
+            "lon": generator.uniform(30.1, 30.6),
+        },
+    } for index in range(count)]
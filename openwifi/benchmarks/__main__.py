@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Runs Open WiFi Server benchmarks and compares them against the baseline.
+"""
+
+import argparse
+import json
+import logging
+import os
+import sys
+
+import openwifi.benchmarks.load
+import openwifi.benchmarks.micro
+import openwifi.helpers.exit_codes
+
+
+# Metrics where the lower value is better.
+_LOWER_IS_BETTER = ("_ms", "_kib", "errors")
+
+
+def _flatten(results, prefix=""):
+    """
+    Flattens the nested results into {"a.b": value}.
+    """
+
+    flat_results = dict()
+    for key, value in results.items():
+        if isinstance(value, dict):
+            flat_results.update(_flatten(value, prefix + key + "."))
+        else:
+            flat_results[prefix + key] = value
+    return flat_results
+
+
+def _compare(results, baseline):
+    """
+    Prints the results side by side with the baseline.
+    """
+
+    results, baseline = _flatten(results), _flatten(baseline)
+    for key in sorted(results):
+        value, baseline_value = results[key], baseline.get(key)
+        if value is None or not baseline_value:
+            print("%-50s %14s" % (key, value))
+            continue
+        change = 100.0 * (value - baseline_value) / baseline_value
+        better = (change < 0) if key.endswith(_LOWER_IS_BETTER) else (change > 0)
+        print("%-50s %14.2f %14.2f %+8.1f%% %s" % (
+            key, value, baseline_value, change, "better" if better else "worse",
+        ))
+
+
+parser = argparse.ArgumentParser(
+    prog="python3 -m openwifi.benchmarks",
+    description=globals()["__doc__"],
+    formatter_class=argparse.RawTextHelpFormatter,
+)
+parser.add_argument(
+    "--no-micro",
+    action="store_false",
+    dest="micro",
+    default=True,
+    help="skip micro-benchmarks",
+)
+parser.add_argument(
+    "--load",
+    action="store_true",
+    dest="load",
+    default=False,
+    help="run the load test against local MongoDB and Redis",
+)
+parser.add_argument(
+    "--duration",
+    default=10.0,
+    dest="duration",
+    help="load test phase duration in seconds",
+    metavar="SECONDS",
+    type=float,
+)
+parser.add_argument(
+    "--concurrency",
+    default=16,
+    dest="concurrency",
+    help="number of concurrent load test requests",
+    metavar="COUNT",
+    type=int,
+)
+parser.add_argument(
+    "--batch-size",
+    default=256,
+    dest="batch_size",
+    help="number of scan results per POST request",
+    metavar="SIZE",
+    type=int,
+)
+parser.add_argument(
+    "--page-size",
+    default=1024,
+    dest="page_size",
+    help="number of scan results per GET request",
+    metavar="SIZE",
+    type=int,
+)
+parser.add_argument(
+    "--baseline",
+    default=os.path.join(os.path.dirname(__file__), "baseline.json"),
+    dest="baseline_path",
+    help="baseline results path",
+    metavar="PATH",
+)
+parser.add_argument(
+    "--save-baseline",
+    action="store_true",
+    dest="save_baseline",
+    default=False,
+    help="save the results as the new baseline",
+)
+
+
+args = parser.parse_args()
+logging.basicConfig(
+    format="%(asctime)s [%(process)d] %(name)s %(levelname)s: %(message)s",
+    level=logging.INFO,
+    stream=sys.stderr,
+)
+results = dict()
+if args.micro:
+    results["micro"] = openwifi.benchmarks.micro.MicroBenchmarks().run()
+if args.load:
+    results["load"] = openwifi.benchmarks.load.LoadTest(
+        args.duration,
+        args.concurrency,
+        args.batch_size,
+        args.page_size,
+    ).run()
+if os.path.exists(args.baseline_path):
+    with open(args.baseline_path, "rt") as baseline_file:
+        _compare(results, json.load(baseline_file))
+else:
+    _compare(results, dict())
+if args.save_baseline:
+    with open(args.baseline_path, "wt") as baseline_file:
+        json.dump(results, baseline_file, indent=2, sort_keys=True)
+    logging.getLogger(__name__).info("Saved the baseline to %s.", args.baseline_path)
+sys.exit(openwifi.helpers.exit_codes.EX_OK)
@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+End-to-end load test.
+
+Runs the server in a subprocess against local MongoDB and Redis
+instances and a local token verification stub, then drives POST and GET
+requests to /api/scan-results/. Run it against disposable instances:
+the test writes to Redis and to a temporary database.
+"""
+
+import json
+import logging
+import os
+import resource
+import signal
+import subprocess
+import sys
+import time
+
+import pymongo
+import tornado.gen
+import tornado.httpclient
+import tornado.httpserver
+import tornado.ioloop
+import tornado.testing
+import tornado.web
+
+import openwifi.benchmarks
+
+
+class _TokenInfoHandler(tornado.web.RequestHandler):
+    """
+    Token verification endpoint stub. Any token is valid.
+    """
+
+    def get(self):
+        self.write(json.dumps({
+            "user_id": self.get_argument("access_token"),
+            "expires_in": 3600,
+        }))
+
+
+class LoadTest:
+    """
+    Load test runner.
+    """
+
+    # Time to wait for the server to start in seconds.
+    _START_TIMEOUT = 30.0
+
+    def __init__(self, duration, concurrency, batch_size, page_size):
+        self._logger = logging.getLogger(LoadTest.__name__)
+        self._duration = duration
+        self._concurrency = concurrency
+        self._batch_size = batch_size
+        self._page_size = page_size
+        self._database_name = "openwifi_benchmark_%s" % os.getpid()
+
+    def run(self):
+        try:
+            return tornado.ioloop.IOLoop.current().run_sync(self._run)
+        finally:
+            self._logger.info("Dropping the database %s ...", self._database_name)
+            pymongo.MongoClient().drop_database(self._database_name)
+
+    @tornado.gen.coroutine
+    def _run(self):
+        # Start the token verification stub.
+        stub_socket, stub_port = tornado.testing.bind_unused_port()
+        stub_server = tornado.httpserver.HTTPServer(tornado.web.Application([
+            (r"/tokeninfo", _TokenInfoHandler),
+        ]))
+        stub_server.add_sockets([stub_socket])
+        # Start the server.
+        self._base_url = "http://127.0.0.1:%s" % self._get_unused_port()
+        server = subprocess.Popen([
+            sys.executable, "-m", "openwifi",
+            "--port", self._base_url.rsplit(":", 1)[1],
+            "--https-port", "0",
+            "--database", self._database_name,
+            "--token-info-url", "http://127.0.0.1:%s/tokeninfo" % stub_port,
+            "--log-level", "WARN",
+        ])
+        self._http_client = tornado.httpclient.AsyncHTTPClient(max_clients=self._concurrency)
+        try:
+            yield self._wait_for_server()
+            results = {
+                "post": (yield self._run_phase(self._post)),
+                "get": (yield self._run_phase(self._get)),
+            }
+        finally:
+            server.send_signal(signal.SIGTERM)
+            server.wait()
+            stub_server.stop()
+        # Linux reports KiB.
+        results["max_rss_kib"] = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+        return results
+
+    @tornado.gen.coroutine
+    def _wait_for_server(self):
+        deadline = time.time() + self._START_TIMEOUT
+        while True:
+            try:
+                yield self._http_client.fetch(self._base_url + "/api/check/")
+            except (tornado.httpclient.HTTPError, OSError):
+                if time.time() > deadline:
+                    raise
+                yield tornado.gen.sleep(0.1)
+            else:
+                return
+
+    @tornado.gen.coroutine
+    def _run_phase(self, request):
+        """
+        Runs concurrent requests for the duration. Returns the statistics.
+        """
+
+        self._logger.info("Running %s ...", request.__name__)
+        latencies, errors = [], [0]
+        deadline = time.time() + self._duration
+
+        @tornado.gen.coroutine
+        def run_worker(worker_index):
+            request_index = 0
+            while time.time() < deadline:
+                start_time = time.time()
+                try:
+                    yield request(worker_index, request_index)
+                except tornado.httpclient.HTTPError as ex:
+                    self._logger.warning("Request has failed: %s", ex)
+                    errors[0] += 1
+                else:
+                    latencies.append(time.time() - start_time)
+                request_index += 1
+
+        start_time = time.time()
+        yield [run_worker(worker_index) for worker_index in range(self._concurrency)]
+        elapsed_time = time.time() - start_time
+        latencies.sort()
+        return {
+            "requests_per_second": len(latencies) / elapsed_time,
+            "p50_ms": 1000.0 * latencies[len(latencies) // 2] if latencies else None,
+            "p99_ms": 1000.0 * latencies[len(latencies) * 99 // 100] if latencies else None,
+            "errors": errors[0],
+        }
+
+    def _post(self, worker_index, request_index):
+        # Unique timestamps avoid duplicates.
+        scan_results = openwifi.benchmarks.make_scan_results(
+            self._batch_size,
+            seed=request_index,
+            start_timestamp=1388534400000 + request_index * self._batch_size,
+        )
+        return self._http_client.fetch(
+            self._base_url + "/api/scan-results/",
+            method="POST",
+            body=json.dumps(scan_results),
+            headers=self._get_headers(worker_index),
+        )
+
+    def _get(self, worker_index, request_index):
+        return self._http_client.fetch(
+            self._base_url + "/api/scan-results/%s/%s/" % ("0" * 24, self._page_size),
+            headers=self._get_headers(worker_index),
+        )
+
+    def _get_headers(self, worker_index):
+        return {
+            "X-Client-ID": "benchmark-%s" % worker_index,
+            "X-Auth-Token": "benchmark-%s" % worker_index,
+        }
+
+    def _get_unused_port(self):
+        unused_socket, port = tornado.testing.bind_unused_port()
+        unused_socket.close()
+        return port
@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Micro-benchmarks.
+"""
+
+import json
+import logging
+import timeit
+
+# noinspection PyPackageRequirements
+import bson.objectid
+import tornado.httputil
+import tornado.web
+
+import openwifi.benchmarks
+import openwifi.helpers
+import openwifi.helpers.cache
+import openwifi.helpers.json_codec
+import openwifi.helpers.spatial_index
+import openwifi.web.handlers.api.base_handler
+import openwifi.web.handlers.api.scan_results_handler
+
+
+class _Redis:
+    """
+    Dictionary-backed stand-in for Redis.
+    """
+
+    def __init__(self):
+        self._values = dict()
+
+    def get(self, key):
+        return self._values.get(key)
+
+    def set(self, key, value, ex=None):
+        self._values[key] = value
+
+
+class _Connection:
+    """
+    Stand-in for the HTTP connection of a request.
+    """
+
+    def set_close_callback(self, callback):
+        pass
+
+
+class MicroBenchmarks:
+    """
+    Measures the per-item cost of the hot functions.
+    """
+
+    # Number of documents per batch.
+    _BATCH_SIZE = 1024
+    # Number of networks in the spatial index.
+    _NETWORK_COUNT = 100000
+    # Number of timing repeats. The best one is reported.
+    _REPEAT = 5
+
+    def __init__(self):
+        self._logger = logging.getLogger(MicroBenchmarks.__name__)
+
+    def run(self):
+        self._logger.info("JSON codec: %s.", openwifi.helpers.json_codec.NAME)
+        results = dict()
+        for name, fn, number, items in self._get_benchmarks():
+            self._logger.info("Running %s ...", name)
+            best_time = min(timeit.Timer(fn).repeat(repeat=self._REPEAT, number=number))
+            results[name] = {"items_per_second": number * items / best_time}
+        return results
+
+    def _get_benchmarks(self):
+        """
+        Gets (name, function, number of calls, items per call) tuples.
+        """
+
+        scan_results = openwifi.benchmarks.make_scan_results(self._BATCH_SIZE)
+        stored_scan_results = [
+            dict(scan_result, _id=bson.objectid.ObjectId())
+            for scan_result in scan_results
+        ]
+        body = json.dumps(scan_results).encode("utf-8")
+        return [
+            (
+                "validation",
+                lambda: openwifi.web.handlers.api.scan_results_handler._validate_scan_results(scan_results),
+                10,
+                len(scan_results),
+            ),
+            (
+                "mongo_encoder",
+                lambda: json.dumps(stored_scan_results, cls=openwifi.helpers.MongoEncoder),
+                10,
+                len(stored_scan_results),
+            ),
+            (
+                "json_codec_encode",
+                lambda: openwifi.helpers.json_codec.dumps(stored_scan_results),
+                10,
+                len(stored_scan_results),
+            ),
+            (
+                "json_decode",
+                lambda: json.loads(body.decode("utf-8")),
+                10,
+                len(scan_results),
+            ),
+            (
+                "json_codec_decode",
+                lambda: openwifi.helpers.json_codec.loads(body),
+                10,
+                len(scan_results),
+            ),
+            ("authenticate_cache_hit", self._make_authenticate(), 10000, 1),
+            ("spatial_index_nearest", self._make_nearest(), 1000, 1),
+        ]
+
+    def _make_authenticate(self):
+        """
+        Makes the function that authenticates the cached token.
+        """
+
+        cache, auth_token = openwifi.helpers.cache.Cache(_Redis(), 16), "benchmark"
+        handler = openwifi.web.handlers.api.base_handler.BaseHandler(
+            tornado.web.Application(),
+            tornado.httputil.HTTPServerRequest(method="GET", uri="/", connection=_Connection()),
+            cache=cache,
+        )
+        cache.set(b"auth:" + handler._hash(auth_token), handler._hash("user"))
+        return lambda: handler._authenticate(auth_token).result()
+
+    def _make_nearest(self):
+        """
+        Makes the function that finds the nearest networks in the spatial index.
+        """
+
+        spatial_index = openwifi.helpers.spatial_index.SpatialIndex()
+        spatial_index.update([
+            {"_id": scan_result["bssid"], "acc": scan_result["acc"], "loc": scan_result["loc"]}
+            for scan_result in openwifi.benchmarks.make_scan_results(self._NETWORK_COUNT)
+        ])
+        return lambda: spatial_index.nearest(59.95, 30.35, 10, spatial_index.MAX_RADIUS)
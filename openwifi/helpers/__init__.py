@@ -11,6 +11,13 @@ import time
 
 # noinspection PyPackageRequirements
 import bson.objectid
+import pymongo.errors
+
+import openwifi.helpers.json_codec
+
+
+# E11000 and E11001 duplicate key errors.
+_DUPLICATE_KEY_ERROR_CODES = (11000, 11001)
 
 
 class MongoEncoder(json.JSONEncoder):
@@ -25,22 +32,82 @@ class MongoEncoder(json.JSONEncoder):
             return super(MongoEncoder, self).default(obj, **kwargs)
 
 
+class JsonArrayEncoder:
+    """
+    Encodes JSON array chunk by chunk.
+    """
+
+    def __init__(self):
+        self._empty = True
+
+    def begin(self):
+        return b"["
+
+    def encode(self, objects):
+        """
+        Encodes the array items. Objects should not be empty.
+        """
+
+        # Strip the brackets to join chunks into the single array.
+        chunk = openwifi.helpers.json_codec.dumps(objects)[1:-1]
+        if self._empty:
+            self._empty = False
+            return chunk
+        return b"," + chunk
+
+    def end(self):
+        return b"]"
+
+
+def bulk_insert(collection, documents, chunk_size):
+    """
+    Inserts the documents with unordered bulk writes of chunk_size documents.
+    Duplicate key errors are not fatal.
+    Returns the inserted count and the list of duplicate documents.
+    """
+
+    inserted_count, duplicates = 0, []
+    for offset in range(0, len(documents), chunk_size):
+        chunk = documents[offset:offset + chunk_size]
+        bulk = collection.initialize_unordered_bulk_op()
+        for document in chunk:
+            # _id is generated on the client side.
+            bulk.insert(document)
+        try:
+            result = bulk.execute()
+        except pymongo.errors.BulkWriteError as ex:
+            result = ex.details
+            if result["writeConcernErrors"]:
+                raise
+            for error in result["writeErrors"]:
+                if error["code"] not in _DUPLICATE_KEY_ERROR_CODES:
+                    raise
+                duplicates.append(chunk[error["index"]])
+        inserted_count += result["nInserted"]
+    return inserted_count, duplicates
+
+
 class Statistics:
     """
     The cache for statistics information.
+
+    Distinct counts are maintained in Redis HyperLogLogs.
     """
 
-    _TTL = 3600.0
+    SSID_KEY = "statistics:ssid"
+    BSSID_KEY = "statistics:bssid"
+
+    _TTL = 60.0
 
     _values = dict()
     _getters = dict()
 
-    def __init__(self, db):
-        self._db = db
+    def __init__(self, cache):
+        self._cache = cache
         self._logger = logging.getLogger(Statistics.__name__)
         self._getters.update({
-            "ssid_count": lambda: self._distinct_count("ssid"),
-            "bssid_count": lambda: self._distinct_count("bssid"),
+            "ssid_count": lambda: self._cache.pfcount(self.SSID_KEY),
+            "bssid_count": lambda: self._cache.pfcount(self.BSSID_KEY),
         })
 
     @property
@@ -51,6 +118,17 @@ class Statistics:
     def bssid_count(self):
         return self._get_value("bssid_count")
 
+    @classmethod
+    def update(cls, pipeline, scan_results):
+        """
+        Adds the scan results to the distinct counts.
+        """
+
+        if not scan_results:
+            return
+        pipeline.pfadd(cls.SSID_KEY, *{scan_result["ssid"] for scan_result in scan_results})
+        pipeline.pfadd(cls.BSSID_KEY, *{scan_result["bssid"] for scan_result in scan_results})
+
     def _get_value(self, key):
         """
         Gets the statistics value.
@@ -66,21 +144,11 @@ class Statistics:
         if (value is None) or (now - value[1] > self._TTL):
             # No cached value or it is outdated.
             self._logger.debug("Get %s.", key)
-            self._values[key] = value = (getter(), now)
+            value = (getter(), now)
+            if value[0] is None:
+                # The cache is unavailable. Keep the outdated value if any.
+                return self._values[key][0] if key in self._values else None
+            self._values[key] = value
         # Return the value.
         self._logger.debug("Got %s: %s.", key, value)
         return value[0]
-
-    def _distinct_count(self, field_name):
-        """
-        Get the distinct count of values of the specified field.
-        """
-
-        response = self._db.scan_results.aggregate([
-            {"$group": {"_id": "$" + field_name}},
-            {"$group": {"_id": None, "count": {"$sum": 1}}},
-        ])
-        if response["ok"] and response["result"]:
-            return response["result"][0]["count"]
-        else:
-            return 0
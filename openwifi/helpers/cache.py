@@ -0,0 +1,162 @@
+#!/usr/env/bin python3
+# -*- coding: utf-8 -*-
+
+"""
+Redis cache wrapper that degrades gracefully.
+"""
+
+import collections
+import logging
+import threading
+import time
+
+import redis
+
+import openwifi.helpers.metrics
+
+
+class LruCache:
+    """
+    Bounded in-process cache with expiration.
+    """
+
+    def __init__(self, max_size):
+        self._max_size = max_size
+        # (value, expiration time) by key, the least recently used first.
+        self._items = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._items.get(key)
+            if item is None:
+                return None
+            if item[1] < time.time():
+                del self._items[key]
+                return None
+            self._items.move_to_end(key)
+            return item[0]
+
+    def set(self, key, value, ex):
+        with self._lock:
+            self._items[key] = (value, time.time() + ex)
+            self._items.move_to_end(key)
+            if len(self._items) > self._max_size:
+                self._items.popitem(last=False)
+
+
+class Cache:
+    """
+    Wraps Redis calls that are not essential for serving a request.
+
+    Failed calls return the default value instead of raising. After a
+    failure Redis is bypassed for a while so that a stalled Redis costs
+    one socket timeout rather than one per call. Values accessed with
+    local=True are also kept in the in-process LRU which serves them
+    while Redis is unavailable.
+
+    Essential calls should use the underlying client available as redis.
+    """
+
+    # Time to bypass Redis after a failure in seconds.
+    _RETRY_INTERVAL = 5.0
+    # Maximum time to keep a value in the in-process LRU in seconds.
+    _MAX_LOCAL_TIME = 300
+
+    def __init__(self, redis_client, local_size):
+        self._logger = logging.getLogger(Cache.__name__)
+        self.redis = redis_client
+        self._local = LruCache(local_size)
+        self._retry_time = 0.0
+
+    @classmethod
+    def from_url(cls, url, pool_size, timeout, local_size):
+        """
+        Creates the cache with the blocking connection pool.
+        The timeout applies to both waiting for a connection and socket calls.
+        """
+
+        return cls(redis.StrictRedis(connection_pool=redis.BlockingConnectionPool.from_url(
+            url,
+            max_connections=pool_size,
+            timeout=timeout,
+            socket_timeout=timeout,
+            socket_connect_timeout=timeout,
+        )), local_size)
+
+    @property
+    def available(self):
+        return time.time() >= self._retry_time
+
+    def get(self, key, local=False):
+        if local:
+            value = self._local.get(key)
+            if value is not None:
+                return value
+        value = self._call("get", None, self.redis.get, key)
+        if local and value is not None:
+            self._local.set(key, value, self._MAX_LOCAL_TIME)
+        return value
+
+    def set(self, key, value, ex=None, local=False):
+        if local:
+            self._local.set(key, value, min(ex or self._MAX_LOCAL_TIME, self._MAX_LOCAL_TIME))
+        self._call("set", None, self.redis.set, key, value, ex=ex)
+
+    def mget(self, keys):
+        return self._call("mget", [None] * len(keys), self.redis.mget, keys)
+
+    def pfcount(self, key):
+        return self._call("pfcount", None, self.redis.pfcount, key)
+
+    def smembers(self, key):
+        return self._call("smembers", set(), self.redis.smembers, key)
+
+    def register_script(self, script):
+        """
+        Registers the Lua script. Returns the function of keys and
+        arguments that runs the script and returns None on failure.
+        """
+
+        script = self.redis.register_script(script)
+        return lambda keys, args: self._call("script", None, script, keys=keys, args=args)
+
+    def pipeline(self):
+        """
+        Gets the non-transactional pipeline. Its execute() returns None on failure.
+        """
+
+        return _Pipeline(self)
+
+    def _call(self, name, default, fn, *args, **kwargs):
+        if not self.available:
+            openwifi.helpers.metrics.CACHE_ERRORS.inc(name, "bypassed")
+            return default
+        try:
+            return fn(*args, **kwargs)
+        except redis.RedisError as ex:
+            self._logger.warning("Redis %s has failed: %s. Bypassing for %.0fs.", name, ex, self._RETRY_INTERVAL)
+            openwifi.helpers.metrics.CACHE_ERRORS.inc(name, "failed")
+            self._retry_time = time.time() + self._RETRY_INTERVAL
+            return default
+
+
+class _Pipeline:
+    """
+    Redis pipeline executed through the cache wrapper.
+    """
+
+    def __init__(self, cache):
+        self._cache = cache
+        self._pipeline = cache.redis.pipeline(transaction=False)
+
+    def __getattr__(self, name):
+        return getattr(self._pipeline, name)
+
+    def __len__(self):
+        return len(self._pipeline)
+
+    def execute(self):
+        if not len(self._pipeline):
+            return []
+        return self._cache._call("pipeline", None, self._pipeline.execute)
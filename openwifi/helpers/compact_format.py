@@ -0,0 +1,194 @@
+#!/usr/env/bin python3
+# -*- coding: utf-8 -*-
+
+"""
+Compact binary format for scan results.
+
+The stream starts with the magic bytes and the flags byte, then goes
+a sequence of frames terminated by zero varint. A frame is:
+
+* varint record count;
+* varint SSID dictionary size and the SSIDs as varint length + UTF-8;
+* records.
+
+A record is:
+
+* 12-byte ObjectId if FLAG_IDS is set;
+* 6-byte BSSID;
+* varint SSID index in the frame dictionary;
+* zigzag varint timestamp delta in ms from the previous record;
+* varint accuracy in cm;
+* zigzag varint latitude and longitude in 1e-7 degrees.
+"""
+
+import struct
+
+# noinspection PyPackageRequirements
+import bson.objectid
+
+
+MIME_TYPE = "application/x-openwifi-scan-results"
+
+MAGIC = b"OWSR"
+VERSION = 1
+
+# Records carry their _id.
+FLAG_IDS = 0x01
+
+_ACCURACY_SCALE = 100
+_COORDINATE_SCALE = 10000000
+
+_header = struct.Struct("!4sBB")
+
+
+def _write_varint(buffer, value):
+    while value > 0x7f:
+        buffer.append((value & 0x7f) | 0x80)
+        value >>= 7
+    buffer.append(value)
+
+
+def _write_zigzag(buffer, value):
+    _write_varint(buffer, (value << 1) if value >= 0 else ((-value << 1) - 1))
+
+
+def _pack_bssid(bssid):
+    return bytes.fromhex(bssid.replace(":", ""))
+
+
+def _unpack_bssid(data):
+    return ":".join(map("{:02x}".format, data))
+
+
+class Encoder:
+    """
+    Encodes scan results frame by frame.
+    """
+
+    def __init__(self, with_ids=False):
+        self._flags = FLAG_IDS if with_ids else 0
+        self._last_timestamp = 0
+
+    def begin(self):
+        return _header.pack(MAGIC, VERSION, self._flags)
+
+    def encode(self, scan_results):
+        """
+        Encodes the frame. Scan results should not be empty.
+        """
+
+        buffer = bytearray()
+        _write_varint(buffer, len(scan_results))
+        # Build the SSID dictionary.
+        ssids = dict()
+        for scan_result in scan_results:
+            ssids.setdefault(scan_result["ssid"], len(ssids))
+        _write_varint(buffer, len(ssids))
+        for ssid in ssids:
+            ssid = ssid.encode("utf-8")
+            _write_varint(buffer, len(ssid))
+            buffer.extend(ssid)
+        # Write the records.
+        for scan_result in scan_results:
+            if self._flags & FLAG_IDS:
+                buffer.extend(scan_result["_id"].binary)
+            buffer.extend(_pack_bssid(scan_result["bssid"]))
+            _write_varint(buffer, ssids[scan_result["ssid"]])
+            _write_zigzag(buffer, scan_result["ts"] - self._last_timestamp)
+            self._last_timestamp = scan_result["ts"]
+            _write_varint(buffer, round(scan_result["acc"] * _ACCURACY_SCALE))
+            _write_zigzag(buffer, round(scan_result["loc"]["lat"] * _COORDINATE_SCALE))
+            _write_zigzag(buffer, round(scan_result["loc"]["lon"] * _COORDINATE_SCALE))
+        return bytes(buffer)
+
+    def end(self):
+        return b"\x00"
+
+
+class _Reader:
+    """
+    Reads the primitive values from the buffer.
+    """
+
+    def __init__(self, data):
+        self._data = data
+        self._offset = 0
+
+    def read(self, size):
+        if self._offset + size > len(self._data):
+            raise ValueError("Unexpected end of data.")
+        value = self._data[self._offset:self._offset + size]
+        self._offset += size
+        return value
+
+    def read_varint(self):
+        value, shift = 0, 0
+        while True:
+            byte = self.read(1)[0]
+            value |= (byte & 0x7f) << shift
+            if not byte & 0x80:
+                return value
+            shift += 7
+            if shift > 63:
+                raise ValueError("Varint is too long.")
+
+    def read_zigzag(self):
+        value = self.read_varint()
+        return (value >> 1) if not value & 1 else -((value + 1) >> 1)
+
+    @property
+    def exhausted(self):
+        return self._offset == len(self._data)
+
+
+def encode(scan_results, with_ids=False):
+    """
+    Encodes the scan results as a single frame stream.
+    """
+
+    encoder = Encoder(with_ids)
+    return b"".join((
+        encoder.begin(),
+        encoder.encode(scan_results) if scan_results else b"",
+        encoder.end(),
+    ))
+
+
+def decode(data):
+    """
+    Decodes the stream into the list of scan results.
+    Raises ValueError if the data is malformed.
+    """
+
+    reader = _Reader(memoryview(data))
+    magic, version, flags = _header.unpack(reader.read(_header.size))
+    if magic != MAGIC or version != VERSION:
+        raise ValueError("Unsupported format: %r." % ((magic, version), ))
+    scan_results, last_timestamp = [], 0
+    while True:
+        record_count = reader.read_varint()
+        if not record_count:
+            break
+        ssids = [
+            str(reader.read(reader.read_varint()), "utf-8")
+            for _ in range(reader.read_varint())
+        ]
+        for _ in range(record_count):
+            scan_result = dict()
+            if flags & FLAG_IDS:
+                scan_result["_id"] = bson.objectid.ObjectId(bytes(reader.read(12)))
+            scan_result["bssid"] = _unpack_bssid(reader.read(6))
+            ssid_index = reader.read_varint()
+            if ssid_index >= len(ssids):
+                raise ValueError("Invalid SSID index: %s." % ssid_index)
+            scan_result["ssid"] = ssids[ssid_index]
+            scan_result["ts"] = last_timestamp = last_timestamp + reader.read_zigzag()
+            scan_result["acc"] = reader.read_varint() / _ACCURACY_SCALE
+            scan_result["loc"] = {
+                "lat": reader.read_zigzag() / _COORDINATE_SCALE,
+                "lon": reader.read_zigzag() / _COORDINATE_SCALE,
+            }
+            scan_results.append(scan_result)
+    if not reader.exhausted:
+        raise ValueError("Unexpected data after the end of stream.")
+    return scan_results
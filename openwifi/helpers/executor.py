@@ -0,0 +1,46 @@
+#!/usr/env/bin python3
+# -*- coding: utf-8 -*-
+
+"""
+Bounded executor for blocking calls.
+"""
+
+import concurrent.futures
+import threading
+
+
+class ExecutorBusyError(Exception):
+    """
+    Raised when the executor has too much queued work.
+    """
+
+    pass
+
+
+class BoundedExecutor:
+    """
+    Thread pool executor that limits the number of queued calls.
+    """
+
+    def __init__(self, max_workers, max_queued):
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers)
+        # Running and queued calls share the same limit.
+        self._semaphore = threading.BoundedSemaphore(max_workers + max_queued)
+
+    def submit(self, fn, *args, **kwargs):
+        """
+        Schedules the call. Raises ExecutorBusyError if the queue is full.
+        """
+
+        if not self._semaphore.acquire(blocking=False):
+            raise ExecutorBusyError("Executor queue is full.")
+        try:
+            future = self._executor.submit(fn, *args, **kwargs)
+        except:
+            self._semaphore.release()
+            raise
+        future.add_done_callback(lambda _: self._semaphore.release())
+        return future
+
+    def shutdown(self, wait=True):
+        self._executor.shutdown(wait=wait)
@@ -0,0 +1,238 @@
+#!/usr/env/bin python3
+# -*- coding: utf-8 -*-
+
+"""
+Write-behind ingestion queue.
+"""
+
+import logging
+import os
+import socket
+import threading
+import time
+
+# noinspection PyPackageRequirements
+import bson
+
+
+class QueueFullError(Exception):
+    """
+    Raised when the queue has reached its maximum depth.
+    """
+
+    pass
+
+
+class IngestQueue:
+    """
+    Durable queue of validated scan result batches in Redis.
+
+    Implements the reliable queue pattern: a consumer atomically moves
+    a batch to its own processing list and removes it from there only
+    after the batch is inserted. Live consumers refresh their heartbeat
+    keys. Processing lists of consumers whose heartbeats have expired
+    are requeued by recover(). Inserts are idempotent thanks to the
+    unique (cid, ts, bssid) index, so a batch ingested twice only yields
+    duplicates.
+    """
+
+    QUEUE_KEY = "ingest:queue"
+    # Set of the consumer IDs that may have processing lists.
+    CONSUMERS_KEY = "ingest:consumers"
+    # Heartbeat time to live in seconds. The consumer is dead after it.
+    HEARTBEAT_TTL = 30
+
+    _PROCESSING_KEY_PREFIX = "ingest:processing:"
+    _HEARTBEAT_KEY_PREFIX = "ingest:heartbeat:"
+
+    def __init__(self, cache, max_depth, consumer_id=None):
+        self._cache = cache
+        self._max_depth = max_depth
+        self._consumer_id = consumer_id or "%s:%s" % (socket.gethostname(), os.getpid())
+        self.processing_key = self._PROCESSING_KEY_PREFIX + self._consumer_id
+
+    def push(self, scan_results):
+        """
+        Appends the batch. Raises QueueFullError if the queue is too deep.
+        """
+
+        depth = self.depth()
+        if depth >= self._max_depth:
+            raise QueueFullError("Queue depth is %s." % depth)
+        self._cache.lpush(self.QUEUE_KEY, bson.BSON.encode({"scan_results": scan_results}))
+
+    def heartbeat(self):
+        """
+        Marks this consumer as alive.
+        """
+
+        pipeline = self._cache.pipeline(transaction=False)
+        pipeline.set(self._HEARTBEAT_KEY_PREFIX + self._consumer_id, b"1", ex=self.HEARTBEAT_TTL)
+        pipeline.sadd(self.CONSUMERS_KEY, self._consumer_id)
+        pipeline.execute()
+
+    def pop(self, max_size):
+        """
+        Moves batches to the processing list while they are available and
+        the total size is less than max_size bytes.
+        Returns the raw items to be acknowledged.
+        """
+
+        items, size = [], 0
+        while size < max_size:
+            item = self._cache.rpoplpush(self.QUEUE_KEY, self.processing_key)
+            if item is None:
+                break
+            items.append(item)
+            size += len(item)
+        return items
+
+    def acknowledge(self, items):
+        """
+        Removes the processed batches from the processing list.
+        """
+
+        pipeline = self._cache.pipeline(transaction=False)
+        for item in items:
+            pipeline.lrem(self.processing_key, 1, item)
+        pipeline.execute()
+
+    def requeue(self, items):
+        """
+        Returns the failed batches to the head of the queue.
+        """
+
+        pipeline = self._cache.pipeline(transaction=True)
+        for item in items:
+            pipeline.lrem(self.processing_key, 1, item)
+            pipeline.rpush(self.QUEUE_KEY, item)
+        pipeline.execute()
+
+    def recover(self, include_own=False):
+        """
+        Requeues the batches left by dead consumers. Returns their count.
+        The own processing list, which may be left by a previous process
+        with the same ID, is requeued only if include_own is set. This
+        should be done only before this consumer pops anything.
+        """
+
+        count = self._requeue_all(self.processing_key) if include_own else 0
+        for consumer_id in self._cache.smembers(self.CONSUMERS_KEY):
+            if isinstance(consumer_id, bytes):
+                consumer_id = consumer_id.decode("utf-8")
+            if consumer_id == self._consumer_id or self._cache.exists(self._HEARTBEAT_KEY_PREFIX + consumer_id):
+                continue
+            count += self._requeue_all(self._PROCESSING_KEY_PREFIX + consumer_id)
+            self._cache.srem(self.CONSUMERS_KEY, consumer_id)
+        return count
+
+    def _requeue_all(self, processing_key):
+        # Each batch is moved atomically, so concurrent recovery does not duplicate it.
+        count = 0
+        while self._cache.rpoplpush(processing_key, self.QUEUE_KEY) is not None:
+            count += 1
+        return count
+
+    def depth(self):
+        return self._cache.llen(self.QUEUE_KEY)
+
+    @staticmethod
+    def decode(item):
+        return bson.BSON(item).decode()["scan_results"]
+
+
+class IngestConsumer:
+    """
+    Background thread that drains the queue into the database in large
+    bulk writes.
+    """
+
+    # Pause when the queue is empty in seconds.
+    _POLL_INTERVAL = 0.5
+    # Maximum total size of batches ingested at once in bytes.
+    _MAX_POP_SIZE = 4 * 1024 * 1024
+    # Pause after a failure in seconds.
+    _RETRY_DELAY = 5.0
+    # Interval of refreshing the heartbeat in seconds.
+    _HEARTBEAT_INTERVAL = 5.0
+    # Interval of recovering batches of dead consumers in seconds.
+    _RECOVER_INTERVAL = 60.0
+
+    def __init__(self, queue, ingestor):
+        self._logger = logging.getLogger(IngestConsumer.__name__)
+        self._queue = queue
+        self._ingestor = ingestor
+        self._stop_event = threading.Event()
+        self._thread = threading.Thread(target=self._run, name=IngestConsumer.__name__, daemon=True)
+        # Heartbeats go on a separate thread so that a long write does not stop them.
+        self._heartbeat_thread = threading.Thread(
+            target=self._run_heartbeat,
+            name=IngestConsumer.__name__ + "Heartbeat",
+            daemon=True,
+        )
+
+    def start(self):
+        self._queue.heartbeat()
+        self._recover(include_own=True)
+        self._heartbeat_thread.start()
+        self._thread.start()
+
+    def stop(self):
+        """
+        Stops the consumer after the current write.
+        """
+
+        self._stop_event.set()
+        self._thread.join()
+        self._heartbeat_thread.join()
+
+    def _run_heartbeat(self):
+        recover_time = time.time() + self._RECOVER_INTERVAL
+        while not self._stop_event.wait(self._HEARTBEAT_INTERVAL):
+            try:
+                self._queue.heartbeat()
+                if time.time() >= recover_time:
+                    recover_time = time.time() + self._RECOVER_INTERVAL
+                    self._recover()
+            except Exception:
+                self._logger.exception("Failed to refresh the heartbeat.")
+
+    def _recover(self, include_own=False):
+        recovered_count = self._queue.recover(include_own)
+        if recovered_count:
+            self._logger.warning("Requeued %s unacknowledged batch(es).", recovered_count)
+
+    def _run(self):
+        self._logger.info("Started.")
+        while not self._stop_event.is_set():
+            items = []
+            try:
+                items = self._queue.pop(self._MAX_POP_SIZE)
+                if not items:
+                    self._stop_event.wait(self._POLL_INTERVAL)
+                    continue
+                self._ingest(items)
+            except Exception:
+                self._logger.exception("Failed to ingest %s batch(es).", len(items))
+                self._requeue(items)
+                self._stop_event.wait(self._RETRY_DELAY)
+        self._logger.info("Stopped.")
+
+    def _ingest(self, items):
+        scan_results = [
+            scan_result
+            for item in items
+            for scan_result in self._queue.decode(item)
+        ]
+        self._ingestor.ingest(scan_results)
+        self._queue.acknowledge(items)
+        self._logger.debug("Ingested %s batch(es), %s scan result(s).", len(items), len(scan_results))
+
+    def _requeue(self, items):
+        if not items:
+            return
+        try:
+            self._queue.requeue(items)
+        except Exception:
+            # The batches will be recovered on the next start.
+            self._logger.exception("Failed to requeue %s batch(es).", len(items))
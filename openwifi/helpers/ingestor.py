@@ -0,0 +1,160 @@
+#!/usr/env/bin python3
+# -*- coding: utf-8 -*-
+
+"""
+Scan results ingestion.
+"""
+
+import collections
+import logging
+import threading
+
+import openwifi.helpers
+import openwifi.helpers.merging
+import openwifi.helpers.metrics
+import openwifi.helpers.networks
+import openwifi.helpers.tiles
+
+
+class Ingestor:
+    """
+    Inserts validated scan results, updates the networks and runs
+    the post-insert hooks.
+
+    Repeated sightings in a batch are merged before the insert if the
+    merge window is set.
+
+    Hooks are called with the cache pipeline and the scan results after
+    each insert. The pipeline is executed once after all the hooks.
+    Hooks should be idempotent since a batch may be ingested more than once.
+
+    The latest state of the networks is folded from all the scan results,
+    duplicates included, so it catches up when a failed batch is ingested
+    again. Sighting counts are added for the inserted scan results only.
+
+    Tile invalidations and sighting counts are not lost if Redis or
+    the database fails after the insert: they are kept and sent again
+    with the next batch or by flush().
+    """
+
+    # Maximum number of documents sent to the database in one bulk write.
+    _INSERT_CHUNK_SIZE = 1000
+
+    def __init__(self, db, cache, merge_window=0, merge_distance=0):
+        self._logger = logging.getLogger(Ingestor.__name__)
+        self._db = db
+        self._cache = cache
+        self._merge_window = merge_window
+        self._merge_distance = merge_distance
+        self._hooks = [
+            openwifi.helpers.Statistics.update,
+        ]
+        # Tile IDs whose invalidation has failed.
+        self._pending_tile_ids = set()
+        # Sighting counts by BSSID that have not been added.
+        self._pending_counts = collections.Counter()
+        self._lock = threading.Lock()
+
+    def add_hook(self, hook):
+        self._hooks.append(hook)
+
+    def ingest(self, scan_results):
+        """
+        Inserts the scan results. Returns the inserted and the duplicate counts.
+        """
+
+        if self._merge_window:
+            merged_scan_results = openwifi.helpers.merging.merge(
+                scan_results,
+                self._merge_window,
+                self._merge_distance,
+            )
+            openwifi.helpers.metrics.INGESTED_SCAN_RESULTS.inc(
+                "merged",
+                amount=len(scan_results) - len(merged_scan_results),
+            )
+            scan_results = merged_scan_results
+
+        with openwifi.helpers.metrics.DB_TIME.time("insert_scan_results"):
+            inserted_count, duplicates = openwifi.helpers.bulk_insert(
+                self._db.scan_results,
+                scan_results,
+                self._INSERT_CHUNK_SIZE,
+            )
+        for scan_result in duplicates:
+            # Perhaps, the (cid, ts, bssid) index was violated.
+            self._logger.debug("Duplicate: %s", scan_result)
+        self._logger.debug("Inserted: %s, duplicates: %s.", inserted_count, len(duplicates))
+        # Duplicates have been already counted in the networks.
+        duplicate_ids = {id(scan_result) for scan_result in duplicates}
+        self._add_counts(collections.Counter(
+            scan_result["bssid"]
+            for scan_result in scan_results
+            if id(scan_result) not in duplicate_ids
+        ))
+        with openwifi.helpers.metrics.DB_TIME.time("update_networks"):
+            openwifi.helpers.networks.update(self._db, scan_results)
+        openwifi.helpers.metrics.INGESTED_SCAN_RESULTS.inc("inserted", amount=inserted_count)
+        openwifi.helpers.metrics.INGESTED_SCAN_RESULTS.inc("duplicate", amount=len(duplicates))
+        tile_ids = self._take_pending_tile_ids() | openwifi.helpers.tiles.get_scan_result_tile_ids(scan_results)
+        pipeline = self._cache.pipeline()
+        openwifi.helpers.tiles.invalidate(pipeline, tile_ids)
+        for hook in self._hooks:
+            hook(pipeline, scan_results)
+        with openwifi.helpers.metrics.CACHE_TIME.time("ingest"):
+            if pipeline.execute() is None:
+                self._logger.warning("Post-insert cache updates are lost for %s scan result(s).", len(scan_results))
+                self._add_pending_tile_ids(tile_ids)
+        return inserted_count, len(duplicates)
+
+    def flush(self):
+        """
+        Sends the failed tile invalidations and sighting counts again.
+        Cached tile pages are otherwise served stale until they expire.
+        """
+
+        self._add_counts(collections.Counter())
+        tile_ids = self._take_pending_tile_ids()
+        if not tile_ids:
+            return
+        pipeline = self._cache.pipeline()
+        openwifi.helpers.tiles.invalidate(pipeline, tile_ids)
+        with openwifi.helpers.metrics.CACHE_TIME.time("invalidate_tiles"):
+            if pipeline.execute() is None:
+                self._add_pending_tile_ids(tile_ids)
+                return
+        self._logger.info("Invalidated %s pending tile(s).", len(tile_ids))
+
+    def _add_counts(self, counts):
+        """
+        Adds the sighting counts together with the pending ones.
+        The counts are kept if the update fails.
+        """
+
+        counts = self._take_pending_counts() + counts
+        if not counts:
+            return
+        try:
+            with openwifi.helpers.metrics.DB_TIME.time("add_network_counts"):
+                openwifi.helpers.networks.add_counts(self._db, counts)
+        except Exception:
+            self._logger.exception("Failed to add sighting counts of %s network(s).", len(counts))
+            self._add_pending_counts(counts)
+
+    def _take_pending_counts(self):
+        with self._lock:
+            counts, self._pending_counts = self._pending_counts, collections.Counter()
+        return counts
+
+    def _add_pending_counts(self, counts):
+        with self._lock:
+            self._pending_counts += counts
+
+    def _take_pending_tile_ids(self):
+        with self._lock:
+            tile_ids, self._pending_tile_ids = self._pending_tile_ids, set()
+        return tile_ids
+
+    def _add_pending_tile_ids(self, tile_ids):
+        with self._lock:
+            self._pending_tile_ids |= tile_ids
@@ -0,0 +1,128 @@
+#!/usr/env/bin python3
+# -*- coding: utf-8 -*-
+
+"""
+JSON serialization for the API.
+
+Uses orjson if it is available and falls back to the standard library.
+Both encode to UTF-8 bytes and decode from bytes or strings.
+Large arrays can be parsed incrementally with ArrayParser.
+"""
+
+import codecs
+import json
+
+# noinspection PyPackageRequirements
+import bson.objectid
+
+try:
+    # noinspection PyUnresolvedReferences
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def _default(obj):
+    """
+    Encodes MongoDB ObjectID.
+    """
+
+    if isinstance(obj, bson.objectid.ObjectId):
+        return str(obj)
+    raise TypeError("%r is not JSON serializable" % obj)
+
+
+if orjson is not None:
+    NAME = "orjson"
+
+    def dumps(obj):
+        # The hook is called from the native encoder only for unsupported types.
+        return orjson.dumps(obj, default=_default)
+
+    loads = orjson.loads
+else:
+    NAME = "json"
+
+    _encoder = json.JSONEncoder(ensure_ascii=False, separators=(",", ":"), default=_default)
+
+    def dumps(obj):
+        return _encoder.encode(obj).encode("utf-8")
+
+    loads = json.loads
+
+
+class ArrayParser:
+    """
+    Incremental parser of a JSON array.
+
+    Yields array items as soon as they are complete. Raises ValueError
+    on malformed input or if an item is longer than max_item_size.
+    """
+
+    _WHITESPACE = " \t\n\r"
+
+    def __init__(self, max_item_size):
+        self._max_item_size = max_item_size
+        self._decoder = json.JSONDecoder()
+        self._text_decoder = codecs.getincrementaldecoder("utf-8")()
+        self._buffer = ""
+        # Expected token: "[", "item", "," or None after the array end.
+        self._expected = "["
+
+    def feed(self, data):
+        """
+        Parses the next chunk of bytes. Returns the completed items.
+        """
+
+        self._buffer += self._text_decoder.decode(data)
+        items, position = [], 0
+        while True:
+            position = self._skip_whitespace(position)
+            if position == len(self._buffer):
+                break
+            if self._expected is None:
+                raise ValueError("Unexpected data after the array end.")
+            char = self._buffer[position]
+            if self._expected == "[":
+                if char != "[":
+                    raise ValueError("Array is expected.")
+                position, self._expected = position + 1, "first_item"
+            elif self._expected == "first_item" and char == "]":
+                position, self._expected = position + 1, None
+            elif self._expected in ("first_item", "item"):
+                try:
+                    item, end = self._decoder.raw_decode(self._buffer, position)
+                except ValueError:
+                    # Perhaps, the item is incomplete.
+                    break
+                # Numbers may continue in the next chunk, so the item is
+                # complete only if it is followed by a separator.
+                end = self._skip_whitespace(end)
+                if end == len(self._buffer) or self._buffer[end] not in ",]":
+                    break
+                items.append(item)
+                position, self._expected = end, ","
+            elif char == ",":
+                position, self._expected = position + 1, "item"
+            elif char == "]":
+                position, self._expected = position + 1, None
+            else:
+                raise ValueError("Unexpected character: %r." % char)
+        self._buffer = self._buffer[position:]
+        if len(self._buffer) > self._max_item_size:
+            raise ValueError("Array item is too long.")
+        return items
+
+    def close(self):
+        """
+        Checks that the array is complete.
+        """
+
+        self._buffer += self._text_decoder.decode(b"", final=True)
+        if self._expected is not None or self._buffer.strip(self._WHITESPACE):
+            raise ValueError("Array is incomplete.")
+
+    def _skip_whitespace(self, position):
+        while position < len(self._buffer) and self._buffer[position] in self._WHITESPACE:
+            position += 1
+        return position
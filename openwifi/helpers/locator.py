@@ -0,0 +1,85 @@
+#!/usr/env/bin python3
+# -*- coding: utf-8 -*-
+
+"""
+Position estimation from observed networks.
+"""
+
+import math
+
+import openwifi.helpers.cache
+import openwifi.helpers.merging
+
+
+class Locator:
+    """
+    Estimates the position from the observed networks.
+
+    The estimate is the centroid of the known networks weighted by the
+    signal level and the network accuracy. Networks too far from the
+    strongest one are taken for moved access points and ignored. Results
+    are cached by the observations with rounded levels.
+    """
+
+    # Level of a network observed without one in dBm.
+    DEFAULT_LEVEL = -80
+    # Levels are rounded to this step for the result cache in dBm.
+    _LEVEL_STEP = 5
+    # Networks further from the strongest one are ignored in meters.
+    _MAX_SPREAD = 1000.0
+    # Minimum accuracy of the estimate in meters.
+    _MIN_ACCURACY = 10.0
+    # Result time to live in seconds. Network locations may change.
+    _CACHE_TIME = 60
+
+    def __init__(self, spatial_index, cache_size):
+        self._spatial_index = spatial_index
+        self._results = openwifi.helpers.cache.LruCache(cache_size)
+
+    def locate(self, observations):
+        """
+        Estimates the position from (bssid, level) observations.
+        Returns (lat, lon, accuracy) or None if no network is known.
+        """
+
+        # The strongest observation of each network counts.
+        levels = dict()
+        for bssid, level in observations:
+            level = self._LEVEL_STEP * round(level / self._LEVEL_STEP)
+            levels[bssid] = max(level, levels.get(bssid, level))
+        key = tuple(sorted(levels.items()))
+        result = self._results.get(key)
+        if result is None:
+            # Unknown position is cached as an empty tuple.
+            result = self._estimate(key) or ()
+            self._results.set(key, result, self._CACHE_TIME)
+        return result or None
+
+    def _estimate(self, observations):
+        locations = self._spatial_index.lookup([bssid for bssid, _ in observations])
+        # (location, accuracy, weight) of the known networks.
+        networks = [
+            # Signal amplitude is proportional to 10 ** (level / 20).
+            ({"lat": location[0], "lon": location[1]}, location[2], 10.0 ** (level / 20.0) / max(location[2], 1.0))
+            for (_, level), location in zip(observations, locations)
+            if location is not None
+        ]
+        if not networks:
+            return None
+        anchor, _, _ = max(networks, key=lambda network: network[2])
+        networks = [
+            network
+            for network in networks
+            if openwifi.helpers.merging.get_distance(anchor, network[0]) <= self._MAX_SPREAD
+        ]
+        total_weight = sum(weight for _, _, weight in networks)
+        estimate = {
+            "lat": sum(location["lat"] * weight for location, _, weight in networks) / total_weight,
+            "lon": sum(location["lon"] * weight for location, _, weight in networks) / total_weight,
+        }
+        # Combine the spread of the networks with their own accuracies.
+        accuracy = math.sqrt(sum(
+            (openwifi.helpers.merging.get_distance(estimate, location) ** 2 + acc ** 2) * weight
+            for location, acc, weight in networks
+        ) / total_weight)
+        return estimate["lat"], estimate["lon"], max(accuracy, self._MIN_ACCURACY)
@@ -0,0 +1,96 @@
+#!/usr/env/bin python3
+# -*- coding: utf-8 -*-
+
+"""
+Merging of repeated sightings of access points.
+"""
+
+import math
+
+
+# Mean Earth radius in meters.
+_EARTH_RADIUS = 6371000.0
+# Accuracy used for weighting instead of zero in meters.
+_MIN_ACCURACY = 1.0
+
+
+def get_distance(location1, location2):
+    """
+    Gets the approximate distance between the locations in meters.
+    Uses the equirectangular projection which is precise on short distances.
+    """
+
+    latitude1, latitude2 = math.radians(location1["lat"]), math.radians(location2["lat"])
+    x = math.radians(location2["lon"] - location1["lon"]) * math.cos((latitude1 + latitude2) / 2.0)
+    y = latitude2 - latitude1
+    return _EARTH_RADIUS * math.hypot(x, y)
+
+
+def merge(scan_results, window, distance):
+    """
+    Folds sightings of the same BSSID by the same client into single scan
+    results. A sighting joins the group if it is in the same window of
+    window seconds aligned to the epoch and within distance meters from
+    the group location.
+
+    The merged scan result takes the SSID and the timestamp of the latest
+    sighting, the location averaged with inverse variance weights, and
+    the best accuracy.
+
+    Windows are fixed, so the result does not depend on the other sightings
+    of the batch and a retried batch merges the same way. Sightings of one
+    window that are ingested in different batches are merged separately.
+    """
+
+    groups = dict()
+    for scan_result in scan_results:
+        bucket = scan_result["ts"] // (1000 * window)
+        groups.setdefault((scan_result["cid"], scan_result["bssid"], bucket), []).append(scan_result)
+    merged_scan_results = []
+    for group in groups.values():
+        if len(group) == 1:
+            merged_scan_results.extend(group)
+            continue
+        group.sort(key=lambda scan_result: scan_result["ts"])
+        merger = _Merger(group[0])
+        for scan_result in group[1:]:
+            if get_distance(merger.location, scan_result["loc"]) <= distance:
+                merger.add(scan_result)
+            else:
+                merged_scan_results.append(merger.get_scan_result())
+                merger = _Merger(scan_result)
+        merged_scan_results.append(merger.get_scan_result())
+    return merged_scan_results
+
+
+class _Merger:
+    """
+    Accumulates the group of sightings.
+    """
+
+    def __init__(self, scan_result):
+        self._last_scan_result = scan_result
+        self._accuracy = scan_result["acc"]
+        self._weight_sum = self._latitude_sum = self._longitude_sum = 0.0
+        self._add_location(scan_result)
+
+    @property
+    def location(self):
+        return {
+            "lat": self._latitude_sum / self._weight_sum,
+            "lon": self._longitude_sum / self._weight_sum,
+        }
+
+    def add(self, scan_result):
+        self._last_scan_result = scan_result
+        self._accuracy = min(self._accuracy, scan_result["acc"])
+        self._add_location(scan_result)
+
+    def get_scan_result(self):
+        return dict(self._last_scan_result, acc=self._accuracy, loc=self.location)
+
+    def _add_location(self, scan_result):
+        weight = 1.0 / max(scan_result["acc"], _MIN_ACCURACY) ** 2
+        self._weight_sum += weight
+        self._latitude_sum += weight * scan_result["loc"]["lat"]
+        self._longitude_sum += weight * scan_result["loc"]["lon"]
@@ -0,0 +1,208 @@
+#!/usr/env/bin python3
+# -*- coding: utf-8 -*-
+
+"""
+In-process counters and histograms with Prometheus text exposition.
+
+Each process publishes its snapshot to Redis, and the scrape endpoint
+sums snapshots of all live processes.
+"""
+
+import contextlib
+import json
+import os
+import socket
+import threading
+import time
+
+
+# Histogram buckets for durations in seconds.
+TIME_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# Histogram buckets for batch sizes.
+SIZE_BUCKETS = (1, 10, 50, 100, 500, 1000, 5000, 10000, 50000)
+
+# Published snapshot key prefix.
+_KEY_PREFIX = "metrics:"
+# Set of the published snapshot keys, so that the keyspace is never scanned.
+_KEYS_KEY = "metrics-keys"
+# Published snapshot time to live in seconds. Snapshots of dead processes expire.
+PUBLISH_TTL = 30
+
+_lock = threading.Lock()
+_metrics = []
+
+
+class Counter:
+    """
+    Monotonic counter.
+    """
+
+    type = "counter"
+
+    def __init__(self, name, documentation, label_names=()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = label_names
+        self._values = dict()
+        _metrics.append(self)
+
+    def inc(self, *label_values, amount=1):
+        with _lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def snapshot(self):
+        with _lock:
+            return [[list(label_values), value] for label_values, value in self._values.items()]
+
+
+class Histogram:
+    """
+    Histogram with cumulative buckets.
+    """
+
+    type = "histogram"
+
+    def __init__(self, name, documentation, label_names=(), buckets=TIME_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = label_names
+        self.buckets = buckets
+        # Bucket counts followed by the sum and the count.
+        self._values = dict()
+        _metrics.append(self)
+
+    def observe(self, value, *label_values):
+        with _lock:
+            values = self._values.get(label_values)
+            if values is None:
+                values = self._values[label_values] = [0] * (len(self.buckets) + 2)
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    values[index] += 1
+            values[-2] += value
+            values[-1] += 1
+
+    @contextlib.contextmanager
+    def time(self, *label_values):
+        """
+        Observes the duration of the block.
+        """
+
+        start_time = time.time()
+        try:
+            yield
+        finally:
+            self.observe(time.time() - start_time, *label_values)
+
+    def snapshot(self):
+        with _lock:
+            return [[list(label_values), list(values)] for label_values, values in self._values.items()]
+
+
+REQUEST_TIME = Histogram(
+    "openwifi_request_seconds", "Request processing time.", ("handler", "method", "status"),
+)
+DB_TIME = Histogram(
+    "openwifi_db_seconds", "MongoDB call time.", ("operation", ),
+)
+CACHE_TIME = Histogram(
+    "openwifi_cache_seconds", "Redis call time.", ("operation", ),
+)
+TOKEN_VERIFICATION_TIME = Histogram(
+    "openwifi_token_verification_seconds", "Authentication token verification time.", ("result", ),
+)
+CACHE_ERRORS = Counter(
+    "openwifi_cache_errors_total", "Failed and bypassed Redis calls.", ("operation", "result"),
+)
+AUTHENTICATIONS = Counter(
+    "openwifi_authentications_total", "Authentications by the token cache result.", ("result", ),
+)
+RATE_LIMITS = Counter(
+    "openwifi_rate_limit_checks_total", "Rate limit checks by the budget and the result.", ("budget", "result"),
+)
+INGEST_BATCH_SIZE = Histogram(
+    "openwifi_ingest_batch_size", "Number of uploaded scan results per request.", buckets=SIZE_BUCKETS,
+)
+INGESTED_SCAN_RESULTS = Counter(
+    "openwifi_ingested_scan_results_total", "Uploaded scan results by the outcome.", ("outcome", ),
+)
+
+
+def snapshot():
+    """
+    Gets the snapshot of all the metrics in this process.
+    """
+
+    return {metric.name: metric.snapshot() for metric in _metrics}
+
+
+def publish(cache):
+    """
+    Publishes the snapshot of this process to Redis.
+    """
+
+    key = "%s%s:%s" % (_KEY_PREFIX, socket.gethostname(), os.getpid())
+    pipeline = cache.pipeline()
+    pipeline.set(key, json.dumps(snapshot()), ex=PUBLISH_TTL)
+    pipeline.sadd(_KEYS_KEY, key)
+    pipeline.execute()
+
+
+def collect(cache):
+    """
+    Gets the sum of the published snapshots of all processes.
+    """
+
+    keys = sorted(cache.smembers(_KEYS_KEY))
+    values = cache.mget(keys) if keys else []
+    # Forget the processes whose snapshots have expired.
+    expired_keys = [key for key, value in zip(keys, values) if value is None]
+    if expired_keys:
+        pipeline = cache.pipeline()
+        pipeline.srem(_KEYS_KEY, *expired_keys)
+        pipeline.execute()
+    snapshots = [json.loads(value.decode("utf-8")) for value in values if value]
+    merged_snapshot = dict()
+    for process_snapshot in snapshots:
+        for name, values in process_snapshot.items():
+            merged_values = merged_snapshot.setdefault(name, dict())
+            for label_values, value in values:
+                label_values = tuple(label_values)
+                merged_value = merged_values.get(label_values)
+                if merged_value is None:
+                    merged_values[label_values] = value
+                elif isinstance(value, list):
+                    merged_values[label_values] = [a + b for a, b in zip(merged_value, value)]
+                else:
+                    merged_values[label_values] = merged_value + value
+    return merged_snapshot
+
+
+def render(merged_snapshot):
+    """
+    Renders the snapshot in Prometheus text exposition format.
+    """
+
+    lines = []
+    for metric in _metrics:
+        lines.append("# HELP %s %s" % (metric.name, metric.documentation))
+        lines.append("# TYPE %s %s" % (metric.name, metric.type))
+        for label_values, value in sorted(merged_snapshot.get(metric.name, dict()).items()):
+            labels = list(zip(metric.label_names, label_values))
+            if metric.type == "counter":
+                lines.append("%s%s %s" % (metric.name, _format_labels(labels), value))
+                continue
+            for bound, count in zip(metric.buckets + ("+Inf", ), value[:-2] + value[-1:]):
+                lines.append("%s_bucket%s %s" % (metric.name, _format_labels(labels + [("le", bound)]), count))
+            lines.append("%s_sum%s %s" % (metric.name, _format_labels(labels), value[-2]))
+            lines.append("%s_count%s %s" % (metric.name, _format_labels(labels), value[-1]))
+    return "\n".join(lines) + "\n"
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    return "{%s}" % ",".join(
+        '%s="%s"' % (name, str(value).replace("\\", "\\\\").replace('"', '\\"'))
+        for name, value in labels
+    )
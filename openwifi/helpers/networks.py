@@ -0,0 +1,126 @@
+#!/usr/env/bin python3
+# -*- coding: utf-8 -*-
+
+"""
+Materialized latest state of access points.
+
+The networks collection holds one document per BSSID:
+
+* _id: BSSID;
+* ssid: SSID of the latest sighting;
+* ts: the latest sighting timestamp;
+* acc and loc: the best accuracy sighting;
+* n: number of sightings;
+* seq: ObjectId of the last change, for synchronization.
+"""
+
+# noinspection PyPackageRequirements
+import bson.objectid
+import pymongo
+import pymongo.errors
+
+
+# E11000 and E11001 duplicate key errors.
+_DUPLICATE_KEY_ERROR_CODES = (11000, 11001)
+# Number of attempts if concurrent upserts collide.
+_MAX_ATTEMPTS = 3
+
+# Index of the change sequence.
+SEQ_INDEX = [
+    ("seq", pymongo.ASCENDING),
+]
+
+
+def update(db, scan_results):
+    """
+    Folds the scan results into the latest state of the networks.
+    Idempotent, so a batch may be folded again, duplicates included.
+    Sighting counts are added separately by add_counts().
+    """
+
+    # Aggregate the batch by BSSID first.
+    aggregates = dict()
+    for scan_result in scan_results:
+        aggregate = aggregates.get(scan_result["bssid"])
+        if aggregate is None:
+            aggregates[scan_result["bssid"]] = {
+                "latest": scan_result,
+                "best": scan_result,
+            }
+            continue
+        if scan_result["ts"] > aggregate["latest"]["ts"]:
+            aggregate["latest"] = scan_result
+        if scan_result["acc"] < aggregate["best"]["acc"]:
+            aggregate["best"] = scan_result
+    # Operations on each network go in order. Conditional updates keep
+    # the latest SSID and the best location under concurrent batches.
+    # Each update sets a new sequence value, so that synchronization
+    # does not skip the changes made after the upsert.
+    operations = []
+    for bssid, aggregate in aggregates.items():
+        latest, best = aggregate["latest"], aggregate["best"]
+        operations.extend([
+            ({"_id": bssid}, {
+                "$max": {"ts": latest["ts"]},
+                "$min": {"acc": best["acc"]},
+                "$set": {"seq": bson.objectid.ObjectId()},
+            }, True),
+            ({"_id": bssid, "ts": latest["ts"], "ssid": {"$ne": latest["ssid"]}}, {
+                "$set": {"ssid": latest["ssid"], "seq": bson.objectid.ObjectId()},
+            }, False),
+            ({"_id": bssid, "acc": best["acc"], "loc": {"$ne": best["loc"]}}, {
+                "$set": {"loc": best["loc"], "seq": bson.objectid.ObjectId()},
+            }, False),
+        ])
+    _execute(db.networks, operations)
+
+
+def add_counts(db, counts):
+    """
+    Adds the numbers of new sightings by BSSID. Not idempotent, so it
+    should be called once for each inserted scan result.
+    """
+
+    _execute(db.networks, [
+        ({"_id": bssid}, {"$inc": {"n": count}}, True)
+        for bssid, count in counts.items()
+    ])
+
+
+def _renew_seq(document):
+    """
+    Sets a new sequence value in the update, so that a retried write
+    does not commit an old one. Readers only wait for a short lag.
+    """
+
+    if "seq" not in document.get("$set", {}):
+        return document
+    return dict(document, **{"$set": dict(document["$set"], seq=bson.objectid.ObjectId())})
+
+
+def _execute(collection, operations):
+    """
+    Executes the (filter, update, upsert) operations in order.
+    Retries from the failed operation if concurrent upserts collide.
+    """
+
+    for _ in range(_MAX_ATTEMPTS):
+        if not operations:
+            return
+        bulk = collection.initialize_ordered_bulk_op()
+        for spec, document, upsert in operations:
+            document = _renew_seq(document)
+            if upsert:
+                bulk.find(spec).upsert().update_one(document)
+            else:
+                bulk.find(spec).update_one(document)
+        try:
+            bulk.execute()
+            return
+        except pymongo.errors.BulkWriteError as ex:
+            error = ex.details["writeErrors"][0]
+            if ex.details["writeConcernErrors"] or error["code"] not in _DUPLICATE_KEY_ERROR_CODES:
+                raise
+            # The failed operation has not been applied.
+            operations = operations[error["index"]:]
+    raise RuntimeError("Too many upsert collisions.")
@@ -0,0 +1,99 @@
+#!/usr/env/bin python3
+# -*- coding: utf-8 -*-
+
+"""
+Token bucket rate limiting.
+"""
+
+import logging
+import time
+
+import openwifi.helpers.metrics
+
+
+class RateLimiter:
+    """
+    Token buckets in Redis updated atomically by a Lua script.
+
+    Each budget has a rate in tokens per second and a capacity that
+    allows bursts. A request is charged to the buckets of all its
+    identities (client and user) and is allowed only if all of them have
+    enough tokens. A request that costs more than the capacity is allowed
+    once the bucket is full and leaves the bucket in debt, so the rest is
+    paid by waiting before the next request. Requests are allowed if Redis
+    is unavailable.
+    """
+
+    # KEYS are buckets. ARGV are the current time, the cost and then
+    # the capacity and the rate for each bucket.
+    # Returns 1 if allowed or 0 and the delay after which it would be allowed.
+    # Tokens go negative when the cost exceeds the capacity.
+    _SCRIPT = """
+        local now = tonumber(ARGV[1])
+        local cost = tonumber(ARGV[2])
+        local tokens = {}
+        local retry_after = 0
+        for index, key in ipairs(KEYS) do
+            local capacity = tonumber(ARGV[2 * index + 1])
+            local rate = tonumber(ARGV[2 * index + 2])
+            local bucket = redis.call("HMGET", key, "tokens", "time")
+            local value = tonumber(bucket[1]) or capacity
+            local elapsed = math.max(0, now - (tonumber(bucket[2]) or now))
+            value = math.min(capacity, value + elapsed * rate)
+            local required = math.min(cost, capacity)
+            if value < required then
+                retry_after = math.max(retry_after, (required - value) / rate)
+            end
+            tokens[index] = value
+        end
+        for index, key in ipairs(KEYS) do
+            local capacity = tonumber(ARGV[2 * index + 1])
+            local rate = tonumber(ARGV[2 * index + 2])
+            local value = tokens[index]
+            if retry_after == 0 then
+                value = value - cost
+            end
+            redis.call("HMSET", key, "tokens", tostring(value), "time", tostring(now))
+            -- Keep the bucket until it is full again, debt included.
+            redis.call("EXPIRE", key, math.ceil((capacity - value) / rate) + 1)
+        end
+        if retry_after == 0 then
+            return {1, "0"}
+        end
+        return {0, tostring(retry_after)}
+    """
+
+    _KEY_PREFIX = b"rate:"
+
+    def __init__(self, cache, budgets):
+        """
+        Budgets are (rate, capacity) by name. Zero rate disables the budget.
+        """
+
+        self._logger = logging.getLogger(RateLimiter.__name__)
+        self._budgets = {name: budget for name, budget in budgets.items() if budget[0] > 0}
+        self._script = cache.register_script(self._SCRIPT)
+
+    def limit(self, budget, identities, cost):
+        """
+        Charges the identities (bytes) for the cost. Cost larger than the capacity
+        is charged in full once the buckets are full.
+        Returns 0 if allowed or the delay in seconds after which it would be.
+        """
+
+        if budget not in self._budgets or not identities:
+            return 0
+        rate, capacity = self._budgets[budget]
+        args = [time.time(), cost]
+        for _ in identities:
+            args.extend((capacity, rate))
+        key_prefix = self._KEY_PREFIX + budget.encode("ascii") + b":"
+        result = self._script([key_prefix + identity for identity in identities], args)
+        if result is None:
+            openwifi.helpers.metrics.RATE_LIMITS.inc(budget, "unavailable")
+            return 0
+        if result[0]:
+            openwifi.helpers.metrics.RATE_LIMITS.inc(budget, "allowed")
+            return 0
+        openwifi.helpers.metrics.RATE_LIMITS.inc(budget, "limited")
+        return float(result[1])
@@ -0,0 +1,282 @@
+#!/usr/env/bin python3
+# -*- coding: utf-8 -*-
+
+"""
+In-process spatial index of the networks for proximity queries.
+"""
+
+import array
+import datetime
+import heapq
+import logging
+import math
+import threading
+
+# noinspection PyPackageRequirements
+import bson.objectid
+
+import openwifi.helpers.networks
+
+
+# Mean Earth radius in meters.
+_EARTH_RADIUS = 6371000.0
+
+
+def pack_bssid(bssid):
+    """
+    Packs the BSSID into a 48-bit integer.
+    """
+
+    return int(bssid.replace(":", ""), 16)
+
+
+def unpack_bssid(value):
+    """
+    Unpacks the BSSID from a 48-bit integer.
+    """
+
+    digits = "%012x" % value
+    return ":".join(digits[index:index + 2] for index in range(0, 12, 2))
+
+
+class SpatialIndex:
+    """
+    Grid of network locations over compact arrays.
+
+    Each network takes a slot in parallel arrays of packed BSSIDs and
+    coordinates. Grid cells hold arrays of slot numbers. A network takes
+    about 140 bytes: 28 bytes in the arrays, 4 bytes in its cell and the
+    rest in the BSSID to slot mapping. Networks are never removed.
+
+    Distances are equirectangular, which is accurate enough within the
+    supported radius.
+    """
+
+    # Cell size in degrees, about 1.1 km of latitude.
+    CELL_SIZE = 0.01
+    # Maximum search radius in meters.
+    MAX_RADIUS = 10000.0
+
+    # Number of cell columns around the globe.
+    _COLUMN_COUNT = round(360.0 / CELL_SIZE)
+    # Initial search radius of the nearest networks query in meters.
+    _INITIAL_RADIUS = 250.0
+
+    def __init__(self):
+        self._logger = logging.getLogger(SpatialIndex.__name__)
+        self._lock = threading.Lock()
+        # Slot number by the packed BSSID.
+        self._slots = dict()
+        self._bssids = array.array("Q")
+        self._lats = array.array("d")
+        self._lons = array.array("d")
+        self._accs = array.array("f")
+        # Slot numbers by the cell number.
+        self._cells = dict()
+
+    def __len__(self):
+        return len(self._bssids)
+
+    def update(self, networks):
+        """
+        Inserts or moves the networks. Networks without a location are skipped.
+        Invalid networks are skipped too, so that the parallel arrays stay aligned.
+        """
+
+        with self._lock:
+            for network in networks:
+                loc = network.get("loc")
+                if not loc:
+                    continue
+                # Read all the fields before changing anything.
+                try:
+                    bssid, lat, lon, acc = self._parse(network, loc)
+                except (KeyError, TypeError, ValueError) as ex:
+                    self._logger.warning("Skipped invalid network %s: %s", network.get("_id"), ex)
+                    continue
+                cell = self._get_cell(lat, lon)
+                slot = self._slots.get(bssid)
+                if slot is None:
+                    slot = self._slots[bssid] = len(self._bssids)
+                    self._bssids.append(bssid)
+                    self._lats.append(lat)
+                    self._lons.append(lon)
+                    self._accs.append(acc)
+                else:
+                    old_cell = self._get_cell(self._lats[slot], self._lons[slot])
+                    self._lats[slot], self._lons[slot] = lat, lon
+                    self._accs[slot] = acc
+                    if old_cell == cell:
+                        continue
+                    self._cells[old_cell].remove(slot)
+                slots = self._cells.get(cell)
+                if slots is None:
+                    slots = self._cells[cell] = array.array("I")
+                slots.append(slot)
+
+    def lookup(self, bssids):
+        """
+        Gets (lat, lon, acc) of the networks by their BSSIDs at once.
+        Unknown networks are None.
+        """
+
+        values = [pack_bssid(bssid) for bssid in bssids]
+        with self._lock:
+            slots = [self._slots.get(value) for value in values]
+            return [
+                (self._lats[slot], self._lons[slot], self._accs[slot]) if slot is not None else None
+                for slot in slots
+            ]
+
+    def within(self, lat, lon, radius, limit):
+        """
+        Gets up to limit nearest networks within the radius in meters.
+        Returns (distance, bssid, lat, lon) tuples ordered by distance.
+        """
+
+        radius = min(radius, self.MAX_RADIUS)
+        lat_scale = math.radians(_EARTH_RADIUS)
+        lon_scale = lat_scale * math.cos(math.radians(lat))
+        # Bounding box of the circle in cells.
+        delta_lat = radius / lat_scale
+        min_row = math.floor(max(-90.0, lat - delta_lat) / self.CELL_SIZE)
+        max_row = math.floor(min(90.0, lat + delta_lat) / self.CELL_SIZE)
+        if lon_scale * 180.0 > radius:
+            delta_lon = radius / lon_scale
+            min_column = math.floor((lon - delta_lon) / self.CELL_SIZE)
+            max_column = math.floor((lon + delta_lon) / self.CELL_SIZE)
+        else:
+            # The circle covers a pole.
+            min_column, max_column = 0, self._COLUMN_COUNT - 1
+        columns = {column % self._COLUMN_COUNT for column in range(min_column, max_column + 1)}
+        candidates = []
+        with self._lock:
+            lats, lons = self._lats, self._lons
+            for row in range(min_row, max_row + 1):
+                for column in columns:
+                    slots = self._cells.get(row * self._COLUMN_COUNT + column)
+                    if not slots:
+                        continue
+                    for slot in slots:
+                        delta_lon = abs(lons[slot] - lon)
+                        if delta_lon > 180.0:
+                            delta_lon = 360.0 - delta_lon
+                        distance = math.hypot((lats[slot] - lat) * lat_scale, delta_lon * lon_scale)
+                        if distance <= radius:
+                            candidates.append((distance, slot))
+            nearest = heapq.nsmallest(limit, candidates)
+            return [
+                (distance, unpack_bssid(self._bssids[slot]), lats[slot], lons[slot])
+                for distance, slot in nearest
+            ]
+
+    def nearest(self, lat, lon, count, max_radius):
+        """
+        Gets up to count nearest networks within the maximum radius in meters.
+        """
+
+        radius = min(self._INITIAL_RADIUS, max_radius)
+        while True:
+            networks = self.within(lat, lon, radius, count)
+            if len(networks) >= count or radius >= min(max_radius, self.MAX_RADIUS):
+                return networks
+            radius = min(2.0 * radius, max_radius)
+
+    @staticmethod
+    def _parse(network, loc):
+        """
+        Gets (packed BSSID, lat, lon, acc) of the network.
+        """
+
+        bssid = pack_bssid(network["_id"])
+        lat, lon, acc = float(loc["lat"]), float(loc["lon"]), float(network["acc"])
+        # Also rejects NaN.
+        if not (-90.0 <= lat <= 90.0 and -180.0 <= lon <= 180.0 and 0.0 <= acc < math.inf):
+            raise ValueError("Invalid location: %s, %s, %s." % (lat, lon, acc))
+        if bssid >> 48:
+            raise ValueError("Invalid BSSID.")
+        return bssid, lat, lon, acc
+
+    def _get_cell(self, lat, lon):
+        return (
+            math.floor(lat / self.CELL_SIZE) * self._COLUMN_COUNT +
+            math.floor(lon / self.CELL_SIZE) % self._COLUMN_COUNT
+        )
+
+
+class SpatialIndexLoader:
+    """
+    Background thread that loads the networks into the spatial index and
+    then follows their change sequence.
+    """
+
+    # Number of networks loaded at once.
+    _BATCH_SIZE = 10000
+    # Pause between polls in seconds.
+    _POLL_INTERVAL = 5.0
+    # Changes are read again for this time in seconds, because concurrent
+    # writers do not commit their sequence IDs in order.
+    _SAFETY_LAG = 10.0
+    # Pause after a failure in seconds.
+    _RETRY_DELAY = 5.0
+
+    def __init__(self, db, index):
+        self._logger = logging.getLogger(SpatialIndexLoader.__name__)
+        self._db = db
+        self._index = index
+        self._last_seq = None
+        self._stop_event = threading.Event()
+        self._thread = threading.Thread(target=self._run, name=SpatialIndexLoader.__name__, daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop_event.set()
+        self._thread.join()
+
+    def poll(self):
+        """
+        Applies the changes since the last poll. Returns the number of
+        changed networks.
+        """
+
+        spec = dict()
+        if self._last_seq is not None:
+            since = self._last_seq.generation_time - datetime.timedelta(seconds=self._SAFETY_LAG)
+            spec["seq"] = {"$gt": min(self._last_seq, bson.objectid.ObjectId.from_datetime(since))}
+        count = 0
+        while True:
+            networks = list(self._db.networks.find(spec, {
+                "acc": True,
+                "loc": True,
+                "seq": True,
+            }).sort(openwifi.helpers.networks.SEQ_INDEX).limit(self._BATCH_SIZE))
+            if not networks:
+                break
+            self._index.update(networks)
+            count += len(networks)
+            last_seq = networks[-1]["seq"]
+            if self._last_seq is None or self._last_seq < last_seq:
+                self._last_seq = last_seq
+            if len(networks) < self._BATCH_SIZE:
+                break
+            spec["seq"] = {"$gt": last_seq}
+        return count
+
+    def _run(self):
+        self._logger.info("Loading the networks ...")
+        is_loaded = False
+        while not self._stop_event.is_set():
+            try:
+                count = self.poll()
+            except Exception:
+                self._logger.exception("Failed to poll the networks.")
+                self._stop_event.wait(self._RETRY_DELAY)
+                continue
+            if not is_loaded:
+                is_loaded = True
+                self._logger.info("Loaded %s network(s).", len(self._index))
+            else:
+                self._logger.debug("Polled %s network(s), %s in total.", count, len(self._index))
+            self._stop_event.wait(self._POLL_INTERVAL)
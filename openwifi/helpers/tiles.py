@@ -0,0 +1,131 @@
+#!/usr/env/bin python3
+# -*- coding: utf-8 -*-
+
+"""
+Geographical tiles for micro-synchronization.
+
+The world is split into the fixed grid of TILE_SIZE degree tiles.
+Tile ID is row * COLUMN_COUNT + column counting from (-90, -180).
+"""
+
+import math
+
+
+TILE_SIZE = 0.1
+
+ROW_COUNT = round(180.0 / TILE_SIZE)
+COLUMN_COUNT = round(360.0 / TILE_SIZE)
+
+
+def _get_bound(index, origin):
+    return index * TILE_SIZE + origin
+
+
+def _get_index(value, origin, count):
+    index = min(int(math.floor((value - origin) / TILE_SIZE)), count - 1)
+    # Agree with the bounds despite the rounding, so that each point is
+    # in exactly one tile.
+    if index > 0 and value < _get_bound(index, origin):
+        index -= 1
+    elif index < count - 1 and value >= _get_bound(index + 1, origin):
+        index += 1
+    return index
+
+
+def _get_row(latitude):
+    return _get_index(latitude, -90.0, ROW_COUNT)
+
+
+def _get_column(longitude):
+    return _get_index(longitude, -180.0, COLUMN_COUNT)
+
+
+def get_tile_id(latitude, longitude):
+    """
+    Gets the ID of the tile that contains the point.
+    """
+
+    return _get_row(latitude) * COLUMN_COUNT + _get_column(longitude)
+
+
+def validate_tile_id(tile_id):
+    return isinstance(tile_id, int) and 0 <= tile_id < ROW_COUNT * COLUMN_COUNT
+
+
+def get_box(tile_id):
+    """
+    Gets the tile box as [[lat_min, lon_min], [lat_max, lon_max]].
+    """
+
+    row, column = divmod(tile_id, COLUMN_COUNT)
+    return [
+        [_get_bound(row, -90.0), _get_bound(column, -180.0)],
+        [_get_bound(row + 1, -90.0), _get_bound(column + 1, -180.0)],
+    ]
+
+
+def get_spec(tile_id):
+    """
+    Gets the query of the documents in the tile.
+
+    The $box is inclusive, so it is narrowed to the half-open range
+    which get_tile_id uses. The last row and column include their
+    upper edges.
+    """
+
+    row, column = divmod(tile_id, COLUMN_COUNT)
+    (lat_min, lon_min), (lat_max, lon_max) = box = get_box(tile_id)
+    return {
+        "loc": {"$geoWithin": {"$box": box}},
+        "loc.lat": {"$gte": lat_min, "$lte" if row == ROW_COUNT - 1 else "$lt": lat_max},
+        "loc.lon": {"$gte": lon_min, "$lte" if column == COLUMN_COUNT - 1 else "$lt": lon_max},
+    }
+
+
+def get_tile_ids(lat_min, lon_min, lat_max, lon_max, max_count):
+    """
+    Gets IDs of the tiles that intersect the bounding box.
+    Raises ValueError if there are more than max_count tiles.
+    """
+
+    rows = range(_get_row(lat_min), _get_row(lat_max) + 1)
+    columns = range(_get_column(lon_min), _get_column(lon_max) + 1)
+    if len(rows) * len(columns) > max_count:
+        raise ValueError("Too many tiles: %s." % (len(rows) * len(columns)))
+    return [row * COLUMN_COUNT + column for row in rows for column in columns]
+
+
+def get_version_key(tile_id):
+    """
+    Gets the Redis key of the tile version.
+    """
+
+    return "tile-version:%d" % tile_id
+
+
+def get_page_key(tile_id, version, last_id):
+    """
+    Gets the Redis key of the cached tile page.
+    """
+
+    return "tile:%d:%d:%s" % (tile_id, version, last_id)
+
+
+def get_scan_result_tile_ids(scan_results):
+    """
+    Gets IDs of the tiles that contain the scan results.
+    """
+
+    return {
+        get_tile_id(scan_result["loc"]["lat"], scan_result["loc"]["lon"])
+        for scan_result in scan_results
+    }
+
+
+def invalidate(pipeline, tile_ids):
+    """
+    Bumps versions of the tiles.
+    """
+
+    for tile_id in tile_ids:
+        pipeline.incr(get_version_key(tile_id))
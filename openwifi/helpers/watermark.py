@@ -0,0 +1,132 @@
+#!/usr/env/bin python3
+# -*- coding: utf-8 -*-
+
+"""
+Latest scan result ID watermark.
+"""
+
+import logging
+import threading
+import time
+
+# noinspection PyPackageRequirements
+import bson.objectid
+import pymongo
+
+
+class Watermark:
+    """
+    Keeps the upper bound of inserted scan result IDs and the change
+    counter of the scan results in Redis.
+
+    Nothing goes after the watermark, so synchronization from an ID at or
+    beyond it can be answered without querying the database. The value
+    only grows, and it is updated after the insert.
+
+    IDs are generated by different processes, so a scan result may be
+    committed below the watermark, and cleanup removes scan results
+    below it. Any page may change then, so every insert and cleanup
+    batch increments the change counter, and cached pages are valid
+    only while it stays the same.
+
+    Unknown watermark or counter means that the database should be
+    queried. Updates lost while Redis is unavailable are restored by
+    refresh() from the database.
+    """
+
+    KEY = "scan_results:watermark"
+    CHANGES_KEY = "scan_results:changes"
+
+    # Sets the value if it is greater and counts the change.
+    # Hexadecimal IDs compare as strings.
+    _UPDATE_SCRIPT = """
+        local value = redis.call("GET", KEYS[1])
+        if not value or value < ARGV[1] then
+            redis.call("SET", KEYS[1], ARGV[1])
+        end
+        redis.call("INCR", KEYS[2])
+    """
+    # Time to keep the values read from Redis in seconds.
+    _LOCAL_TIME = 1.0
+
+    def __init__(self, cache):
+        self._logger = logging.getLogger(Watermark.__name__)
+        self._cache = cache
+        self._lock = threading.Lock()
+        self._state = None
+        self._read_time = 0.0
+        # The latest (ID, count) of the scan results seen by refresh().
+        self._db_state = None
+
+    def get(self):
+        """
+        Gets the (watermark ID, change counter) pair or None if it is unknown.
+        """
+
+        now = time.time()
+        if now - self._read_time > self._LOCAL_TIME:
+            value, changes = self._cache.mget([self.KEY, self.CHANGES_KEY])
+            with self._lock:
+                if value and changes:
+                    self._state = bson.objectid.ObjectId(value.decode("ascii")), int(changes)
+                else:
+                    self._state = None
+                self._read_time = now
+        return self._state
+
+    def update(self, pipeline, scan_results):
+        """
+        Raises the watermark to the inserted scan results and counts
+        the change. Ingest hook.
+        """
+
+        ids = [scan_result["_id"] for scan_result in scan_results if "_id" in scan_result]
+        if not ids:
+            return
+        pipeline.eval(self._UPDATE_SCRIPT, 2, self.KEY, self.CHANGES_KEY, str(max(ids)))
+        # Read the new values next time.
+        self._read_time = 0.0
+
+    def touch(self, pipeline):
+        """
+        Counts the change of scan results below the watermark.
+        """
+
+        pipeline.incr(self.CHANGES_KEY)
+        self._read_time = 0.0
+
+    def seed(self, db):
+        """
+        Raises the watermark to the latest scan result in the database.
+        """
+
+        max_id = self._find_max_id(db)
+        if max_id is not None:
+            pipeline = self._cache.pipeline()
+            self.update(pipeline, [{"_id": max_id}])
+            pipeline.execute()
+        self._logger.info("Seeded with %s.", max_id)
+
+    def refresh(self, db):
+        """
+        Raises the watermark and counts a change if the scan results have
+        changed since the last refresh. Restores lost updates.
+        """
+
+        db_state = self._find_max_id(db), db.scan_results.count()
+        if db_state == self._db_state:
+            return
+        pipeline = self._cache.pipeline()
+        if db_state[0] is not None:
+            self.update(pipeline, [{"_id": db_state[0]}])
+        else:
+            self.touch(pipeline)
+        if pipeline.execute() is not None:
+            self._db_state = db_state
+
+    @staticmethod
+    def _find_max_id(db):
+        scan_results = list(db.scan_results.find({}, {"_id": True}).sort([
+            ("_id", pymongo.DESCENDING),
+        ]).limit(1))
+        return scan_results[0]["_id"] if scan_results else None
@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Pre-fork worker processes supervisor.
+"""
+
+import logging
+import os
+import signal
+import time
+
+import openwifi.helpers.exit_codes
+
+
+class Supervisor:
+    """
+    Forks worker processes and restarts them when they exit.
+
+    SIGHUP restarts workers one by one. SIGTERM and SIGINT stop them.
+    Listening sockets should be bound before running the supervisor so
+    that workers share them.
+    """
+
+    # Supervisor loop interval in seconds.
+    _POLL_INTERVAL = 0.5
+    # Delay before restarting an unexpectedly exited worker in seconds.
+    _RESTART_DELAY = 1.0
+    # Time given to a new worker to start during rolling restart in seconds.
+    _START_DELAY = 1.0
+    # Time given to a worker to stop before it is killed in seconds.
+    _STOP_TIMEOUT = 15.0
+
+    def __init__(self, worker_count, run_worker):
+        if worker_count < 1:
+            raise ValueError("Invalid number of workers: %s." % worker_count)
+        self._logger = logging.getLogger(Supervisor.__name__)
+        self._worker_count = worker_count
+        self._run_worker = run_worker
+        # Worker PIDs.
+        self._workers = set()
+        self._stop_requested = False
+        self._restart_requested = False
+
+    def main(self):
+        signal.signal(signal.SIGTERM, self._on_stop)
+        signal.signal(signal.SIGINT, self._on_stop)
+        signal.signal(signal.SIGHUP, self._on_restart)
+        self._logger.info("Starting %s worker(s) ...", self._worker_count)
+        for _ in range(self._worker_count):
+            self._spawn()
+        while not self._stop_requested:
+            if self._restart_requested:
+                self._restart_requested = False
+                self._restart()
+            for pid in self._reap():
+                self._logger.warning("Worker %s has exited unexpectedly.", pid)
+                time.sleep(self._RESTART_DELAY)
+                self._spawn()
+            time.sleep(self._POLL_INTERVAL)
+        self._logger.info("Stopping %s worker(s) ...", len(self._workers))
+        for pid in list(self._workers):
+            self._stop(pid)
+        self._logger.info("All workers have stopped.")
+        return openwifi.helpers.exit_codes.EX_OK
+
+    def _spawn(self):
+        """
+        Forks a worker process.
+        """
+
+        pid = os.fork()
+        if not pid:
+            # Worker process. Never return to the caller.
+            exit_code = openwifi.helpers.exit_codes.EX_SOFTWARE
+            try:
+                for signum in (signal.SIGTERM, signal.SIGINT, signal.SIGHUP):
+                    signal.signal(signum, signal.SIG_DFL)
+                exit_code = self._run_worker()
+            except:
+                self._logger.exception("Worker has failed.")
+            finally:
+                logging.shutdown()
+                os._exit(exit_code)
+        self._logger.info("Started worker %s.", pid)
+        self._workers.add(pid)
+        return pid
+
+    def _reap(self):
+        """
+        Collects exited workers. Returns their PIDs.
+        """
+
+        exited_pids = []
+        while self._workers:
+            pid, status = os.waitpid(-1, os.WNOHANG)
+            if not pid:
+                break
+            self._workers.discard(pid)
+            exited_pids.append(pid)
+        return exited_pids
+
+    def _restart(self):
+        """
+        Replaces workers one by one.
+        """
+
+        self._logger.info("Restarting workers ...")
+        for pid in list(self._workers):
+            self._spawn()
+            time.sleep(self._START_DELAY)
+            self._stop(pid)
+        self._logger.info("Workers have restarted.")
+
+    def _stop(self, pid):
+        """
+        Stops the worker gracefully and kills it on timeout.
+        """
+
+        self._workers.discard(pid)
+        try:
+            os.kill(pid, signal.SIGTERM)
+        except ProcessLookupError:
+            pass
+        deadline = time.time() + self._STOP_TIMEOUT
+        while time.time() < deadline:
+            try:
+                stopped_pid, status = os.waitpid(pid, os.WNOHANG)
+            except ChildProcessError:
+                # Already collected.
+                return
+            if stopped_pid:
+                self._logger.info("Worker %s has stopped.", pid)
+                return
+            time.sleep(self._POLL_INTERVAL)
+        self._logger.warning("Killing worker %s ...", pid)
+        os.kill(pid, signal.SIGKILL)
+        os.waitpid(pid, 0)
+
+    def _on_stop(self, signum, frame):
+        self._stop_requested = True
+
+    def _on_restart(self, signum, frame):
+        self._restart_requested = True
@@ -0,0 +1,392 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+In-memory stand-ins for Redis, MongoDB and the rate limiter shared by the tests.
+"""
+
+# noinspection PyPackageRequirements
+import bson.objectid
+import pymongo
+import pymongo.errors
+import redis
+
+
+def _encode(value):
+    """
+    Encodes the value as Redis returns it.
+    """
+
+    if isinstance(value, bytes):
+        return value
+    return str(value).encode("utf-8")
+
+
+class Redis:
+    """
+    Dictionary-backed stand-in for the Redis client that can be switched off.
+
+    Every call, failed ones included, is recorded in commands as (name, args).
+    Executed pipelines are not recorded while Redis is down. Lua scripts are not
+    run: eval() returns None and registered scripts return script_result.
+    """
+
+    def __init__(self):
+        self.values = dict()
+        self.sets = dict()
+        self.lists = dict()
+        self.commands = []
+        self.is_down = False
+        self.script_result = None
+
+    def get(self, key):
+        self._call("get", key)
+        return self.values.get(key)
+
+    def set(self, key, value, ex=None):
+        self._call("set", key, value)
+        self.values[key] = _encode(value)
+
+    def mget(self, keys):
+        self._call("mget", keys)
+        return [self.values.get(key) for key in keys]
+
+    def incr(self, key, amount=1):
+        self._call("incr", key)
+        value = int(self.values.get(key, 0)) + amount
+        self.values[key] = _encode(value)
+        return value
+
+    def exists(self, key):
+        self._call("exists", key)
+        return key in self.values
+
+    def sadd(self, key, *members):
+        self._call("sadd", key, *members)
+        self.sets.setdefault(key, set()).update(members)
+
+    def srem(self, key, *members):
+        self._call("srem", key, *members)
+        self.sets.get(key, set()).difference_update(members)
+
+    def smembers(self, key):
+        self._call("smembers", key)
+        return set(self.sets.get(key, set()))
+
+    def pfadd(self, key, *values):
+        self._call("pfadd", key, *values)
+        self.sets.setdefault(key, set()).update(values)
+
+    def pfcount(self, key):
+        self._call("pfcount", key)
+        return len(self.sets.get(key, set()))
+
+    def llen(self, key):
+        self._call("llen", key)
+        return len(self.lists.get(key, []))
+
+    def lpush(self, key, value):
+        self._call("lpush", key, value)
+        self.lists.setdefault(key, []).insert(0, value)
+
+    def rpush(self, key, value):
+        self._call("rpush", key, value)
+        self.lists.setdefault(key, []).append(value)
+
+    def rpoplpush(self, source, destination):
+        self._call("rpoplpush", source, destination)
+        if not self.lists.get(source):
+            return None
+        value = self.lists[source].pop()
+        self.lists.setdefault(destination, []).insert(0, value)
+        return value
+
+    def lrem(self, key, count, value):
+        self._call("lrem", key, count, value)
+        self.lists[key].remove(value)
+
+    def eval(self, script, key_count, *keys_and_args):
+        self._call("eval", script, key_count, *keys_and_args)
+
+    def register_script(self, script):
+        def run(keys=None, args=None):
+            self._call("script", keys, args)
+            return self.script_result
+        return run
+
+    def pipeline(self, transaction=True):
+        return Pipeline(self)
+
+    def _call(self, name, *args):
+        self.commands.append((name, args))
+        if self.is_down:
+            raise redis.ConnectionError("Redis is down.")
+
+
+class Pipeline:
+    """
+    Buffers the calls and runs them on the Redis stand-in on execute().
+    """
+
+    def __init__(self, redis_client):
+        self._redis = redis_client
+        self._calls = []
+
+    def __getattr__(self, name):
+        return lambda *args, **kwargs: self._calls.append((name, args, kwargs))
+
+    def __len__(self):
+        return len(self._calls)
+
+    def execute(self):
+        if self._redis.is_down:
+            raise redis.ConnectionError("Redis is down.")
+        return [getattr(self._redis, name)(*args, **kwargs) for name, args, kwargs in self._calls]
+
+
+def _get_field(document, path):
+    for name in path.split("."):
+        if not isinstance(document, dict) or name not in document:
+            return None
+        document = document[name]
+    return document
+
+
+def _in_box(value, box):
+    if not isinstance(value, dict):
+        return False
+    (x_min, y_min), (x_max, y_max) = box
+    x, y = list(value.values())[:2]
+    return x_min <= x <= x_max and y_min <= y <= y_max
+
+
+_OPERATORS = {
+    "$gt": lambda value, argument: value is not None and value > argument,
+    "$gte": lambda value, argument: value is not None and value >= argument,
+    "$lt": lambda value, argument: value is not None and value < argument,
+    "$lte": lambda value, argument: value is not None and value <= argument,
+    "$ne": lambda value, argument: value != argument,
+    "$in": lambda value, argument: value in argument,
+    "$geoWithin": lambda value, argument: _in_box(value, argument["$box"]),
+}
+
+
+def _matches(document, spec):
+    """
+    Checks the document against the query. Supports equality and
+    the operators above on dotted paths.
+    """
+
+    for path, condition in spec.items():
+        value = _get_field(document, path)
+        if isinstance(condition, dict) and condition and all(key.startswith("$") for key in condition):
+            for operator, argument in condition.items():
+                if not _OPERATORS[operator](value, argument):
+                    return False
+        elif value != condition:
+            return False
+    return True
+
+
+def _project(document, projection):
+    if not projection:
+        return dict(document)
+    if any(projection.values()):
+        return {
+            name: value
+            for name, value in document.items()
+            if name == "_id" or projection.get(name)
+        }
+    return {name: value for name, value in document.items() if projection.get(name, True)}
+
+
+class Cursor:
+    """
+    List-backed cursor. Like a pymongo cursor, it is its own iterator.
+    """
+
+    def __init__(self, documents, projection=None):
+        self.documents = documents
+        self.limit_value = None
+        self.is_closed = False
+        self._projection = projection
+        self._iterator = None
+
+    def sort(self, key_or_list, direction=None):
+        keys = key_or_list if isinstance(key_or_list, list) else [(key_or_list, direction)]
+        for key, direction in reversed(keys):
+            self.documents.sort(
+                key=lambda document: _get_field(document, key),
+                reverse=direction == pymongo.DESCENDING,
+            )
+        return self
+
+    def limit(self, limit):
+        self.limit_value = limit
+        return self
+
+    def hint(self, index):
+        return self
+
+    def batch_size(self, batch_size):
+        return self
+
+    def close(self):
+        self.is_closed = True
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if self._iterator is None:
+            self._iterator = iter(self.documents[:self.limit_value or None])
+        return _project(next(self._iterator), self._projection)
+
+
+class Bulk:
+    """
+    Bulk write. Inserts are stored and checked against the unique key of
+    the collection. Updates are only recorded in the collection operations
+    as (spec, document, upsert).
+    """
+
+    def __init__(self, collection, ordered):
+        self._collection = collection
+        self._ordered = ordered
+        self._operations = []
+        self._spec = self._upsert = None
+
+    def insert(self, document):
+        document.setdefault("_id", bson.objectid.ObjectId())
+        self._operations.append((None, document, False))
+
+    def find(self, spec):
+        self._spec, self._upsert = spec, False
+        return self
+
+    def upsert(self):
+        self._upsert = True
+        return self
+
+    def update_one(self, document):
+        self._operations.append((self._spec, document, self._upsert))
+
+    def execute(self):
+        operations = self._operations
+        error = self._collection.errors.pop(0) if self._collection.errors else None
+        if error is not None:
+            if not (self._ordered and isinstance(error, pymongo.errors.BulkWriteError)):
+                raise error
+            # The operations before the failed one have been applied.
+            operations = operations[:error.details["writeErrors"][0]["index"]]
+        result = self._apply(operations)
+        if error is not None:
+            raise error
+        if result["writeErrors"]:
+            raise pymongo.errors.BulkWriteError(result)
+        return result
+
+    def _apply(self, operations):
+        inserted_count, write_errors = 0, []
+        keys = {self._collection.unique_key(document) for document in self._collection.documents}
+        for index, (spec, document, upsert) in enumerate(operations):
+            if spec is not None:
+                self._collection.operations.append((spec, document, upsert))
+                continue
+            key = self._collection.unique_key(document)
+            if key in keys:
+                write_errors.append({"index": index, "code": 11000, "errmsg": "E11000 duplicate key error"})
+                if self._ordered:
+                    break
+                continue
+            keys.add(key)
+            self._collection.documents.append(document)
+            inserted_count += 1
+        return {"nInserted": inserted_count, "writeErrors": write_errors, "writeConcernErrors": []}
+
+
+class Collection:
+    """
+    List-backed collection. Queries are recorded in specs and their
+    cursors in cursors. Errors are raised by the next bulk executions,
+    None means success.
+    """
+
+    def __init__(self, documents=(), unique_key=lambda document: document["_id"]):
+        self.documents = list(documents)
+        self.unique_key = unique_key
+        self.specs = []
+        self.cursors = []
+        self.operations = []
+        self.errors = []
+
+    def find(self, spec=None, projection=None):
+        spec = spec or dict()
+        self.specs.append(spec)
+        self.cursors.append(Cursor([
+            document
+            for document in self.documents
+            if _matches(document, spec)
+        ], projection))
+        return self.cursors[-1]
+
+    def find_one(self, spec_or_id):
+        spec = spec_or_id if isinstance(spec_or_id, dict) else {"_id": spec_or_id}
+        return next(iter(self.find(spec)), None)
+
+    def update(self, spec, document, upsert=False):
+        """
+        Applies $set to the first matching document.
+        """
+
+        if set(document) != {"$set"}:
+            raise ValueError("Unsupported update: %s." % document)
+        target = next((target for target in self.documents if _matches(target, spec)), None)
+        if target is None:
+            if not upsert:
+                return
+            target = {path: value for path, value in spec.items() if not isinstance(value, dict)}
+            self.documents.append(target)
+        target.update(document["$set"])
+
+    def remove(self, spec):
+        self.documents = [document for document in self.documents if not _matches(document, spec)]
+
+    def count(self):
+        return len(self.documents)
+
+    def initialize_ordered_bulk_op(self):
+        return Bulk(self, True)
+
+    def initialize_unordered_bulk_op(self):
+        return Bulk(self, False)
+
+
+class DB:
+    """
+    Database whose collections are created on first access.
+    """
+
+    def __init__(self, **collections):
+        self.__dict__.update(collections)
+
+    def __getattr__(self, name):
+        if name.startswith("_"):
+            raise AttributeError(name)
+        collection = Collection()
+        setattr(self, name, collection)
+        return collection
+
+
+class RateLimiter:
+    """
+    Records the costs and answers with the configured retry time.
+    """
+
+    def __init__(self, retry_after=0):
+        self.costs = []
+        self.retry_after = retry_after
+
+    def limit(self, budget, identities, cost):
+        self.costs.append(cost)
+        return self.retry_after
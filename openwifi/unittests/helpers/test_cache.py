@@ -0,0 +1,44 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import unittest
+
+from openwifi.helpers.cache import (
+    Cache,
+    LruCache,
+)
+from openwifi.unittests import fakes
+
+
+class TestLruCache(unittest.TestCase):
+    def test_evicts_least_recently_used(self):
+        cache = LruCache(2)
+        cache.set("a", 1, 60)
+        cache.set("b", 2, 60)
+        cache.get("a")
+        cache.set("c", 3, 60)
+        self.assertEqual((cache.get("a"), cache.get("b"), cache.get("c")), (1, None, 3))
+
+    def test_expires(self):
+        cache = LruCache(2)
+        cache.set("a", 1, -1)
+        self.assertIsNone(cache.get("a"))
+
+
+class TestCache(unittest.TestCase):
+    def setUp(self):
+        self.redis = fakes.Redis()
+        self.cache = Cache(self.redis, 16)
+
+    def test_local_value_served_while_down(self):
+        self.cache.set("token", b"user", ex=60, local=True)
+        self.redis.is_down = True
+        self.assertEqual(self.cache.get("token", local=True), b"user")
+        self.assertIsNone(self.cache.get("other"))
+
+    def test_bypasses_after_failure(self):
+        self.redis.is_down = True
+        self.assertEqual(self.cache.mget(["a", "b"]), [None, None])
+        self.assertFalse(self.cache.available)
+        self.cache.set("a", b"1")
+        self.assertEqual(len(self.redis.commands), 1)
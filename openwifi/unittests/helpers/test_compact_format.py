@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import unittest
+
+# noinspection PyPackageRequirements
+import bson.objectid
+
+from openwifi.helpers.compact_format import (
+    decode,
+    encode,
+    Encoder,
+)
+
+
+_scan_results = [{
+    "_id": bson.objectid.ObjectId("52a4b1e0e4b0c2d1a5f3e001"),
+    "bssid": "02:29:e9:87:78:86",
+    "ssid": "Home",
+    "ts": 1386500000000,
+    "acc": 25.5,
+    "loc": {"lat": 59.9342802, "lon": 30.3350986},
+}, {
+    "_id": bson.objectid.ObjectId("52a4b1e0e4b0c2d1a5f3e002"),
+    "bssid": "00:1f:3c:aa:bb:cc",
+    "ssid": "Кафе",
+    "ts": 1386499990000,
+    "acc": 10,
+    "loc": {"lat": -33.8688197, "lon": -151.2092955},
+}, {
+    "_id": bson.objectid.ObjectId("52a4b1e0e4b0c2d1a5f3e003"),
+    "bssid": "02:29:e9:87:78:87",
+    "ssid": "Home",
+    "ts": 1386500005000,
+    "acc": 0.0,
+    "loc": {"lat": 0.0, "lon": 180.0},
+}]
+
+
+class TestCompactFormat(unittest.TestCase):
+    def test_round_trip(self):
+        self.assertEqual(decode(encode(_scan_results, with_ids=True)), _scan_results)
+
+    def test_round_trip_without_ids(self):
+        scan_results = decode(encode(_scan_results))
+        self.assertNotIn("_id", scan_results[0])
+        self.assertEqual(scan_results[1]["ssid"], "Кафе")
+
+    def test_multiple_frames(self):
+        encoder = Encoder(with_ids=True)
+        data = b"".join((
+            encoder.begin(),
+            encoder.encode(_scan_results[:1]),
+            encoder.encode(_scan_results[1:]),
+            encoder.end(),
+        ))
+        self.assertEqual(decode(data), _scan_results)
+
+    def test_truncated(self):
+        self.assertRaises(ValueError, decode, encode(_scan_results)[:-3])
+
+    def test_invalid_magic(self):
+        self.assertRaises(ValueError, decode, b"JSON\x01\x00\x00")
@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import threading
+import unittest
+
+from openwifi.helpers.executor import BoundedExecutor, ExecutorBusyError
+
+
+class TestBoundedExecutor(unittest.TestCase):
+    def setUp(self):
+        self.executor = BoundedExecutor(1, 1)
+        self.event = threading.Event()
+        self.addCleanup(self.executor.shutdown)
+        # Unblock the calls before shutting down.
+        self.addCleanup(self.event.set)
+
+    def _wait_done(self, future):
+        # Callbacks run in order, so the slot is free once the later one has run.
+        done = threading.Event()
+        future.add_done_callback(lambda _: done.set())
+        self.assertTrue(done.wait(1.0))
+
+    def test_submit(self):
+        self.assertEqual(self.executor.submit(lambda x, y: x + y, 1, y=2).result(timeout=1.0), 3)
+
+    def test_busy(self):
+        # One running and one queued call.
+        futures = [self.executor.submit(self.event.wait) for _ in range(2)]
+        self.assertRaises(ExecutorBusyError, self.executor.submit, self.event.wait)
+        self.event.set()
+        for future in futures:
+            self._wait_done(future)
+        # The completed calls have freed their slots.
+        futures = [self.executor.submit(self.event.wait) for _ in range(2)]
+        for future in futures:
+            future.result(timeout=1.0)
+
+    def test_release_on_failure(self):
+        def fail():
+            raise RuntimeError("Failed.")
+
+        for _ in range(3):
+            future = self.executor.submit(fail)
+            self._wait_done(future)
+            self.assertRaises(RuntimeError, future.result)
+        self.assertEqual(self.executor.submit(lambda: 42).result(timeout=1.0), 42)
+
+    def test_release_on_submit_failure(self):
+        self.executor._executor.shutdown()
+        for _ in range(3):
+            self.assertRaises(RuntimeError, self.executor.submit, lambda: 42)
+        # The semaphore would raise ValueError if released more than acquired.
+        self.assertEqual(self.executor._semaphore._value, 2)
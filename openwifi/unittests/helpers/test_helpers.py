@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import unittest
+import unittest.mock
+
+import pymongo.errors
+
+from openwifi.helpers import Statistics, bulk_insert
+from openwifi.helpers.cache import Cache
+from openwifi.unittests import fakes
+
+
+def _bulk_write_error(inserted_count, write_errors=(), write_concern_errors=()):
+    return pymongo.errors.BulkWriteError({
+        "nInserted": inserted_count,
+        "writeErrors": list(write_errors),
+        "writeConcernErrors": list(write_concern_errors),
+    })
+
+
+class TestBulkInsert(unittest.TestCase):
+    def setUp(self):
+        self.collection = fakes.Collection([{"_id": 2}])
+
+    def test_insert(self):
+        documents = [{"_id": index} for index in range(5)]
+        self.assertEqual(bulk_insert(self.collection, documents, 2), (4, [{"_id": 2}]))
+        self.assertEqual(sorted(document["_id"] for document in self.collection.documents), [0, 1, 2, 3, 4])
+
+    def test_empty(self):
+        self.assertEqual(bulk_insert(self.collection, [], 2), (0, []))
+
+    def test_duplicate_codes(self):
+        documents = [{"_id": index} for index in range(10, 13)]
+        self.collection.errors = [_bulk_write_error(1, [
+            {"index": 0, "code": 11000, "errmsg": "E11000 duplicate key error"},
+            {"index": 2, "code": 11001, "errmsg": "E11001 duplicate key on update"},
+        ])]
+        self.assertEqual(bulk_insert(self.collection, documents, 3), (1, [{"_id": 10}, {"_id": 12}]))
+
+    def test_partial_failure(self):
+        # The first chunk is counted, the second one fails.
+        self.collection.errors = [None, _bulk_write_error(1, [
+            {"index": 0, "code": 11000, "errmsg": "E11000 duplicate key error"},
+            {"index": 1, "code": 121, "errmsg": "Document failed validation"},
+        ])]
+        with self.assertRaises(pymongo.errors.BulkWriteError) as context:
+            bulk_insert(self.collection, [{"_id": index} for index in range(10, 14)], 2)
+        self.assertEqual(context.exception.details["nInserted"], 1)
+        self.assertEqual([document["_id"] for document in self.collection.documents], [2, 10, 11])
+
+    def test_write_concern_error(self):
+        self.collection.errors = [_bulk_write_error(1, write_concern_errors=[
+            {"code": 64, "errmsg": "waiting for replication timed out"},
+        ])]
+        self.assertRaises(pymongo.errors.BulkWriteError, bulk_insert, self.collection, [{"_id": 10}], 2)
+
+
+class TestStatistics(unittest.TestCase):
+    def setUp(self):
+        # Values are cached process-wide.
+        Statistics._values.clear()
+        self.addCleanup(Statistics._values.clear)
+        self.redis = fakes.Redis()
+        self.redis.sets[Statistics.SSID_KEY] = {"Network"}
+        self.redis.sets[Statistics.BSSID_KEY] = {"02:29:e9:87:78:86", "02:29:e9:87:78:87"}
+        self.statistics = Statistics(Cache(self.redis, 16))
+        self.time = 1000.0
+        patcher = unittest.mock.patch("time.time", lambda: self.time)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _get_pfcounts(self):
+        return [args for name, args in self.redis.commands if name == "pfcount"]
+
+    def test_get(self):
+        self.assertEqual(self.statistics.ssid_count, 1)
+        self.assertEqual(self.statistics.bssid_count, 2)
+        self.assertEqual(self._get_pfcounts(), [(Statistics.SSID_KEY,), (Statistics.BSSID_KEY,)])
+
+    def test_ttl(self):
+        self.assertEqual(self.statistics.bssid_count, 2)
+        self.redis.sets[Statistics.BSSID_KEY].add("02:29:e9:87:78:88")
+        self.time += Statistics._TTL
+        self.assertEqual(self.statistics.bssid_count, 2)
+        self.assertEqual(len(self._get_pfcounts()), 1)
+        self.time += 1.0
+        self.assertEqual(self.statistics.bssid_count, 3)
+        self.assertEqual(len(self._get_pfcounts()), 2)
+
+    def test_redis_down(self):
+        self.redis.is_down = True
+        self.assertIsNone(self.statistics.bssid_count)
+        self.redis.is_down = False
+        # Wait for the cache to retry Redis.
+        self.time += Cache._RETRY_INTERVAL
+        self.assertEqual(self.statistics.bssid_count, 2)
+        # The outdated value is kept.
+        self.redis.is_down = True
+        self.time += Statistics._TTL + 1.0
+        self.assertEqual(self.statistics.bssid_count, 2)
+
+    def test_unknown_key(self):
+        self.assertIsNone(self.statistics._get_value("unknown"))
+
+    def test_update(self):
+        pipeline = self.redis.pipeline()
+        Statistics.update(pipeline, [
+            {"ssid": "Network", "bssid": "02:29:e9:87:78:86"},
+            {"ssid": "Network 2", "bssid": "02:29:e9:87:78:88"},
+            {"ssid": "Network 2", "bssid": "02:29:e9:87:78:88"},
+        ])
+        pipeline.execute()
+        self.assertEqual(self.redis.sets[Statistics.SSID_KEY], {"Network", "Network 2"})
+        self.assertEqual(
+            self.redis.sets[Statistics.BSSID_KEY],
+            {"02:29:e9:87:78:86", "02:29:e9:87:78:87", "02:29:e9:87:78:88"},
+        )
+        self.assertEqual(self.statistics.ssid_count, 2)
+        self.assertEqual(self.statistics.bssid_count, 3)
+
+    def test_update_empty(self):
+        pipeline = self.redis.pipeline()
+        Statistics.update(pipeline, [])
+        # PFADD without elements would only create the key.
+        self.assertEqual(len(pipeline), 0)
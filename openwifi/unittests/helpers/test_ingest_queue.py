@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import unittest
+
+from openwifi.helpers.ingest_queue import (
+    IngestQueue,
+    QueueFullError,
+)
+from openwifi.unittests import fakes
+
+
+class TestIngestQueue(unittest.TestCase):
+    def setUp(self):
+        self.cache = fakes.Redis()
+        self.queue = IngestQueue(self.cache, 2, "consumer")
+
+    def test_push_full(self):
+        self.queue.push([{"bssid": "02:29:e9:87:78:86"}])
+        self.queue.push([{"bssid": "02:29:e9:87:78:87"}])
+        self.assertRaises(QueueFullError, self.queue.push, [])
+
+    def test_pop_acknowledge(self):
+        self.queue.push([{"bssid": "02:29:e9:87:78:86"}])
+        self.queue.push([{"bssid": "02:29:e9:87:78:87"}])
+        items = self.queue.pop(1024)
+        self.assertEqual(
+            [scan_result["bssid"] for item in items for scan_result in self.queue.decode(item)],
+            ["02:29:e9:87:78:86", "02:29:e9:87:78:87"],
+        )
+        self.assertEqual(self.queue.depth(), 0)
+        self.assertEqual(self.cache.llen(self.queue.processing_key), 2)
+        self.queue.acknowledge(items)
+        self.assertEqual(self.cache.llen(self.queue.processing_key), 0)
+
+    def test_pop_max_size(self):
+        self.queue.push([{"bssid": "02:29:e9:87:78:86"}])
+        self.queue.push([{"bssid": "02:29:e9:87:78:87"}])
+        self.assertEqual(len(self.queue.pop(1)), 1)
+        self.assertEqual(self.queue.depth(), 1)
+
+    def test_requeue(self):
+        self.queue.push([{"bssid": "02:29:e9:87:78:86"}])
+        self.queue.push([{"bssid": "02:29:e9:87:78:87"}])
+        first_item, = self.queue.pop(1)
+        self.queue.requeue([first_item])
+        self.assertEqual(self.queue.pop(1), [first_item])
+
+    def test_recover_own(self):
+        self.queue.push([{"bssid": "02:29:e9:87:78:86"}])
+        item, = self.queue.pop(1)
+        self.assertEqual(self.queue.recover(), 0)
+        # A new process with the same ID.
+        self.assertEqual(IngestQueue(self.cache, 2, "consumer").recover(include_own=True), 1)
+        self.assertEqual(self.queue.pop(1), [item])
+
+    def test_recover_dead_consumer(self):
+        other_queue = IngestQueue(self.cache, 2, "other")
+        self.queue.push([{"bssid": "02:29:e9:87:78:86"}])
+        self.queue.heartbeat()
+        item, = self.queue.pop(1)
+        # The consumer is alive.
+        self.assertEqual(other_queue.recover(), 0)
+        self.assertEqual(self.queue.depth(), 0)
+        # The heartbeat has expired.
+        del self.cache.values["ingest:heartbeat:consumer"]
+        self.assertEqual(other_queue.recover(), 1)
+        self.assertEqual(other_queue.pop(1), [item])
+        self.assertNotIn("consumer", self.cache.smembers(IngestQueue.CONSUMERS_KEY))
@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import unittest
+import unittest.mock
+
+import pymongo.errors
+
+from openwifi.helpers import tiles
+from openwifi.helpers.cache import Cache
+from openwifi.helpers.ingestor import Ingestor
+from openwifi.unittests import fakes
+
+
+def _make_scan_result(bssid, lat):
+    return {
+        "bssid": bssid,
+        "ssid": "Network",
+        "ts": 1400000000000,
+        "acc": 10.0,
+        "loc": {"lat": lat, "lon": 30.33},
+        "cid": "client",
+        "uid": None,
+    }
+
+
+class TestIngestor(unittest.TestCase):
+    def setUp(self):
+        self.db = fakes.DB(scan_results=fakes.Collection(
+            unique_key=lambda scan_result: (scan_result["cid"], scan_result["ts"], scan_result["bssid"]),
+        ))
+        self.redis = fakes.Redis()
+        self.cache = Cache(self.redis, 16)
+        self.ingestor = Ingestor(self.db, self.cache)
+
+    def _get_counts(self):
+        return [
+            (spec["_id"], document["$inc"]["n"])
+            for spec, document, upsert in self.db.networks.operations
+            if "$inc" in document
+        ]
+
+    def _get_invalidated_keys(self):
+        return {args[0] for name, args in self.redis.commands if name == "incr"}
+
+    def test_ingest(self):
+        self.assertEqual(self.ingestor.ingest([
+            _make_scan_result("02:29:e9:87:78:86", 59.93),
+            _make_scan_result("02:29:e9:87:78:86", 59.93),
+        ]), (1, 1))
+        self.assertEqual(self._get_invalidated_keys(), {tiles.get_version_key(tiles.get_tile_id(59.93, 30.33))})
+
+    def test_invalidation_retried(self):
+        self.redis.is_down = True
+        self.ingestor.ingest([_make_scan_result("02:29:e9:87:78:86", 59.93)])
+        self.assertEqual(self.redis.commands, [])
+        # Redis is back after the bypass interval.
+        self.redis.is_down = False
+        self.cache._retry_time = 0.0
+        self.ingestor.flush()
+        self.assertEqual(self._get_invalidated_keys(), {tiles.get_version_key(tiles.get_tile_id(59.93, 30.33))})
+        # Nothing is pending anymore.
+        self.redis.commands = []
+        self.ingestor.flush()
+        self.assertEqual(self.redis.commands, [])
+
+    def test_invalidation_sent_with_next_batch(self):
+        self.redis.is_down = True
+        self.ingestor.ingest([_make_scan_result("02:29:e9:87:78:86", 59.93)])
+        self.redis.is_down = False
+        self.cache._retry_time = 0.0
+        self.ingestor.ingest([_make_scan_result("02:29:e9:87:78:87", 55.75)])
+        self.assertEqual(self._get_invalidated_keys(), {
+            tiles.get_version_key(tiles.get_tile_id(59.93, 30.33)),
+            tiles.get_version_key(tiles.get_tile_id(55.75, 30.33)),
+        })
+
+    def test_networks_folded_on_retry(self):
+        scan_result = _make_scan_result("02:29:e9:87:78:86", 59.93)
+        # The counts are added, then folding fails.
+        self.db.networks.errors = [None, pymongo.errors.AutoReconnect()]
+        with self.assertRaises(pymongo.errors.AutoReconnect):
+            self.ingestor.ingest([dict(scan_result)])
+        self.assertEqual(self._get_counts(), [("02:29:e9:87:78:86", 1)])
+        # The batch is ingested again and its scan results are duplicates now.
+        self.db.networks.operations = []
+        self.assertEqual(self.ingestor.ingest([dict(scan_result)]), (0, 1))
+        self.assertEqual(self._get_counts(), [])
+        self.assertIn(({"_id": "02:29:e9:87:78:86"}, unittest.mock.ANY, True), self.db.networks.operations)
+        self.assertEqual(self._get_invalidated_keys(), {tiles.get_version_key(tiles.get_tile_id(59.93, 30.33))})
+
+    def test_counts_retried(self):
+        self.db.networks.errors = [pymongo.errors.AutoReconnect()]
+        self.assertEqual(self.ingestor.ingest([_make_scan_result("02:29:e9:87:78:86", 59.93)]), (1, 0))
+        self.assertEqual(self._get_counts(), [])
+        self.ingestor.flush()
+        self.assertEqual(self._get_counts(), [("02:29:e9:87:78:86", 1)])
+        # The counts are added once.
+        self.ingestor.flush()
+        self.assertEqual(self._get_counts(), [("02:29:e9:87:78:86", 1)])
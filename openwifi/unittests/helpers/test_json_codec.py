@@ -0,0 +1,28 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import json
+import unittest
+
+# noinspection PyPackageRequirements
+import bson.objectid
+
+from openwifi.helpers import json_codec
+
+
+class TestJsonCodec(unittest.TestCase):
+    def test_dumps_object_id(self):
+        object_id = bson.objectid.ObjectId()
+        data = json_codec.dumps({"_id": object_id, "ssid": "Сеть"})
+        self.assertIsInstance(data, bytes)
+        self.assertEqual(json.loads(data.decode("utf-8")), {"_id": str(object_id), "ssid": "Сеть"})
+
+    def test_dumps_unsupported(self):
+        self.assertRaises(TypeError, json_codec.dumps, {"value": object()})
+
+    def test_loads_bytes(self):
+        self.assertEqual(json_codec.loads('[{"ssid": "Сеть"}]'.encode("utf-8")), [{"ssid": "Сеть"}])
+
+    def test_loads_invalid(self):
+        self.assertRaises(ValueError, json_codec.loads, b"[")
+        self.assertRaises(ValueError, json_codec.loads, b"\xff")
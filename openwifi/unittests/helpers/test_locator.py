@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import unittest
+
+from openwifi.helpers import locator
+from openwifi.helpers import spatial_index
+
+
+class _SpatialIndex(spatial_index.SpatialIndex):
+    def __init__(self, networks):
+        super(_SpatialIndex, self).__init__()
+        self.update(networks)
+        self.lookup_count = 0
+
+    def lookup(self, bssids):
+        self.lookup_count += 1
+        return super(_SpatialIndex, self).lookup(bssids)
+
+
+def _make_network(bssid, lat, lon, acc=10.0):
+    return {"_id": bssid, "acc": acc, "loc": {"lat": lat, "lon": lon}}
+
+
+class TestLocator(unittest.TestCase):
+    def setUp(self):
+        self.spatial_index = _SpatialIndex([
+            _make_network("00:00:00:00:00:01", 55.750, 37.6),
+            _make_network("00:00:00:00:00:02", 55.752, 37.6),
+            # Moved access point.
+            _make_network("00:00:00:00:00:03", 59.93, 30.31),
+        ])
+        self.locator = locator.Locator(self.spatial_index, 16)
+
+    def test_locate_single(self):
+        lat, lon, acc = self.locator.locate([("00:00:00:00:00:01", -60)])
+        self.assertEqual((lat, lon, acc), (55.75, 37.6, 10.0))
+
+    def test_locate_weighted(self):
+        lat, lon, acc = self.locator.locate([
+            ("00:00:00:00:00:01", -50),
+            ("00:00:00:00:00:02", -70),
+            ("00:00:00:00:00:03", -80),
+            ("00:00:00:00:00:04", -40),
+        ])
+        # The stronger network pulls the estimate. The moved one is ignored.
+        self.assertTrue(55.750 < lat < 55.751)
+        self.assertAlmostEqual(lon, 37.6)
+        self.assertTrue(10.0 < acc < 223.0)
+
+    def test_locate_unknown(self):
+        self.assertIsNone(self.locator.locate([("00:00:00:00:00:04", -40)]))
+
+    def test_cache(self):
+        self.locator.locate([("00:00:00:00:00:01", -61), ("00:00:00:00:00:02", -70)])
+        # Same observations with rounded levels.
+        self.locator.locate([("00:00:00:00:00:02", -69), ("00:00:00:00:00:01", -59)])
+        self.assertEqual(self.spatial_index.lookup_count, 1)
+        self.assertIsNone(self.locator.locate([("00:00:00:00:00:04", -40)]))
+        self.assertIsNone(self.locator.locate([("00:00:00:00:00:04", -40)]))
+        self.assertEqual(self.spatial_index.lookup_count, 2)
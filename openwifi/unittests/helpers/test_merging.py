@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import unittest
+
+from openwifi.helpers import merging
+
+
+def _make_scan_result(ts, lat, acc, bssid="02:29:e9:87:78:86"):
+    return {
+        "bssid": bssid,
+        "ssid": "Network",
+        "ts": ts,
+        "acc": acc,
+        "loc": {"lat": lat, "lon": 37.62},
+        "cid": "client",
+        "uid": None,
+    }
+
+
+class TestMerging(unittest.TestCase):
+    def test_get_distance(self):
+        # One thousandth of a degree of latitude is about 111 m.
+        self.assertAlmostEqual(
+            merging.get_distance({"lat": 55.75, "lon": 37.62}, {"lat": 55.751, "lon": 37.62}),
+            111.2,
+            places=1,
+        )
+
+    def test_merge(self):
+        scan_results = merging.merge([
+            _make_scan_result(2000, 55.7501, 20.0),
+            _make_scan_result(1000, 55.7500, 10.0),
+            # Too far.
+            _make_scan_result(3000, 55.7600, 10.0),
+            # Too late.
+            _make_scan_result(100000, 55.7500, 10.0),
+            # Another BSSID.
+            _make_scan_result(1000, 55.7500, 10.0, bssid="02:29:e9:87:78:87"),
+        ], 60, 50)
+        self.assertEqual(len(scan_results), 4)
+        merged_scan_result = scan_results[0]
+        self.assertEqual((merged_scan_result["ts"], merged_scan_result["acc"]), (2000, 10.0))
+        # The more accurate sighting has four times the weight.
+        self.assertAlmostEqual(merged_scan_result["loc"]["lat"], 55.75002)
+
+    def test_fixed_windows(self):
+        scan_results = merging.merge([
+            _make_scan_result(50000, 55.7500, 10.0),
+            # The next window has started.
+            _make_scan_result(70000, 55.7500, 10.0),
+            _make_scan_result(110000, 55.7500, 10.0),
+        ], 60, 50)
+        self.assertEqual(sorted(scan_result["ts"] for scan_result in scan_results), [50000, 110000])
+
+    def test_retry(self):
+        sightings = [
+            _make_scan_result(ts, 55.75 + ts * 1e-10, 10.0 + ts % 7, bssid=bssid)
+            for ts in range(0, 300000, 13000)
+            for bssid in ("02:29:e9:87:78:86", "02:29:e9:87:78:87")
+        ]
+
+        def key(scan_result):
+            return scan_result["bssid"], scan_result["ts"]
+
+        expected = sorted(merging.merge(sightings, 60, 50), key=key)
+        # The same batch in another order.
+        self.assertEqual(sorted(merging.merge(sightings[::-1], 60, 50), key=key), expected)
+        # Batches split on window boundaries regardless of the first sighting.
+        for split_ts in (60000, 180000):
+            batches = (
+                [scan_result for scan_result in sightings if scan_result["ts"] < split_ts],
+                [scan_result for scan_result in sightings if scan_result["ts"] >= split_ts],
+            )
+            scan_results = [scan_result for batch in batches for scan_result in merging.merge(batch, 60, 50)]
+            self.assertEqual(sorted(scan_results, key=key), expected)
@@ -0,0 +1,45 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import unittest
+
+from openwifi.helpers import metrics
+from openwifi.helpers.cache import Cache
+from openwifi.unittests import fakes
+
+
+class TestMetrics(unittest.TestCase):
+    def test_collect_sums_processes(self):
+        cache = Cache(fakes.Redis(), 16)
+        metrics.INGESTED_SCAN_RESULTS.inc("inserted", amount=3)
+        metrics.publish(cache)
+        # Pretend another process has published the same snapshot.
+        cache.redis.values["metrics:other:1"] = next(iter(cache.redis.values.values()))
+        cache.redis.sadd(metrics._KEYS_KEY, "metrics:other:1")
+        merged_snapshot = metrics.collect(cache)
+        inserted_count = dict(
+            (tuple(labels), value)
+            for labels, value in metrics.INGESTED_SCAN_RESULTS.snapshot()
+        )[("inserted", )]
+        self.assertEqual(
+            merged_snapshot["openwifi_ingested_scan_results_total"][("inserted", )],
+            2 * inserted_count,
+        )
+
+    def test_collect_forgets_expired_processes(self):
+        cache = Cache(fakes.Redis(), 16)
+        metrics.publish(cache)
+        cache.redis.sadd(metrics._KEYS_KEY, "metrics:expired:1")
+        metrics.collect(cache)
+        self.assertNotIn("metrics:expired:1", cache.smembers(metrics._KEYS_KEY))
+        self.assertEqual(len(cache.smembers(metrics._KEYS_KEY)), 1)
+
+    def test_render_histogram(self):
+        # Render the snapshot of a single observation of 7.
+        buckets = [int(7 <= bound) for bound in metrics.SIZE_BUCKETS]
+        text = metrics.render({"openwifi_ingest_batch_size": {(): buckets + [7, 1]}})
+        self.assertIn('openwifi_ingest_batch_size_bucket{le="1"} 0', text)
+        self.assertIn('openwifi_ingest_batch_size_bucket{le="10"} 1', text)
+        self.assertIn('openwifi_ingest_batch_size_bucket{le="+Inf"} 1', text)
+        self.assertIn("openwifi_ingest_batch_size_sum 7", text)
+        self.assertIn("openwifi_ingest_batch_size_count 1", text)
@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import unittest
+
+import pymongo.errors
+
+from openwifi.helpers import networks
+from openwifi.unittests import fakes
+
+
+def _make_db(errors=()):
+    db = fakes.DB()
+    db.networks.errors = list(errors)
+    return db
+
+
+def _make_scan_result(bssid, ssid, ts, acc):
+    return {
+        "bssid": bssid,
+        "ssid": ssid,
+        "ts": ts,
+        "acc": acc,
+        "loc": {"lat": 55.75, "lon": acc},
+    }
+
+
+class TestNetworks(unittest.TestCase):
+    def test_update(self):
+        db = _make_db()
+        networks.update(db, [
+            _make_scan_result("02:29:e9:87:78:86", "Old", 1000, 20.0),
+            _make_scan_result("02:29:e9:87:78:86", "New", 3000, 30.0),
+            _make_scan_result("02:29:e9:87:78:86", "Middle", 2000, 10.0),
+            _make_scan_result("02:29:e9:87:78:87", "Other", 1000, 5.0),
+        ])
+        operations = db.networks.operations
+        self.assertEqual(len(operations), 6)
+        (spec, upsert_document, upsert), (ssid_spec, ssid_document, _), (loc_spec, loc_document, _) = operations[:3]
+        self.assertEqual(spec, {"_id": "02:29:e9:87:78:86"})
+        self.assertTrue(upsert)
+        self.assertNotIn("$inc", upsert_document)
+        self.assertEqual(upsert_document["$max"], {"ts": 3000})
+        self.assertEqual(upsert_document["$min"], {"acc": 10.0})
+        self.assertIn("seq", upsert_document["$set"])
+        # The SSID is set only if this batch has the latest sighting and it has changed.
+        self.assertEqual(ssid_spec, {"_id": "02:29:e9:87:78:86", "ts": 3000, "ssid": {"$ne": "New"}})
+        self.assertEqual(ssid_document["$set"]["ssid"], "New")
+        # The location is set only if this batch has the best sighting and it has changed.
+        loc = {"lat": 55.75, "lon": 10.0}
+        self.assertEqual(loc_spec, {"_id": "02:29:e9:87:78:86", "acc": 10.0, "loc": {"$ne": loc}})
+        self.assertEqual(loc_document["$set"]["loc"], loc)
+        # Synchronization sees the changes made after the upsert.
+        seqs = [upsert_document["$set"]["seq"], ssid_document["$set"]["seq"], loc_document["$set"]["seq"]]
+        self.assertEqual(seqs, sorted(set(seqs)))
+
+    def test_update_idempotent(self):
+        db = _make_db()
+        scan_results = [_make_scan_result("02:29:e9:87:78:86", "First", 1000, 20.0)]
+        networks.update(db, scan_results)
+        networks.update(db, scan_results)
+        # The operations differ in sequence values only.
+        self.assertEqual(len(db.networks.operations), 6)
+        for (spec, document, upsert), (other_spec, other_document, _) in zip(
+            db.networks.operations[:3],
+            db.networks.operations[3:],
+        ):
+            self.assertEqual(spec, other_spec)
+            self.assertEqual(
+                {operator: fields for operator, fields in document.items() if operator != "$set"},
+                {operator: fields for operator, fields in other_document.items() if operator != "$set"},
+            )
+
+    def test_add_counts(self):
+        db = _make_db()
+        networks.add_counts(db, {"02:29:e9:87:78:86": 3, "02:29:e9:87:78:87": 1})
+        self.assertEqual(sorted(db.networks.operations, key=lambda operation: operation[0]["_id"]), [
+            ({"_id": "02:29:e9:87:78:86"}, {"$inc": {"n": 3}}, True),
+            ({"_id": "02:29:e9:87:78:87"}, {"$inc": {"n": 1}}, True),
+        ])
+
+    def test_update_retries_upsert_collision(self):
+        db = _make_db([pymongo.errors.BulkWriteError({
+            "writeErrors": [{"index": 3, "code": 11000, "errmsg": "E11000 duplicate key error"}],
+            "writeConcernErrors": [],
+        })])
+        networks.update(db, [
+            _make_scan_result("02:29:e9:87:78:86", "First", 1000, 20.0),
+            _make_scan_result("02:29:e9:87:78:87", "Second", 1000, 20.0),
+        ])
+        # The operations before the failed one have been applied,
+        # the rest are executed again from the failed one.
+        self.assertEqual(
+            [spec["_id"] for spec, document, upsert in db.networks.operations],
+            ["02:29:e9:87:78:86"] * 3 + ["02:29:e9:87:78:87"] * 3,
+        )
+        self.assertEqual(db.networks.errors, [])
+
+    def test_update_fails_on_other_errors(self):
+        db = _make_db([pymongo.errors.BulkWriteError({
+            "writeErrors": [{"index": 0, "code": 2, "errmsg": "Bad value"}],
+            "writeConcernErrors": [],
+        })])
+        with self.assertRaises(pymongo.errors.BulkWriteError):
+            networks.update(db, [_make_scan_result("02:29:e9:87:78:86", "First", 1000, 20.0)])
+
+    def test_update_empty(self):
+        db = _make_db()
+        networks.update(db, [])
+        self.assertEqual(db.networks.operations, [])
@@ -0,0 +1,37 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import unittest
+
+from openwifi.helpers.cache import Cache
+from openwifi.helpers.rate_limiter import RateLimiter
+from openwifi.unittests import fakes
+
+
+def _make_cache(result):
+    redis_client = fakes.Redis()
+    redis_client.script_result = result
+    return Cache(redis_client, 16)
+
+
+class TestRateLimiter(unittest.TestCase):
+    def test_disabled_budget(self):
+        cache = _make_cache([0, b"1.5"])
+        rate_limiter = RateLimiter(cache, {"get": (0, 0)})
+        self.assertEqual(rate_limiter.limit("get", [b"client:1"], 1), 0)
+        self.assertEqual(cache.redis.commands, [])
+
+    def test_limited(self):
+        cache = _make_cache([0, b"1.5"])
+        rate_limiter = RateLimiter(cache, {"post": (10.0, 100.0)})
+        self.assertEqual(rate_limiter.limit("post", [b"client:1", b"user:2"], 1000), 1.5)
+        (name, (keys, args)), = cache.redis.commands
+        self.assertEqual(keys, [b"rate:post:client:1", b"rate:post:user:2"])
+        # The cost larger than the capacity is charged in full.
+        self.assertEqual(args[1:], [1000, 100.0, 10.0, 100.0, 10.0])
+
+    def test_unavailable(self):
+        cache = _make_cache([0, b"1.5"])
+        cache.redis.is_down = True
+        rate_limiter = RateLimiter(cache, {"post": (10.0, 100.0)})
+        self.assertEqual(rate_limiter.limit("post", [b"client:1"], 1), 0)
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import random
+import unittest
+
+from openwifi.helpers import spatial_index
+
+
+def _make_network(value, lat, lon):
+    return {"_id": spatial_index.unpack_bssid(value), "acc": 10.0, "loc": {"lat": lat, "lon": lon}}
+
+
+class TestSpatialIndex(unittest.TestCase):
+    def test_pack_bssid(self):
+        self.assertEqual(spatial_index.pack_bssid("02:29:e9:87:78:86"), 0x0229e9877886)
+        self.assertEqual(spatial_index.unpack_bssid(0x0229e9877886), "02:29:e9:87:78:86")
+
+    def test_nearest(self):
+        random.seed(0)
+        networks = [
+            _make_network(value, random.uniform(55.7, 55.8), random.uniform(37.5, 37.7))
+            for value in range(2000)
+        ]
+        index = spatial_index.SpatialIndex()
+        index.update(networks)
+        self.assertEqual(len(index), 2000)
+        nearest = index.nearest(55.75, 37.6, 10, index.MAX_RADIUS)
+        # Compare to the search over the whole area.
+        self.assertEqual(nearest, index.within(55.75, 37.6, index.MAX_RADIUS, len(networks))[:10])
+        self.assertEqual(
+            [distance for distance, _, _, _ in nearest],
+            sorted(distance for distance, _, _, _ in nearest),
+        )
+
+    def test_within(self):
+        index = spatial_index.SpatialIndex()
+        index.update([
+            _make_network(1, 55.75, 37.6),
+            # About 111 m to the north.
+            _make_network(2, 55.751, 37.6),
+            # About 1.1 km to the north, in another cell.
+            _make_network(3, 55.76, 37.6),
+        ])
+        self.assertEqual(
+            [bssid for _, bssid, _, _ in index.within(55.75, 37.6, 200.0, 10)],
+            ["00:00:00:00:00:01", "00:00:00:00:00:02"],
+        )
+        self.assertEqual(len(index.within(55.75, 37.6, 2000.0, 10)), 3)
+        self.assertEqual(len(index.within(55.75, 37.6, 2000.0, 1)), 1)
+
+    def test_update_moves_network(self):
+        index = spatial_index.SpatialIndex()
+        index.update([_make_network(1, 55.75, 37.6)])
+        index.update([_make_network(1, 59.93, 30.31)])
+        self.assertEqual(len(index), 1)
+        self.assertEqual(index.within(55.75, 37.6, 1000.0, 10), [])
+        self.assertEqual(len(index.within(59.93, 30.31, 1000.0, 10)), 1)
+
+    def test_lookup(self):
+        index = spatial_index.SpatialIndex()
+        index.update([_make_network(1, 55.75, 37.6)])
+        self.assertEqual(
+            index.lookup(["00:00:00:00:00:01", "00:00:00:00:00:02"]),
+            [(55.75, 37.6, 10.0), None],
+        )
+
+    def test_update_skips_missing_location(self):
+        index = spatial_index.SpatialIndex()
+        index.update([{"_id": "02:29:e9:87:78:86"}])
+        self.assertEqual(len(index), 0)
+
+    def test_update_skips_invalid_network(self):
+        index = spatial_index.SpatialIndex()
+        index.update([
+            {"_id": "02:29:e9:87:78:86", "loc": {"lat": 55.75, "lon": 37.6}},
+            {"_id": "invalid", "acc": 10.0, "loc": {"lat": 55.75, "lon": 37.6}},
+            _make_network(3, float("nan"), 37.6),
+            _make_network(4, 55.75, 37.6),
+        ])
+        # The arrays stay aligned.
+        self.assertEqual(len(index), 1)
+        self.assertEqual(index.lookup(["02:29:e9:87:78:86", "00:00:00:00:00:04"]), [None, (55.75, 37.6, 10.0)])
+        # A moved network keeps its old location if the new one is invalid.
+        index.update([{"_id": "00:00:00:00:00:04", "acc": None, "loc": {"lat": 59.93, "lon": 30.31}}])
+        self.assertEqual(index.lookup(["00:00:00:00:00:04"]), [(55.75, 37.6, 10.0)])
+        self.assertEqual(len(index.within(55.75, 37.6, 100.0, 10)), 1)
+
+    def test_antimeridian(self):
+        index = spatial_index.SpatialIndex()
+        index.update([_make_network(1, 0.0, 179.9995)])
+        networks = index.within(0.0, -179.9995, 1000.0, 10)
+        self.assertEqual(len(networks), 1)
+        self.assertAlmostEqual(networks[0][0], 111.2, places=1)
@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import unittest
+
+from openwifi.helpers.tiles import (
+    COLUMN_COUNT,
+    get_box,
+    get_spec,
+    get_tile_id,
+    get_tile_ids,
+    validate_tile_id,
+)
+
+
+class TestTiles(unittest.TestCase):
+    def test_get_tile_id_in_box(self):
+        (lat_min, lon_min), (lat_max, lon_max) = get_box(get_tile_id(59.93, 30.33))
+        self.assertTrue(lat_min <= 59.93 < lat_max)
+        self.assertTrue(lon_min <= 30.33 < lon_max)
+
+    def test_get_tile_id_bounds(self):
+        self.assertTrue(validate_tile_id(get_tile_id(-90.0, -180.0)))
+        self.assertTrue(validate_tile_id(get_tile_id(90.0, 180.0)))
+
+    def test_get_tile_ids(self):
+        tile_ids = get_tile_ids(59.91, 30.31, 59.99, 30.49, 64)
+        self.assertEqual(len(tile_ids), 2)
+        self.assertIn(get_tile_id(59.95, 30.45), tile_ids)
+
+    def test_get_tile_ids_too_many(self):
+        self.assertRaises(ValueError, get_tile_ids, -90.0, -180.0, 90.0, 180.0, 64)
+
+    def test_get_spec_edge(self):
+        # The point is on the edge between two rows.
+        tile_id = get_tile_id(59.9, 30.33)
+        for other_tile_id, expected in ((tile_id, True), (tile_id - COLUMN_COUNT, False)):
+            spec = get_spec(other_tile_id)
+            self.assertEqual(_matches(spec["loc.lat"], 59.9), expected)
+
+    def test_get_spec_last_row(self):
+        self.assertTrue(_matches(get_spec(get_tile_id(90.0, 30.33))["loc.lat"], 90.0))
+
+
+def _matches(condition, value):
+    if value < condition["$gte"]:
+        return False
+    if "$lt" in condition:
+        return value < condition["$lt"]
+    return value <= condition["$lte"]
@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import unittest
+
+# noinspection PyPackageRequirements
+import bson.objectid
+
+from openwifi.helpers.cache import Cache
+from openwifi.helpers.watermark import Watermark
+from openwifi.unittests import fakes
+
+
+class TestWatermark(unittest.TestCase):
+    def setUp(self):
+        self.redis = fakes.Redis()
+        self.watermark = Watermark(Cache(self.redis, 16))
+
+    def _get_writes(self):
+        return [(name, args) for name, args in self.redis.commands if name in ("eval", "incr")]
+
+    def test_get_unknown(self):
+        self.assertIsNone(self.watermark.get())
+        # The change counter is unknown.
+        self.redis.values[Watermark.KEY] = str(bson.objectid.ObjectId()).encode("ascii")
+        self.watermark._read_time = 0.0
+        self.assertIsNone(self.watermark.get())
+
+    def test_get(self):
+        value = bson.objectid.ObjectId()
+        self.redis.values.update({Watermark.KEY: str(value).encode("ascii"), Watermark.CHANGES_KEY: b"7"})
+        self.assertEqual(self.watermark.get(), (value, 7))
+
+    def test_update(self):
+        old_id, new_id = bson.objectid.ObjectId(), bson.objectid.ObjectId()
+        pipeline = fakes.Pipeline(self.redis)
+        self.watermark.update(pipeline, [{"_id": new_id}, {"_id": old_id}, {}])
+        pipeline.execute()
+        (name, (script, key_count, key, changes_key, value)), = self._get_writes()
+        self.assertEqual((key_count, key, changes_key, value), (2, Watermark.KEY, Watermark.CHANGES_KEY, str(new_id)))
+
+    def test_refresh(self):
+        db = fakes.DB(scan_results=fakes.Collection([{"_id": bson.objectid.ObjectId()} for _ in range(2)]))
+        self.watermark.refresh(db)
+        (name, args), = self._get_writes()
+        self.assertEqual(args[-1], str(db.scan_results.documents[-1]["_id"]))
+        # Nothing has changed.
+        self.watermark.refresh(db)
+        self.assertEqual(len(self._get_writes()), 1)
+        # Cleanup has removed a scan result below the watermark.
+        del db.scan_results.documents[0]
+        self.watermark.refresh(db)
+        self.assertEqual(len(self._get_writes()), 2)
+        # Everything has been removed.
+        db.scan_results.documents = []
+        self.watermark.refresh(db)
+        self.assertEqual(self._get_writes()[-1], ("incr", (Watermark.CHANGES_KEY,)))
@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import signal
+import unittest
+import unittest.mock
+
+import openwifi.helpers.exit_codes
+from openwifi.supervisor import Supervisor
+
+
+class _Exited(Exception):
+    pass
+
+
+class _Processes:
+    """
+    Process table behind the patched os and time calls.
+
+    Every call to sleep runs the next scheduled action and advances the clock.
+    """
+
+    def __init__(self):
+        self.events = []
+        self.running = set()
+        self.exited = []
+        self.ignores_term = False
+        self.actions = []
+        self.clock = 1000.0
+        self.fork_result = None
+        self._last_pid = 100
+
+    def fork(self):
+        if self.fork_result is not None:
+            return self.fork_result
+        self._last_pid += 1
+        self.running.add(self._last_pid)
+        self.events.append(("fork", self._last_pid))
+        return self._last_pid
+
+    def exit(self, pid):
+        self.running.discard(pid)
+        self.exited.append(pid)
+
+    def kill(self, pid, signum):
+        self.events.append((signal.Signals(signum).name, pid))
+        if pid not in self.running:
+            raise ProcessLookupError()
+        if signum == signal.SIGKILL or not self.ignores_term:
+            self.exit(pid)
+
+    def waitpid(self, pid, options):
+        if pid == -1:
+            if not self.exited:
+                return 0, 0
+            pid = self.exited[0]
+        if pid in self.exited:
+            self.exited.remove(pid)
+            return pid, 0
+        if pid not in self.running:
+            raise ChildProcessError()
+        assert options == os.WNOHANG
+        return 0, 0
+
+    def sleep(self, seconds):
+        self.clock += seconds
+        if self.actions:
+            self.actions.pop(0)()
+
+    def time(self):
+        return self.clock
+
+    def patch(self):
+        return [
+            unittest.mock.patch("os.fork", self.fork),
+            unittest.mock.patch("os.kill", self.kill),
+            unittest.mock.patch("os.waitpid", self.waitpid),
+            unittest.mock.patch("os._exit", unittest.mock.Mock(side_effect=_Exited)),
+            unittest.mock.patch("time.sleep", self.sleep),
+            unittest.mock.patch("time.time", self.time),
+            unittest.mock.patch("signal.signal"),
+            unittest.mock.patch("logging.shutdown"),
+        ]
+
+
+class TestSupervisor(unittest.TestCase):
+    def setUp(self):
+        self.processes = _Processes()
+        for patcher in self.processes.patch():
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.run_worker = unittest.mock.Mock(return_value=openwifi.helpers.exit_codes.EX_OK)
+        self.supervisor = Supervisor(2, self.run_worker)
+
+    def _stop(self):
+        self.supervisor._on_stop(signal.SIGTERM, None)
+
+    def test_invalid_worker_count(self):
+        self.assertRaises(ValueError, Supervisor, 0, self.run_worker)
+        self.assertRaises(ValueError, Supervisor, -1, self.run_worker)
+
+    def test_start_stop(self):
+        self.processes.actions = [self._stop]
+        self.assertEqual(self.supervisor.main(), openwifi.helpers.exit_codes.EX_OK)
+        self.assertEqual(self.processes.events, [("fork", 101), ("fork", 102), ("SIGTERM", 101), ("SIGTERM", 102)])
+        self.assertEqual(self.processes.running, set())
+        self.assertEqual(self.processes.exited, [])
+        # Workers run in the child processes only.
+        self.run_worker.assert_not_called()
+
+    def test_restart_crashed_worker(self):
+        self.processes.actions = [lambda: self.processes.exit(101), lambda: None, lambda: None, self._stop]
+        self.supervisor.main()
+        self.assertEqual(self.processes.events, [
+            ("fork", 101),
+            ("fork", 102),
+            ("fork", 103),
+            ("SIGTERM", 102),
+            ("SIGTERM", 103),
+        ])
+
+    def test_rolling_restart(self):
+        self.processes.actions = [lambda: self.supervisor._on_restart(signal.SIGHUP, None), lambda: None]
+        self.processes.actions.extend([lambda: None] * 4 + [self._stop])
+        self.supervisor.main()
+        # Each worker is replaced after its successor has started.
+        self.assertEqual(self.processes.events[:6], [
+            ("fork", 101),
+            ("fork", 102),
+            ("fork", 103),
+            ("SIGTERM", 101),
+            ("fork", 104),
+            ("SIGTERM", 102),
+        ])
+        self.assertEqual(set(self.processes.events[6:]), {("SIGTERM", 103), ("SIGTERM", 104)})
+
+    def test_kill_on_timeout(self):
+        self.processes.ignores_term = True
+        self.processes.actions = [self._stop]
+        start_time = self.processes.clock
+        self.supervisor.main()
+        self.assertEqual(self.processes.events, [
+            ("fork", 101),
+            ("fork", 102),
+            ("SIGTERM", 101),
+            ("SIGKILL", 101),
+            ("SIGTERM", 102),
+            ("SIGKILL", 102),
+        ])
+        self.assertGreaterEqual(self.processes.clock - start_time, 2 * Supervisor._STOP_TIMEOUT)
+        self.assertEqual(self.processes.exited, [])
+
+    def test_worker_process(self):
+        self.processes.fork_result = 0
+        self.run_worker.return_value = 3
+        with self.assertRaises(_Exited):
+            self.supervisor._spawn()
+        self.run_worker.assert_called_once_with()
+        os._exit.assert_called_once_with(3)
+
+    def test_failed_worker_process(self):
+        self.processes.fork_result = 0
+        self.run_worker.side_effect = RuntimeError("Failed.")
+        with self.assertRaises(_Exited):
+            self.supervisor._spawn()
+        os._exit.assert_called_once_with(openwifi.helpers.exit_codes.EX_SOFTWARE)
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import datetime
+import gzip
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+# noinspection PyPackageRequirements
+import bson.objectid
+
+from openwifi.unittests import fakes
+from openwifi.utils.build_snapshots import BuildSnapshots
+
+
+class TestBuildSnapshots(unittest.TestCase):
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.db = fakes.DB()
+        self.build_snapshots = BuildSnapshots()
+        self.time = datetime.datetime.utcnow() - datetime.timedelta(hours=1)
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def _insert(self, count):
+        ids = []
+        for _ in range(count):
+            self.time += datetime.timedelta(seconds=1)
+            ids.append(bson.objectid.ObjectId.from_datetime(self.time))
+            self.db.scan_results.documents.append({"_id": ids[-1], "bssid": "02:29:e9:87:78:86", "cid": "client"})
+        return ids
+
+    def _build(self):
+        self.build_snapshots._build(self.db, self.path)
+        with open(os.path.join(self.path, BuildSnapshots.MANIFEST_NAME), "rt", encoding="utf-8") as file:
+            return json.load(file)
+
+    def _read(self, entry):
+        file_path = os.path.join(self.path, entry["url"][len(BuildSnapshots.URL_PREFIX):])
+        with open(file_path, "rb") as file:
+            content = file.read()
+        self.assertEqual(entry["size"], len(content))
+        self.assertEqual(entry["sha256"], hashlib.sha256(content).hexdigest())
+        return json.loads(gzip.decompress(content).decode("utf-8"))
+
+    def test_snapshot_and_delta(self):
+        ids = self._insert(3)
+        manifest = self._build()
+        self.assertEqual(manifest["watermark"], str(ids[-1]))
+        self.assertEqual(manifest["deltas"], [])
+        self.assertEqual([scan_result["_id"] for scan_result in self._read(manifest["snapshot"])], list(map(str, ids)))
+        # Client IDs are not published.
+        self.assertNotIn("cid", self._read(manifest["snapshot"])[0])
+        new_ids = self._insert(2)
+        new_manifest = self._build()
+        self.assertEqual(new_manifest["watermark"], str(new_ids[-1]))
+        self.assertEqual(new_manifest["snapshot"], manifest["snapshot"])
+        delta, = new_manifest["deltas"]
+        self.assertEqual((delta["from_id"], delta["to_id"], delta["count"]), (str(ids[-1]), str(new_ids[-1]), 2))
+        self.assertEqual([scan_result["_id"] for scan_result in self._read(delta)], list(map(str, new_ids)))
+
+    def test_unchanged(self):
+        self._insert(1)
+        manifest = self._build()
+        self.assertEqual(self._build(), manifest)
+
+    def test_recent_excluded(self):
+        ids = self._insert(1)
+        # Scan results with smaller IDs may still be being inserted.
+        self.time = datetime.datetime.utcnow()
+        self._insert(1)
+        self.assertEqual(self._build()["watermark"], str(ids[-1]))
+
+    def test_rotation(self):
+        self.build_snapshots._MAX_DELTAS = 1
+        self._insert(1)
+        first_manifest = self._build()
+        self._insert(1)
+        second_manifest = self._build()
+        self.assertEqual(len(second_manifest["deltas"]), 1)
+        ids = self._insert(1)
+        third_manifest = self._build()
+        self.assertEqual(third_manifest["deltas"], [])
+        self.assertEqual(third_manifest["snapshot"]["count"], 3)
+        self.assertEqual(third_manifest["watermark"], str(ids[-1]))
+        # The files of the previous manifest are kept.
+        names = set(os.listdir(self.path))
+        self.assertIn(second_manifest["snapshot"]["url"][len(BuildSnapshots.URL_PREFIX):], names)
+        self.assertIn(second_manifest["deltas"][0]["url"][len(BuildSnapshots.URL_PREFIX):], names)
+        self.assertEqual(first_manifest["snapshot"], second_manifest["snapshot"])
+        # Nothing but the files of the older manifests is removed.
+        self._insert(1)
+        fourth_manifest = self._build()
+        self.assertEqual(set(os.listdir(self.path)), {
+            BuildSnapshots.MANIFEST_NAME,
+            third_manifest["snapshot"]["url"][len(BuildSnapshots.URL_PREFIX):],
+            fourth_manifest["deltas"][0]["url"][len(BuildSnapshots.URL_PREFIX):],
+        })
+
+    def test_foreign_files_kept(self):
+        names = ["README", "snapshot-%s.json.gz.tmp" % bson.objectid.ObjectId()]
+        for name in names:
+            open(os.path.join(self.path, name), "wb").close()
+        os.mkdir(os.path.join(self.path, "snapshot-%s.json.gz" % bson.objectid.ObjectId()))
+        old_name = "delta-%s-%s.json.gz" % (bson.objectid.ObjectId(), bson.objectid.ObjectId())
+        open(os.path.join(self.path, old_name), "wb").close()
+        self._insert(1)
+        self._build()
+        remaining_names = set(os.listdir(self.path))
+        self.assertTrue(set(names) <= remaining_names)
+        self.assertNotIn(old_name, remaining_names)
+        self.assertEqual(len(remaining_names), len(names) + 3)
@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import argparse
+import unittest
+
+# noinspection PyPackageRequirements
+import bson.objectid
+
+from openwifi.helpers.cache import Cache
+from openwifi.helpers.watermark import Watermark
+from openwifi.unittests import fakes
+from openwifi.utils.cleanup_db import CleanupDB
+
+
+def _make_scan_results(bssid, count):
+    return [
+        {"_id": bson.objectid.ObjectId(), "bssid": bssid, "ts": 1400000000000 + index}
+        for index in range(count)
+    ]
+
+
+class TestCleanupDB(unittest.TestCase):
+    def setUp(self):
+        self.a = _make_scan_results("02:29:e9:87:78:86", 4)
+        self.b = _make_scan_results("02:29:e9:87:78:87", 1)
+        self.c = _make_scan_results("02:29:e9:87:78:88", 3)
+        self.db = fakes.DB(scan_results=fakes.Collection(self.a + self.b + self.c))
+        self.redis = fakes.Redis()
+        self.cleanup_db = CleanupDB()
+
+    def _main(self, keep, batch_size):
+        return self.cleanup_db.main(argparse.Namespace(
+            cleanup_keep=keep,
+            cleanup_batch_size=batch_size,
+            cleanup_rate=0,
+            cleanup_continuous=False,
+        ), db=self.db, cache=Cache(self.redis, 16))
+
+    @staticmethod
+    def _get_ids(scan_results):
+        return sorted(scan_result["_id"] for scan_result in scan_results)
+
+    def test_keep(self):
+        self._main(2, 1000)
+        # The newest scan results of each BSSID are kept.
+        self.assertEqual(self._get_ids(self.db.scan_results.documents), self._get_ids(self.a[2:] + self.b + self.c[1:]))
+        self.assertEqual(self._get_ids(self.db.old_scan_results.documents), self._get_ids(self.a[:2] + self.c[:1]))
+        self.assertEqual(self.db.cleanup_state.find_one(CleanupDB._CHECKPOINT_ID)["bssid"], None)
+        # Synchronization pages have changed.
+        self.assertIn(("incr", (Watermark.CHANGES_KEY, )), self.redis.commands)
+
+    def test_batch_stops_on_bssid_boundary(self):
+        old_ids, scanned_count, bssid = self.cleanup_db._scan_batch(self.db, None, 1, 2)
+        # The whole first BSSID is scanned even though it is larger than the batch.
+        self.assertEqual((scanned_count, bssid), (4, "02:29:e9:87:78:87"))
+        self.assertEqual(sorted(old_ids), self._get_ids(self.a[:3]))
+        # The second BSSID is smaller than the batch, so the batch goes on to the third one.
+        old_ids, scanned_count, bssid = self.cleanup_db._scan_batch(self.db, bssid, 1, 2)
+        self.assertEqual((scanned_count, bssid), (4, None))
+        self.assertEqual(sorted(old_ids), self._get_ids(self.c[:2]))
+
+    def test_small_batches(self):
+        self._main(1, 1)
+        self.assertEqual(self._get_ids(self.db.scan_results.documents), self._get_ids(self.a[3:] + self.b + self.c[2:]))
+
+    def test_resume_from_checkpoint(self):
+        self.cleanup_db._save_checkpoint(self.db, "02:29:e9:87:78:87")
+        self._main(1, 1000)
+        # The BSSIDs before the checkpoint are left for the next pass.
+        self.assertEqual(self._get_ids(self.db.old_scan_results.documents), self._get_ids(self.c[:2]))
+        self.assertIsNone(self.cleanup_db._load_checkpoint(self.db))
+
+    def test_move_duplicates(self):
+        # An interrupted run has copied the scan result but has not removed it.
+        self.db.old_scan_results.documents.append(dict(self.a[0]))
+        self.cleanup_db._move(self.db, [self.a[0]["_id"], self.a[1]["_id"]])
+        self.assertEqual(self._get_ids(self.db.old_scan_results.documents), self._get_ids(self.a[:2]))
+        self.assertEqual(self._get_ids(self.db.scan_results.documents), self._get_ids(self.a[2:] + self.b + self.c))
+
+    def test_nothing_to_move(self):
+        self._main(5, 1000)
+        self.assertEqual(self.db.old_scan_results.documents, [])
+        self.assertNotIn("incr", [name for name, args in self.redis.commands])
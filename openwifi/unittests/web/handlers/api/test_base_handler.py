@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import json
+
+import tornado.gen
+import tornado.testing
+import tornado.web
+
+from openwifi.helpers.cache import Cache
+from openwifi.unittests import fakes
+from openwifi.web.handlers.api.check_handler import CheckHandler
+
+
+class _TokenInfoHandler(tornado.web.RequestHandler):
+    """
+    Local token verification endpoint stub.
+    """
+
+    def initialize(self, calls):
+        self._calls = calls
+
+    @tornado.gen.coroutine
+    def get(self):
+        access_token = self.get_argument("access_token")
+        self._calls.append(access_token)
+        # Let concurrent requests pile up.
+        yield tornado.gen.sleep(0.1)
+        if access_token != "valid":
+            raise tornado.web.HTTPError(400)
+        self.write(json.dumps({"user_id": "42", "expires_in": 3600}))
+
+
+class TestBaseHandler(tornado.testing.AsyncHTTPTestCase):
+    def get_app(self):
+        self.cache, self.calls = Cache(fakes.Redis(), 16), []
+        return tornado.web.Application([
+            (r"/api/check/", CheckHandler, {"cache": self.cache}),
+            (r"/tokeninfo", _TokenInfoHandler, {"calls": self.calls}),
+        ], token_info_url=self.get_url("/tokeninfo"))
+
+    def _check(self, auth_token):
+        return self.http_client.fetch(
+            self.get_url("/api/check/"),
+            headers={"X-Auth-Token": auth_token},
+        )
+
+    @tornado.testing.gen_test
+    def test_authenticate_coalesced(self):
+        yield [self._check("valid"), self._check("valid"), self._check("valid")]
+        self.assertEqual(self.calls, ["valid"])
+
+    @tornado.testing.gen_test
+    def test_authenticate_negative_cache(self):
+        yield self._check("invalid")
+        yield self._check("invalid")
+        self.assertEqual(self.calls, ["invalid"])
+
+
+class TestBaseHandlerUnreachable(tornado.testing.AsyncHTTPTestCase):
+    def get_app(self):
+        # Nothing listens on the port.
+        sock, port = tornado.testing.bind_unused_port()
+        sock.close()
+        return tornado.web.Application([
+            (r"/api/check/", CheckHandler, {"cache": Cache(fakes.Redis(), 16)}),
+        ], token_info_url="http://127.0.0.1:%d/tokeninfo" % port)
+
+    @tornado.testing.gen_test
+    def test_authenticate_unreachable(self):
+        responses = yield [
+            self.http_client.fetch(self.get_url("/api/check/"), headers={"X-Auth-Token": "valid"})
+            for _ in range(3)
+        ]
+        # The requests are served anonymously.
+        self.assertEqual([response.code for response in responses], [200] * 3)
@@ -0,0 +1,47 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import json
+
+import tornado.testing
+import tornado.web
+
+from openwifi.helpers.locator import Locator
+from openwifi.helpers.spatial_index import SpatialIndex
+from openwifi.unittests import fakes
+from openwifi.web.handlers.api.locate_handler import LocateHandler
+
+
+class TestLocateHandler(tornado.testing.AsyncHTTPTestCase):
+    def get_app(self):
+        spatial_index = SpatialIndex()
+        spatial_index.update([{"_id": "02:29:e9:87:78:86", "acc": 20.0, "loc": {"lat": 55.75, "lon": 37.6}}])
+        return tornado.web.Application([(
+            r"/api/locate/",
+            LocateHandler,
+            {"cache": object(), "locator": Locator(spatial_index, 16)},
+        )], rate_limiter=fakes.RateLimiter())
+
+    def _post(self, body):
+        return self.fetch(
+            "/api/locate/",
+            method="POST",
+            body=json.dumps(body),
+            headers={"X-Client-ID": "client"},
+        )
+
+    def test_locate(self):
+        response = self._post({"networks": [{"bssid": "02:29:e9:87:78:86", "level": -60}]})
+        self.assertEqual(response.code, 200)
+        self.assertEqual(json.loads(response.body.decode("utf-8")), {
+            "loc": {"lat": 55.75, "lon": 37.6},
+            "acc": 20.0,
+        })
+
+    def test_unknown(self):
+        self.assertEqual(self._post({"networks": [{"bssid": "02:29:e9:87:78:87"}]}).code, 404)
+
+    def test_invalid(self):
+        self.assertEqual(self._post({"networks": []}).code, 400)
+        self.assertEqual(self._post({"networks": [{"bssid": "invalid"}]}).code, 400)
+        self.assertEqual(self._post({"networks": [{"bssid": "02:29:e9:87:78:86", "level": 10}]}).code, 400)
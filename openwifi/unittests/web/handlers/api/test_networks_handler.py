@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import concurrent.futures
+import json
+
+# noinspection PyPackageRequirements
+import bson.objectid
+import tornado.testing
+import tornado.web
+
+from openwifi.unittests import fakes
+from openwifi.web.handlers.api.networks_handler import NetworksHandler
+
+
+class TestNetworksHandler(tornado.testing.AsyncHTTPTestCase):
+    _NETWORKS = [{
+        "_id": "02:29:e9:87:78:8%d" % index,
+        "ssid": "Network",
+        "ts": 1400000000000,
+        "acc": 10.0,
+        "loc": {"lat": 55.75, "lon": 37.62},
+        "n": 1,
+        "seq": bson.objectid.ObjectId("5a000000000000000000000%d" % (index + 1)),
+    } for index in range(3)]
+
+    def get_app(self):
+        self.db = fakes.DB(networks=fakes.Collection(self._NETWORKS))
+        self.rate_limiter = fakes.RateLimiter()
+        return tornado.web.Application([(
+            r"/api/networks/([0-9a-fA-F]{24})/(\d+)/",
+            NetworksHandler,
+            {"db": self.db, "cache": object(), "executor": concurrent.futures.ThreadPoolExecutor(1)},
+        )], rate_limiter=self.rate_limiter)
+
+    def _get(self, last_seq, limit, headers=None):
+        return self.fetch(
+            "/api/networks/%s/%s/" % (last_seq, limit),
+            headers={"X-Client-ID": "client"} if headers is None else headers,
+        )
+
+    def test_get(self):
+        response = self._get(self._NETWORKS[0]["seq"], 1)
+        self.assertEqual(response.code, 200)
+        networks = json.loads(response.body.decode("utf-8"))
+        self.assertEqual([network["_id"] for network in networks], [self._NETWORKS[1]["_id"]])
+        self.assertEqual(networks[0]["seq"], str(self._NETWORKS[1]["seq"]))
+        self.assertEqual(self.rate_limiter.costs, [1])
+        self.assertTrue(self.db.networks.cursors[0].is_closed)
+
+    def test_recent_excluded(self):
+        # Another writer may still commit a smaller sequence ID.
+        self.db.networks.documents.append(dict(self._NETWORKS[0], _id="02:29:e9:87:78:89", seq=bson.objectid.ObjectId()))
+        response = self._get(self._NETWORKS[0]["seq"], 10)
+        self.assertEqual(
+            [network["_id"] for network in json.loads(response.body.decode("utf-8"))],
+            [self._NETWORKS[1]["_id"], self._NETWORKS[2]["_id"]],
+        )
+        self.assertIn("$lt", self.db.networks.specs[-1]["seq"])
+
+    def test_zero_limit(self):
+        response = self._get("0" * 24, 0)
+        self.assertEqual(response.code, 200)
+        self.assertEqual(len(json.loads(response.body.decode("utf-8"))), 3)
+        # Zero limit is unbounded in MongoDB, so it means the maximum page.
+        self.assertEqual(self.rate_limiter.costs, [NetworksHandler._GET_LIMIT // NetworksHandler._GET_CHUNK_SIZE])
+
+    def test_rate_limited(self):
+        self.rate_limiter.retry_after = 10.0
+        response = self._get("0" * 24, 10)
+        self.assertEqual(response.code, 429)
+        self.assertEqual(response.headers["Retry-After"], "10")
+        # The database is not queried.
+        self.assertEqual(self.db.networks.specs, [])
+
+    def test_invalid(self):
+        self.assertEqual(self._get("0" * 24, 10, headers={}).code, 400)
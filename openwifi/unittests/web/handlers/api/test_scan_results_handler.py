@@ -1,10 +1,26 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
+import concurrent.futures
+import datetime
+import gzip
+import hashlib
+import json
+import threading
 import unittest
 
+# noinspection PyPackageRequirements
+import bson.objectid
+import tornado.testing
+import tornado.web
+
+from openwifi.helpers.cache import Cache
+from openwifi.helpers.executor import BoundedExecutor
+from openwifi.unittests import fakes
 from openwifi.web.handlers.api.scan_results_handler import (
+    ScanResultsHandler,
     _validate_bssid,
+    _validate_scan_results,
 )
 
 
@@ -13,4 +29,232 @@ class TestScanResultsHandler(unittest.TestCase):
         self.assertTrue(_validate_bssid("02:29:e9:87:78:86"))
 
     def test_validate_bssid_negative(self):
-        self.assertFalse(_validate_bssid("02:29:e9:87:78:8r"))
\ No newline at end of file
+        self.assertFalse(_validate_bssid("02:29:e9:87:78:8r"))
+
+    def test_validate_bssid_trailing_characters(self):
+        self.assertFalse(_validate_bssid("02:29:e9:87:78:86:00"))
+
+    def test_validate_scan_results(self):
+        scan_result = {
+            "bssid": "02:29:e9:87:78:86",
+            "ssid": "Network",
+            "ts": 1400000000000,
+            "acc": 10.0,
+            "loc": {"lat": 55.75, "lon": 37.62},
+        }
+        scan_results = [
+            scan_result,
+            dict(scan_result, ssid=""),
+            dict(scan_result, acc=150.0),
+            dict(scan_result, extra=True),
+            "scan result",
+            dict(scan_result, loc={"lat": 91.0, "lon": 37.62}),
+        ]
+        valid_scan_results, rejections = _validate_scan_results(scan_results)
+        self.assertEqual(valid_scan_results, [scan_result])
+        self.assertEqual(rejections, [
+            (1, "Invalid ssid."),
+            (2, "Invalid acc."),
+            (3, "Invalid fields."),
+            (4, "Invalid fields."),
+            (5, "Invalid loc."),
+        ])
+
+
+class _Watermark:
+    def __init__(self, value, changes=0):
+        self.value = value
+        self.changes = changes
+
+    def get(self):
+        return (self.value, self.changes) if self.value is not None else None
+
+
+class TestScanResultsHandlerWatermark(tornado.testing.AsyncHTTPTestCase):
+    _WATERMARK = bson.objectid.ObjectId("5a0000000000000000000001")
+
+    def get_app(self):
+        self.watermark = _Watermark(self._WATERMARK)
+        return tornado.web.Application([(
+            r"/api/scan-results/([0-9a-fA-F]{24})/(\d+)/",
+            ScanResultsHandler,
+            {
+                # The database should not be queried.
+                "db": None,
+                "cache": object(),
+                "executor": None,
+                "ingestor": None,
+                "ingest_queue": None,
+                "watermark": self.watermark,
+            },
+        )], rate_limiter=None)
+
+    def _get(self, last_id, **headers):
+        return self.fetch(
+            "/api/scan-results/%s/100/" % last_id,
+            headers=dict(headers, **{"X-Client-ID": "client"}),
+        )
+
+    def test_empty_at_watermark(self):
+        response = self._get(self._WATERMARK)
+        self.assertEqual(response.code, 200)
+        self.assertEqual(response.body, b"[]")
+        self.assertTrue(response.headers["Etag"].startswith('W/"'))
+
+    def test_not_modified(self):
+        etag = self._get(self._WATERMARK).headers["Etag"]
+        response = self._get(self._WATERMARK, **{"If-None-Match": etag})
+        self.assertEqual(response.code, 304)
+
+    def test_empty_above_safety_lag(self):
+        # The watermark is recent, but the last ID is past the safety lag already.
+        self.watermark.value = bson.objectid.ObjectId()
+        response = self._get(bson.objectid.ObjectId.from_datetime(datetime.datetime.utcnow()))
+        self.assertEqual(response.code, 200)
+        self.assertEqual(response.body, b"[]")
+
+    def test_modified_below_watermark(self):
+        etag = self._get(self._WATERMARK).headers["Etag"]
+        # A scan result has been committed or removed below the watermark.
+        self.watermark.changes += 1
+        response = self._get(self._WATERMARK, **{"If-None-Match": etag})
+        self.assertEqual(response.code, 200)
+        self.assertNotEqual(response.headers["Etag"], etag)
+
+
+class TestScanResultsHandlerGet(tornado.testing.AsyncHTTPTestCase):
+    _SCAN_RESULT = {
+        "_id": bson.objectid.ObjectId("5a0000000000000000000001"),
+        "bssid": "02:29:e9:87:78:86",
+        "ssid": "Network",
+        "ts": 1400000000000,
+        "acc": 10.0,
+        "loc": {"lat": 55.75, "lon": 37.62},
+    }
+
+    def get_app(self):
+        self.db = fakes.DB(scan_results=fakes.Collection([self._SCAN_RESULT] * 3))
+        self.rate_limiter = fakes.RateLimiter()
+        self.executor = BoundedExecutor(1, 0)
+        return tornado.web.Application([(
+            r"/api/scan-results/([0-9a-fA-F]{24})/(\d+)/",
+            ScanResultsHandler,
+            {
+                "db": self.db,
+                "cache": object(),
+                "executor": self.executor,
+                "ingestor": None,
+                "ingest_queue": None,
+                "watermark": _Watermark(None),
+            },
+        )], rate_limiter=self.rate_limiter)
+
+    def _get(self, limit):
+        return self.fetch(
+            "/api/scan-results/%s/%s/" % ("0" * 24, limit),
+            headers={"X-Client-ID": "client"},
+        )
+
+    def test_get(self):
+        response = self._get(2)
+        self.assertEqual(response.code, 200)
+        self.assertEqual(len(json.loads(response.body.decode("utf-8"))), 2)
+        self.assertEqual(self.db.scan_results.cursors[-1].limit_value, 2)
+        self.assertEqual(self.rate_limiter.costs, [1])
+
+    def test_recent_excluded(self):
+        # The scan result has just been inserted, so another one with a smaller ID may still be being inserted.
+        self.db.scan_results.documents.append(dict(self._SCAN_RESULT, _id=bson.objectid.ObjectId()))
+        response = self._get(10)
+        self.assertEqual(
+            [scan_result["_id"] for scan_result in json.loads(response.body.decode("utf-8"))],
+            [str(self._SCAN_RESULT["_id"])] * 3,
+        )
+        self.assertIn("$lt", self.db.scan_results.specs[-1]["_id"])
+
+    def test_zero_limit(self):
+        response = self._get(0)
+        self.assertEqual(response.code, 200)
+        # Zero limit is unbounded in MongoDB.
+        self.assertEqual(self.db.scan_results.cursors[-1].limit_value, ScanResultsHandler._GET_LIMIT)
+        # The maximum page is charged.
+        self.assertEqual(
+            self.rate_limiter.costs,
+            [ScanResultsHandler._GET_LIMIT // ScanResultsHandler._GET_CHUNK_SIZE],
+        )
+
+    def test_executor_busy(self):
+        event = threading.Event()
+        future = self.executor.submit(event.wait)
+        try:
+            self.assertEqual(self._get(2).code, 503)
+        finally:
+            event.set()
+            future.result(timeout=1.0)
+        # The cursor has not been read and is closed.
+        self.assertTrue(self.db.scan_results.cursors[-1].is_closed)
+
+
+class _Ingestor:
+    def __init__(self):
+        self.batches = []
+
+    def ingest(self, scan_results):
+        self.batches.append(scan_results)
+        return len(scan_results), 0
+
+
+class TestScanResultsHandlerUpload(tornado.testing.AsyncHTTPTestCase):
+    _SCAN_RESULT = {
+        "bssid": "02:29:e9:87:78:86",
+        "ssid": "Network",
+        "ts": 1400000000000,
+        "acc": 10.0,
+        "loc": {"lat": 55.75, "lon": 37.62},
+    }
+
+    def get_app(self):
+        self.ingestor = _Ingestor()
+        redis_client = fakes.Redis()
+        redis_client.values[b"auth:" + hashlib.sha1(b"token").digest()] = b"user"
+        cache = Cache(redis_client, 16)
+        return tornado.web.Application([(
+            r"/api/scan-results/",
+            ScanResultsHandler,
+            {
+                "db": None,
+                "cache": cache,
+                "executor": concurrent.futures.ThreadPoolExecutor(1),
+                "ingestor": self.ingestor,
+                "ingest_queue": None,
+                "watermark": None,
+            },
+        )], max_upload_size=1024 * 1024, rate_limiter=fakes.RateLimiter())
+
+    def _post(self, body, **headers):
+        return self.fetch(
+            "/api/scan-results/",
+            method="POST",
+            body=body,
+            headers=dict(headers, **{"X-Client-ID": "client", "X-Auth-Token": "token"}),
+        )
+
+    def test_chunks(self):
+        scan_results = [dict(self._SCAN_RESULT, ts=ts) for ts in range(2500)] + [{}]
+        response = self._post(gzip.compress(json.dumps(scan_results).encode("utf-8")), **{
+            "Content-Encoding": "gzip",
+        })
+        self.assertEqual(response.code, 200)
+        self.assertEqual(json.loads(response.body.decode("utf-8")), {
+            "inserted": 2500,
+            "duplicates": 0,
+            "rejected": [{"index": 2500, "reason": "Invalid fields."}],
+        })
+        self.assertEqual([len(batch) for batch in self.ingestor.batches], [1000, 1000, 500])
+
+    def test_malformed(self):
+        self.assertEqual(self._post(b'[{"bssid": ').code, 400)
+
+    def test_too_large(self):
+        body = gzip.compress(b"[" + b" " * 2 * 1024 * 1024 + b"]")
+        self.assertEqual(self._post(body, **{"Content-Encoding": "gzip"}).code, 413)
@@ -0,0 +1,49 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import shutil
+import tempfile
+
+import tornado.testing
+import tornado.web
+
+from openwifi.web.handlers.api.snapshots_handler import SnapshotsHandler
+from openwifi.web.handlers.snapshot_file_handler import SnapshotFileHandler
+
+
+class TestSnapshotsHandler(tornado.testing.AsyncHTTPTestCase):
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        super(TestSnapshotsHandler, self).setUp()
+
+    def tearDown(self):
+        super(TestSnapshotsHandler, self).tearDown()
+        shutil.rmtree(self.path)
+
+    def get_app(self):
+        return tornado.web.Application([(
+            r"/api/snapshots/",
+            SnapshotsHandler,
+            {"cache": object(), "snapshots_path": self.path},
+        ), (
+            r"/snapshots/(.*)",
+            SnapshotFileHandler,
+            {"path": self.path},
+        )])
+
+    def _write(self, name, content):
+        with open(os.path.join(self.path, name), "wb") as file:
+            file.write(content)
+
+    def test_no_manifest(self):
+        self.assertEqual(self.fetch("/api/snapshots/").code, 404)
+
+    def test_manifest(self):
+        self._write("manifest.json", b'{"deltas": []}')
+        self.assertEqual(self.fetch("/api/snapshots/").body, b'{"deltas": []}')
+
+    def test_file_range(self):
+        self._write("snapshot-1.json.gz", b"0123456789")
+        response = self.fetch("/snapshots/snapshot-1.json.gz", headers={"Range": "bytes=2-4"})
+        self.assertEqual((response.code, response.body), (206, b"234"))
@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import concurrent.futures
+import json
+
+# noinspection PyPackageRequirements
+import bson.objectid
+import tornado.testing
+import tornado.web
+
+from openwifi.helpers import tiles
+from openwifi.helpers.cache import Cache
+from openwifi.unittests import fakes
+from openwifi.web.handlers.api.tiles_handler import TilesHandler
+
+
+class TestTilesHandler(tornado.testing.AsyncHTTPTestCase):
+    _SCAN_RESULT = {
+        "_id": bson.objectid.ObjectId("5a0000000000000000000001"),
+        "bssid": "02:29:e9:87:78:86",
+        "ssid": "Network",
+        "ts": 1400000000000,
+        "acc": 10.0,
+        "loc": {"lat": 59.93, "lon": 30.33},
+    }
+
+    def get_app(self):
+        self.db = fakes.DB(scan_results=fakes.Collection([self._SCAN_RESULT]))
+        return tornado.web.Application([(
+            r"/api/tiles/",
+            TilesHandler,
+            {
+                "db": self.db,
+                "cache": Cache(fakes.Redis(), 16),
+                "executor": concurrent.futures.ThreadPoolExecutor(1),
+            },
+        )], rate_limiter=fakes.RateLimiter())
+
+    def _get(self, query, **headers):
+        return self.fetch("/api/tiles/?" + query, headers=dict({"X-Client-ID": "client"}, **headers))
+
+    def test_get(self):
+        tile_id = tiles.get_tile_id(59.93, 30.33)
+        response = self._get("tile=%s" % tile_id)
+        self.assertEqual(response.code, 200)
+        page, = json.loads(response.body.decode("utf-8"))["tiles"]
+        self.assertEqual(page["id"], tile_id)
+        self.assertEqual(page["last_id"], str(self._SCAN_RESULT["_id"]))
+        self.assertFalse(page["more"])
+        self.assertEqual(len(page["scan_results"]), 1)
+        # The query is restricted to the tile.
+        spec, = self.db.scan_results.specs
+        self.assertEqual(spec["loc"], {"$geoWithin": {"$box": tiles.get_box(tile_id)}})
+        self.assertIn("$lt", spec["loc.lat"])
+        # Recent scan results are not served yet.
+        self.assertIn("$lt", spec["_id"])
+
+    def test_cached(self):
+        tile_id = tiles.get_tile_id(59.93, 30.33)
+        first_body = self._get("tile=%s" % tile_id).body
+        self.assertEqual(self._get("tile=%s" % tile_id).body, first_body)
+        self.assertEqual(len(self.db.scan_results.specs), 1)
+
+    def test_bbox(self):
+        response = self._get("bbox=59.91,30.31,59.99,30.49")
+        self.assertEqual(response.code, 200)
+        self.assertEqual(len(json.loads(response.body.decode("utf-8"))["tiles"]), 2)
+
+    def test_invalid(self):
+        self.assertEqual(self._get("tile=-1").code, 400)
+        self.assertEqual(self._get("bbox=60,30,59,31").code, 400)
+        self.assertEqual(self.fetch("/api/tiles/?tile=1").code, 400)
@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import gzip
+import os
+import shutil
+import tempfile
+
+import tornado.testing
+import tornado.web
+
+from openwifi.web.handlers.static_file_handler import StaticFileHandler
+
+
+class TestStaticFileHandler(tornado.testing.AsyncHTTPTestCase):
+    _SCRIPT = b"var openWiFi = 1;\n" * 100
+    _LARGE_FILE_SIZE = 512 * 1024
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self._write("script.js", self._SCRIPT)
+        self._write("large.bin", b"\x00" * self._LARGE_FILE_SIZE)
+        StaticFileHandler.preload(self.path)
+        super(TestStaticFileHandler, self).setUp()
+
+    def tearDown(self):
+        super(TestStaticFileHandler, self).tearDown()
+        shutil.rmtree(self.path)
+
+    def get_app(self):
+        return tornado.web.Application([(
+            r"/static/(.*)",
+            StaticFileHandler,
+            {"path": self.path},
+        )])
+
+    def _write(self, name, content):
+        with open(os.path.join(self.path, name), "wb") as file:
+            file.write(content)
+
+    def _get(self, url, accept_encoding="identity"):
+        return self.fetch(url, headers={"Accept-Encoding": accept_encoding}, decompress_response=False)
+
+    def test_preload(self):
+        abspath = os.path.join(self.path, "script.js")
+        self.assertIn("gzip", StaticFileHandler._variants[abspath])
+        # Large files are not held in memory but still versioned.
+        self.assertNotIn(os.path.join(self.path, "large.bin"), StaticFileHandler._variants)
+        self.assertIn(os.path.join(self.path, "large.bin"), StaticFileHandler._versions)
+
+    def test_get_url(self):
+        url = StaticFileHandler.get_url("script.js")
+        self.assertTrue(url.startswith("/static/script.js?v="))
+        self.assertEqual(len(url.partition("?v=")[2]), 32)
+        self.assertEqual(StaticFileHandler.get_url("missing.js"), "/static/missing.js")
+
+    def test_negotiate_encoding(self):
+        response = self._get("/static/script.js", "gzip, deflate")
+        self.assertEqual(response.headers["Content-Encoding"], "gzip")
+        self.assertEqual(gzip.decompress(response.body), self._SCRIPT)
+        self.assertEqual(response.headers["Vary"], "Accept-Encoding")
+        # Refused encoding.
+        response = self._get("/static/script.js", "gzip;q=0")
+        self.assertNotIn("Content-Encoding", response.headers)
+        self.assertEqual(response.body, self._SCRIPT)
+
+    def test_etag_per_encoding(self):
+        identity_etag = self._get("/static/script.js").headers["Etag"]
+        gzip_etag = self._get("/static/script.js", "gzip").headers["Etag"]
+        self.assertNotEqual(identity_etag, gzip_etag)
+        self.assertTrue(gzip_etag.endswith('-gzip"'))
+
+    def test_large_file(self):
+        response = self._get("/static/large.bin", "gzip")
+        self.assertEqual(len(response.body), self._LARGE_FILE_SIZE)
+        self.assertNotIn("Content-Encoding", response.headers)
+
+    def test_immutable(self):
+        response = self._get(StaticFileHandler.get_url("script.js"))
+        self.assertIn("immutable", response.headers["Cache-Control"])
+        # The version does not match the content.
+        response = self._get("/static/script.js?v=x")
+        self.assertNotIn("immutable", response.headers["Cache-Control"])
+        self.assertEqual(response.headers["Cache-Control"], "max-age=%d" % StaticFileHandler._CACHE_TIME)
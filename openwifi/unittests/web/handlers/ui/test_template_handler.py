@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+
+import tornado.testing
+import tornado.web
+
+import openwifi.static
+from openwifi.helpers import Statistics
+from openwifi.helpers.cache import Cache
+from openwifi.unittests import fakes
+from openwifi.web.handlers.static_file_handler import StaticFileHandler
+from openwifi.web.handlers.ui.template_handler import TemplateHandler
+
+
+class TestTemplateHandler(tornado.testing.AsyncHTTPTestCase):
+    def setUp(self):
+        StaticFileHandler.preload(os.path.dirname(openwifi.static.__file__))
+        TemplateHandler.load_templates()
+        # Pages and statistics are cached process-wide.
+        TemplateHandler._pages.clear()
+        Statistics._values.clear()
+        super(TestTemplateHandler, self).setUp()
+
+    def tearDown(self):
+        super(TestTemplateHandler, self).tearDown()
+        TemplateHandler._pages.clear()
+        Statistics._values.clear()
+
+    def get_app(self):
+        self.redis = fakes.Redis()
+        self.redis.sets[Statistics.SSID_KEY] = {"Network"}
+        self.redis.sets[Statistics.BSSID_KEY] = {"02:29:e9:87:78:86", "02:29:e9:87:78:87"}
+        return tornado.web.Application([(
+            r"/",
+            TemplateHandler,
+            {"template_name": "home", "cache": Cache(self.redis, 16)},
+        )])
+
+    def test_get(self):
+        response = self.fetch("/")
+        self.assertEqual(response.code, 200)
+        self.assertIn(b"<strong>1</strong>", response.body)
+        self.assertIn(b"<strong>2</strong>", response.body)
+        self.assertTrue(response.headers["ETag"])
+
+    def test_not_modified(self):
+        etag = self.fetch("/").headers["ETag"]
+        response = self.fetch("/", headers={"If-None-Match": etag})
+        self.assertEqual(response.code, 304)
+        self.assertEqual(response.body, b"")
+        self.assertEqual(len(TemplateHandler._pages), 1)
+
+    def test_statistics_changed(self):
+        etag = self.fetch("/").headers["ETag"]
+        self.redis.sets[Statistics.BSSID_KEY].add("02:29:e9:87:78:88")
+        # Statistics are cached for a while.
+        response = self.fetch("/", headers={"If-None-Match": etag})
+        self.assertEqual(response.code, 304)
+        Statistics._values.clear()
+        response = self.fetch("/", headers={"If-None-Match": etag})
+        self.assertEqual(response.code, 200)
+        self.assertIn(b"<strong>3</strong>", response.body)
+        self.assertNotEqual(response.headers["ETag"], etag)
+        self.assertEqual(len(TemplateHandler._pages), 2)
+
+    def test_max_pages(self):
+        for bssid_count in range(TemplateHandler._MAX_PAGES + 1):
+            self.redis.sets[Statistics.BSSID_KEY] = set(range(bssid_count))
+            Statistics._values.clear()
+            self.assertEqual(self.fetch("/").code, 200)
+        # Pages of outdated statistics are dropped.
+        self.assertEqual(len(TemplateHandler._pages), 1)
@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Backfill networks service utility.
+"""
+
+import collections
+import logging
+import time
+
+import pymongo
+
+import openwifi.helpers.exit_codes
+import openwifi.helpers.networks
+
+
+class BackfillNetworks:
+    """
+    Rebuilds the networks collection from all the scan results.
+
+    The networks collection is dropped first, because the sighting counts
+    are not idempotent.
+    """
+
+    _BATCH_SIZE = 10000
+
+    def __init__(self):
+        self._logger = logging.getLogger(BackfillNetworks.__name__)
+
+    def main(self, args, db):
+        self._logger.info("Starting backfilling the networks ...")
+        start_time = time.time()
+        db.networks.drop()
+        db.networks.ensure_index(openwifi.helpers.networks.SEQ_INDEX)
+        last_id, count = None, 0
+        while True:
+            scan_results = list(db.scan_results.find(
+                {"_id": {"$gt": last_id}} if last_id is not None else {},
+                {"bssid": True, "ssid": True, "ts": True, "acc": True, "loc": True},
+            ).sort([("_id", pymongo.ASCENDING)]).limit(self._BATCH_SIZE))
+            if not scan_results:
+                break
+            openwifi.helpers.networks.update(db, scan_results)
+            openwifi.helpers.networks.add_counts(db, collections.Counter(
+                scan_result["bssid"]
+                for scan_result in scan_results
+            ))
+            last_id = scan_results[-1]["_id"]
+            count += len(scan_results)
+            self._logger.debug("Backfilled %s scan results.", count)
+        self._logger.info(
+            "Backfilled %s scan results in %.1fs, %s networks.",
+            count,
+            time.time() - start_time,
+            db.networks.count(),
+        )
+        return openwifi.helpers.exit_codes.EX_OK
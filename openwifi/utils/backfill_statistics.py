@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Backfill statistics service utility.
+"""
+
+import itertools
+import logging
+import time
+
+import openwifi.helpers
+import openwifi.helpers.exit_codes
+
+
+class BackfillStatistics:
+    """
+    Seeds the statistics counters with all the scan results.
+    """
+
+    _BATCH_SIZE = 10000
+
+    def __init__(self):
+        self._logger = logging.getLogger(BackfillStatistics.__name__)
+
+    def main(self, args, db, cache):
+        self._logger.info("Starting backfilling the statistics ...")
+        start_time = time.time()
+        cursor = db.scan_results.find({}, {
+            "_id": False,
+            "ssid": True,
+            "bssid": True,
+        }).batch_size(self._BATCH_SIZE)
+        count = 0
+        while True:
+            scan_results = list(itertools.islice(cursor, self._BATCH_SIZE))
+            if not scan_results:
+                break
+            pipeline = cache.redis.pipeline(transaction=False)
+            openwifi.helpers.Statistics.update(pipeline, scan_results)
+            pipeline.execute()
+            count += len(scan_results)
+            self._logger.debug("Backfilled %s scan results.", count)
+        self._logger.info("Backfilled %s scan results in %.1fs.", count, time.time() - start_time)
+        self._logger.info(
+            "SSID count: %s, BSSID count: %s.",
+            cache.redis.pfcount(openwifi.helpers.Statistics.SSID_KEY),
+            cache.redis.pfcount(openwifi.helpers.Statistics.BSSID_KEY),
+        )
+        return openwifi.helpers.exit_codes.EX_OK
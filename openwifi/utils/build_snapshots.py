@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Build snapshots service utility.
+"""
+
+import datetime
+import gzip
+import hashlib
+import itertools
+import json
+import logging
+import os
+import re
+import time
+
+# noinspection PyPackageRequirements
+import bson.objectid
+import pymongo
+
+import openwifi.helpers
+import openwifi.helpers.exit_codes
+
+
+class BuildSnapshots:
+    """
+    Build snapshots utility main class.
+
+    Writes gzipped JSON arrays of scan results for the initial client
+    synchronization: a full snapshot up to a watermark ID and then
+    deltas from the previous watermark. The manifest lists the files
+    with their sizes and SHA-256 checksums. Clients continue paging
+    from the manifest watermark.
+    """
+
+    MANIFEST_NAME = "manifest.json"
+    # URL prefix of the snapshot files.
+    URL_PREFIX = "/snapshots/"
+
+    # Scan results newer than this in seconds are not included since
+    # scan results with smaller IDs may still be being inserted.
+    _SAFETY_LAG = 60
+    # Number of deltas after which a new full snapshot is written.
+    _MAX_DELTAS = 24
+    # Number of documents read and written at once.
+    _BATCH_SIZE = 10000
+
+    _ZERO_ID = bson.objectid.ObjectId(b"\x00" * 12)
+    # Names of the files written by the utility. Anything else in the directory is left alone.
+    _FILE_NAME_RE = re.compile(r"(snapshot-[0-9a-f]{24}|delta-[0-9a-f]{24}-[0-9a-f]{24})\.json\.gz")
+
+    def __init__(self):
+        self._logger = logging.getLogger(BuildSnapshots.__name__)
+
+    def main(self, args, db):
+        os.makedirs(args.snapshots_path, exist_ok=True)
+        while True:
+            self._build(db, args.snapshots_path)
+            if not args.snapshot_interval:
+                break
+            self._logger.info("Next build in %.0fs.", args.snapshot_interval)
+            time.sleep(args.snapshot_interval)
+        self._logger.info("Finished.")
+        return openwifi.helpers.exit_codes.EX_OK
+
+    def _build(self, db, path):
+        """
+        Writes the next snapshot or delta and updates the manifest.
+        """
+
+        manifest = self._load_manifest(path)
+        watermark = self._get_watermark(db)
+        if watermark is None:
+            self._logger.info("No scan results to snapshot.")
+            return
+        if manifest is not None and watermark <= bson.objectid.ObjectId(manifest["watermark"]):
+            self._logger.info("No new scan results since %s.", manifest["watermark"])
+            return
+        if manifest is None or len(manifest["deltas"]) >= self._MAX_DELTAS:
+            new_manifest = {
+                "snapshot": self._write_file(db, path, "snapshot-%s.json.gz" % watermark, self._ZERO_ID, watermark),
+                "deltas": [],
+            }
+        else:
+            from_id = bson.objectid.ObjectId(manifest["watermark"])
+            new_manifest = dict(manifest, deltas=manifest["deltas"] + [
+                self._write_file(db, path, "delta-%s-%s.json.gz" % (from_id, watermark), from_id, watermark),
+            ])
+        new_manifest["watermark"] = str(watermark)
+        self._save_manifest(path, new_manifest)
+        # Keep the files of the previous manifest for the clients that are downloading them.
+        self._remove_unused_files(path, [new_manifest, manifest])
+
+    def _get_watermark(self, db):
+        """
+        Gets the ID of the latest scan result that is old enough.
+        """
+
+        max_id = bson.objectid.ObjectId.from_datetime(
+            datetime.datetime.utcnow() - datetime.timedelta(seconds=self._SAFETY_LAG),
+        )
+        scan_results = list(db.scan_results.find({"_id": {"$lt": max_id}}, {"_id": True}).sort([
+            ("_id", pymongo.DESCENDING),
+        ]).limit(1))
+        return scan_results[0]["_id"] if scan_results else None
+
+    def _write_file(self, db, path, name, from_id, to_id):
+        """
+        Writes the scan results with IDs in (from_id, to_id] to the file.
+        Returns the manifest entry.
+        """
+
+        self._logger.info("Writing %s ...", name)
+        start_time = time.time()
+        cursor = db.scan_results.find({"_id": {"$gt": from_id, "$lte": to_id}}, {
+            "cid": False,
+            "uid": False,
+        }).sort([("_id", pymongo.ASCENDING)]).batch_size(self._BATCH_SIZE)
+        file_path = os.path.join(path, name)
+        encoder, count = openwifi.helpers.JsonArrayEncoder(), 0
+        try:
+            with gzip.open(file_path + ".tmp", "wb") as file:
+                file.write(encoder.begin())
+                while True:
+                    scan_results = list(itertools.islice(cursor, self._BATCH_SIZE))
+                    if not scan_results:
+                        break
+                    file.write(encoder.encode(scan_results))
+                    count += len(scan_results)
+                file.write(encoder.end())
+        finally:
+            cursor.close()
+        os.replace(file_path + ".tmp", file_path)
+        entry = {
+            "url": self.URL_PREFIX + name,
+            "from_id": str(from_id),
+            "to_id": str(to_id),
+            "count": count,
+            "size": os.path.getsize(file_path),
+            "sha256": self._hash_file(file_path),
+        }
+        self._logger.info("Written %s scan results, %s bytes in %.1fs.", count, entry["size"], time.time() - start_time)
+        return entry
+
+    def _load_manifest(self, path):
+        try:
+            with open(os.path.join(path, self.MANIFEST_NAME), "rt", encoding="utf-8") as file:
+                return json.load(file)
+        except FileNotFoundError:
+            return None
+
+    def _save_manifest(self, path, manifest):
+        manifest_path = os.path.join(path, self.MANIFEST_NAME)
+        with open(manifest_path + ".tmp", "wt", encoding="utf-8") as file:
+            json.dump(manifest, file, indent=2, sort_keys=True)
+        os.replace(manifest_path + ".tmp", manifest_path)
+
+    def _remove_unused_files(self, path, manifests):
+        used_names = {self.MANIFEST_NAME}
+        for manifest in manifests:
+            if manifest is None:
+                continue
+            for entry in [manifest["snapshot"]] + manifest["deltas"]:
+                used_names.add(entry["url"][len(self.URL_PREFIX):])
+        for name in os.listdir(path):
+            if name in used_names or not self._FILE_NAME_RE.fullmatch(name):
+                continue
+            file_path = os.path.join(path, name)
+            if os.path.isfile(file_path):
+                self._logger.info("Removing %s ...", name)
+                os.remove(file_path)
+
+    @staticmethod
+    def _hash_file(file_path):
+        hasher = hashlib.sha256()
+        with open(file_path, "rb") as file:
+            for chunk in iter(lambda: file.read(64 * 1024), b""):
+                hasher.update(chunk)
+        return hasher.hexdigest()
@@ -6,85 +6,142 @@ Cleanup DB service utility.
 """
 
 import logging
-import operator
 import time
 
-import bson.son
+import pymongo
 
+import openwifi.helpers
 import openwifi.helpers.exit_codes
+import openwifi.helpers.watermark
 
 
 class CleanupDB:
     """
     Cleanup DB utility main class.
+
+    Walks the (bssid, ts) index in batches and moves all but the newest
+    scan results of each BSSID to the old_scan_results collection.
+    The position is checkpointed after each batch.
     """
 
+    # Index used to walk scan results BSSID by BSSID.
+    INDEX = [
+        ("bssid", pymongo.ASCENDING),
+        ("ts", pymongo.DESCENDING),
+    ]
+
+    # Checkpoint document ID in the cleanup_state collection.
+    _CHECKPOINT_ID = "cleanup_db"
+    # Pause between passes in continuous mode in seconds.
+    _PASS_INTERVAL = 60.0
+
     def __init__(self):
         self._logger = logging.getLogger(CleanupDB.__name__)
 
-    def main(self, args, db):
+    def main(self, args, db, cache):
         self._logger.info("Starting cleaning up the database ...")
-        # Group scan results by BSSID.
-        self._logger.debug("Running the aggregation query ...")
-        aggregate_start_time = time.time()
-        aggregation_result = db.scan_results.aggregate([
-            {"$sort": bson.son.SON(_id=1)},
-            {"$group": {
-                "_id": "$bssid",
-                "scan_results": {"$push": {"_id": "$_id", "ts": "$ts"}},
-            }},
-        ])
-        aggregate_end_time = time.time()
-        if not aggregation_result.get("ok"):
-            self._logger.fatal("Aggregation query has failed: %s", aggregation_result)
-            return openwifi.helpers.exit_codes.EX_SOFTWARE
-        aggregated_scan_results = aggregation_result["result"]
-        self._logger.info(
-            "Got %s aggregated scan results in %.3fs.",
-            len(aggregated_scan_results),
-            aggregate_end_time - aggregate_start_time,
-        )
+        watermark = openwifi.helpers.watermark.Watermark(cache)
+        while True:
+            self._run_pass(db, cache, watermark, args.cleanup_keep, args.cleanup_batch_size, args.cleanup_rate)
+            if not args.cleanup_continuous:
+                break
+            self._logger.info("Next pass in %.0fs.", self._PASS_INTERVAL)
+            time.sleep(self._PASS_INTERVAL)
+        self._logger.info("Finished.")
+        return openwifi.helpers.exit_codes.EX_OK
+
+    def _run_pass(self, db, cache, watermark, keep, batch_size, rate):
+        """
+        Walks the collection from the checkpoint to the end.
+        """
+
+        bssid = self._load_checkpoint(db)
+        self._logger.info("Starting the pass from %s ...", bssid or "the beginning")
         # Initialize statistics.
+        pass_start_time = time.time()
         total_scan_result_count = 0
-        max_scan_results_per_bssid = 0
         total_old_scan_result_count = 0
-        # Iterate over the aggregated results.
-        self._logger.info("Iterating over the aggregated results ...")
-        for scan_results in aggregated_scan_results:
-            # Unpack result.
-            bssid, scan_results = scan_results["_id"], scan_results["scan_results"]
+        while True:
+            batch_start_time = time.time()
+            old_ids, scanned_count, bssid = self._scan_batch(db, bssid, keep, batch_size)
+            self._move(db, old_ids)
+            if old_ids:
+                # Synchronization pages have changed.
+                pipeline = cache.pipeline()
+                watermark.touch(pipeline)
+                pipeline.execute()
+            self._save_checkpoint(db, bssid)
             # Update statistics.
-            total_scan_result_count += len(scan_results)
-            max_scan_results_per_bssid = max(max_scan_results_per_bssid, len(scan_results))
-            # Sort the results by timestamp and skip ten of them.
-            sorted_scan_results = sorted(scan_results, key=operator.itemgetter("ts"), reverse=True)
-            old_scan_results = sorted_scan_results[3:]
-            if not old_scan_results:
-                # No old results.
-                continue
-            # Remove old results by _id.
-            self._logger.debug("[%s]: %s old results.", bssid, len(old_scan_results))
+            total_scan_result_count += scanned_count
+            total_old_scan_result_count += len(old_ids)
             self._logger.debug(
-                "Most recent at %s, old start at %s.",
-                sorted_scan_results[0]["ts"],
-                old_scan_results[0]["ts"],
+                "Scanned %s, moved %s in %.3fs.",
+                scanned_count,
+                len(old_ids),
+                time.time() - batch_start_time,
             )
-            for old_scan_result in old_scan_results:
-                # Move the result.
-                self._logger.debug("Moving %s ...", old_scan_result["_id"])
-                old_scan_result = db.scan_results.find_one(old_scan_result["_id"])
-                if old_scan_result is not None:
-                    db.scan_results.remove(old_scan_result["_id"])
-                    db.old_scan_results.insert(old_scan_result)
-            # Update statistics.
-            total_old_scan_result_count += len(old_scan_results)
-        # Finished.
-        self._logger.info("Done.")
-        self._logger.info("Total %s old scan results.", total_old_scan_result_count)
+            if bssid is None:
+                # Reached the end of the collection.
+                break
+            if rate:
+                # Throttle to the specified number of scanned documents per second.
+                time.sleep(max(0.0, scanned_count / rate - (time.time() - batch_start_time)))
         self._logger.info(
-            "Was %.1f results per BSSID (%s max).",
-            total_scan_result_count / len(aggregated_scan_results),
-            max_scan_results_per_bssid,
+            "Pass done in %.1fs. Scanned %s, moved %s old scan results.",
+            time.time() - pass_start_time,
+            total_scan_result_count,
+            total_old_scan_result_count,
+        )
+
+    def _scan_batch(self, db, bssid, keep, batch_size):
+        """
+        Scans at least batch_size scan results starting from the BSSID.
+        Stops on a BSSID boundary.
+        Returns old scan result IDs, scanned count and the next BSSID or None
+        if the end is reached.
+        """
+
+        cursor = db.scan_results.find(
+            {"bssid": {"$gte": bssid}} if bssid is not None else {},
+            {"bssid": True},
+        ).sort(self.INDEX).hint(self.INDEX).batch_size(batch_size)
+        old_ids, scanned_count = [], 0
+        current_bssid, current_count = None, 0
+        try:
+            for scan_result in cursor:
+                if scan_result["bssid"] != current_bssid:
+                    if scanned_count >= batch_size:
+                        # The batch is full. Continue from this BSSID next time.
+                        return old_ids, scanned_count, scan_result["bssid"]
+                    current_bssid, current_count = scan_result["bssid"], 0
+                scanned_count += 1
+                current_count += 1
+                # Scan results go from the most recent one.
+                if current_count > keep:
+                    old_ids.append(scan_result["_id"])
+        finally:
+            cursor.close()
+        return old_ids, scanned_count, None
+
+    def _move(self, db, ids):
+        """
+        Copies the scan results to the old scan results and then removes them.
+        """
+
+        if not ids:
+            return
+        old_scan_results = list(db.scan_results.find({"_id": {"$in": ids}}))
+        # Duplicates are left from an interrupted run.
+        openwifi.helpers.bulk_insert(db.old_scan_results, old_scan_results, len(ids))
+        db.scan_results.remove({"_id": {"$in": ids}})
+
+    def _load_checkpoint(self, db):
+        checkpoint = db.cleanup_state.find_one(self._CHECKPOINT_ID)
+        return checkpoint["bssid"] if checkpoint else None
+
+    def _save_checkpoint(self, db, bssid):
+        db.cleanup_state.update(
+            {"_id": self._CHECKPOINT_ID},
+            {"$set": {"bssid": bssid}},
+            upsert=True,
         )
-        self._logger.info("Finished.")
-        return openwifi.helpers.exit_codes.EX_OK
@@ -1,12 +1,25 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
+import datetime
 import hashlib
 import http.client
+import itertools
+import json
 import logging
+import math
+import time
 
-import requests
+# noinspection PyPackageRequirements
+import bson.objectid
+import tornado.gen
+import tornado.httpclient
+import tornado.httputil
+import tornado.iostream
+import tornado.web
 
+import openwifi.helpers.executor
+import openwifi.helpers.metrics
 import openwifi.web.handlers.base_handler
 
 
@@ -19,6 +32,20 @@ class BaseHandler(openwifi.web.handlers.base_handler.BaseHandler):
     _X_CLIENT_ID_HEADER = "X-Client-ID"
     _X_AUTH_TOKEN_HEADER = "X-Auth-Token"
 
+    # Invalid tokens are remembered for this time in seconds.
+    _NEGATIVE_CACHE_TIME = 60
+    # Maximum number of documents in a GET page. Bounds the response time.
+    # Memory usage does not depend on it because the response is streamed.
+    _GET_LIMIT = 1024 * 1024
+    # Number of documents fetched and flushed at once.
+    _GET_CHUNK_SIZE = 1024
+    # Documents newer than this in seconds are not served, because
+    # concurrent writers do not commit their IDs in order. Paging past
+    # an uncommitted ID would skip the document for good.
+    _SAFETY_LAG = 10.0
+    # Token verifications in progress by cache key.
+    _verifications = dict()
+
     def initialize(self, cache):
         super(BaseHandler, self).initialize()
 
@@ -27,6 +54,7 @@ class BaseHandler(openwifi.web.handlers.base_handler.BaseHandler):
         assert cache is not None
         self._cache = cache
 
+    @tornado.gen.coroutine
     def prepare(self):
         super(BaseHandler, self).prepare()
 
@@ -37,11 +65,22 @@ class BaseHandler(openwifi.web.handlers.base_handler.BaseHandler):
         auth_token = self.request.headers.get(self._X_AUTH_TOKEN_HEADER)
         self._logger.debug("%s: %s", self._X_AUTH_TOKEN_HEADER, auth_token)
         # Authenticate the user.
-        self._user_id = self._authenticate(auth_token)
+        self._user_id = yield self._authenticate(auth_token)
         self._logger.debug("User ID: %s", self._user_id)
 
         self.set_header("Content-Type", "application/json")
 
+    def write_error(self, status_code, **kwargs):
+        """
+        Adds Retry-After header if retry_after keyword argument is passed.
+        """
+
+        retry_after = kwargs.get("retry_after")
+        if retry_after is not None:
+            self.set_header("Retry-After", str(int(math.ceil(retry_after))))
+        super(BaseHandler, self).write_error(status_code, **kwargs)
+
+    @tornado.gen.coroutine
     def _authenticate(self, auth_token):
         """
         Authenticates the user.
@@ -53,25 +92,156 @@ class BaseHandler(openwifi.web.handlers.base_handler.BaseHandler):
         # Redis key. Do not store authentication tokens "as is".
         key = b"auth:" + self._hash(auth_token)
         # Check if the token is in the cache.
-        user_id = self._cache.get(key)
-        if user_id:
-            return user_id
-        # Verify the token.
+        with openwifi.helpers.metrics.CACHE_TIME.time("auth_get"):
+            user_id = self._cache.get(key, local=True)
+        if user_id is not None:
+            openwifi.helpers.metrics.AUTHENTICATIONS.inc("hit" if user_id else "negative_hit")
+            # Empty value means the token is known to be invalid.
+            return user_id or None
+        # Join the verification in progress if any.
+        future = self._verifications.get(key)
+        if future is None:
+            openwifi.helpers.metrics.AUTHENTICATIONS.inc("miss")
+            future = self._verifications[key] = self._verify_token(key, auth_token)
+            future.add_done_callback(lambda _: self._verifications.pop(key, None))
+        else:
+            openwifi.helpers.metrics.AUTHENTICATIONS.inc("coalesced")
+        user_id = yield future
+        return user_id
+
+    @tornado.gen.coroutine
+    def _verify_token(self, key, auth_token):
+        """
+        Verifies the token and caches the verification result.
+        """
+
         self._logger.debug("Verifying the token %s", auth_token)
-        response = requests.get(
-            "https://www.googleapis.com/oauth2/v1/tokeninfo",
-            params={"access_token": auth_token},
-        )
-        if response.status_code != requests.codes.ok:
+        start_time = time.time()
+        try:
+            response = yield tornado.httpclient.AsyncHTTPClient().fetch(
+                tornado.httputil.url_concat(
+                    self.settings["token_info_url"],
+                    {"access_token": auth_token},
+                ),
+            )
+        except tornado.httpclient.HTTPError as ex:
+            if ex.code in (http.client.BAD_REQUEST, http.client.UNAUTHORIZED):
+                openwifi.helpers.metrics.TOKEN_VERIFICATION_TIME.observe(time.time() - start_time, "invalid")
+                # The token is invalid. Remember that for a while.
+                self._cache.set(key, b"", ex=self._NEGATIVE_CACHE_TIME, local=True)
+            else:
+                openwifi.helpers.metrics.TOKEN_VERIFICATION_TIME.observe(time.time() - start_time, "error")
+                self._logger.warning("Token verification has failed: %s", ex)
+            return None
+        except (OSError, tornado.iostream.StreamClosedError) as ex:
+            # The token info endpoint is unreachable. Serve the request anonymously.
+            openwifi.helpers.metrics.TOKEN_VERIFICATION_TIME.observe(time.time() - start_time, "error")
+            self._logger.warning("Token verification has failed: %r", ex)
             return None
+        openwifi.helpers.metrics.TOKEN_VERIFICATION_TIME.observe(time.time() - start_time, "valid")
         # The token is valid. Obtain the user ID.
-        token_info = response.json()
-        # Depersonalize the user. 
+        token_info = json.loads(response.body.decode("utf-8"))
+        # Depersonalize the user.
         user_id = self._hash(token_info["user_id"])
         # Put the user ID into the cache.
-        self._cache.set(key, user_id , ex=token_info["expires_in"])
+        self._cache.set(key, user_id, ex=token_info["expires_in"], local=True)
         # And return the user ID.
         return user_id
 
+    def _limit_rate(self, budget, cost):
+        """
+        Charges the client and the user for the cost.
+        Sends 429 and returns False if the budget is exceeded.
+        """
+
+        identities = []
+        if self._client_id:
+            identities.append(b"client:" + self._client_id.encode("utf-8"))
+        if self._user_id:
+            identities.append(b"user:" + self._user_id)
+        retry_after = self.settings["rate_limiter"].limit(budget, identities, cost)
+        if not retry_after:
+            return True
+        self._logger.warning(
+            "Rate limited %s of %s by client %s, retry after %.1fs.",
+            budget,
+            cost,
+            self._client_id,
+            retry_after,
+        )
+        self.send_error(http.client.TOO_MANY_REQUESTS, retry_after=retry_after)
+        return False
+
+    def _parse_limit(self, limit):
+        """
+        Parses the page size. Zero is unbounded in MongoDB, so it means
+        the maximum page.
+        """
+
+        limit = int(limit)
+        if limit < 0:
+            raise ValueError("Invalid limit: %s" % limit)
+        return min(limit, self._GET_LIMIT) or self._GET_LIMIT
+
+    def _get_max_id(self):
+        """
+        Gets the exclusive upper bound of the IDs that are safe to serve.
+        """
+
+        return bson.objectid.ObjectId.from_datetime(
+            datetime.datetime.utcnow() - datetime.timedelta(seconds=self._SAFETY_LAG),
+        )
+
+    @tornado.gen.coroutine
+    def _write_page(self, encoder, limit, find):
+        """
+        Charges for the page and streams the documents of the cursor
+        returned by find(limit) chunk by chunk. Returns the number of
+        documents written or None if rate limited.
+        """
+
+        # Charge for the number of chunks requested.
+        if not self._limit_rate("get", max(1, math.ceil(limit / self._GET_CHUNK_SIZE))):
+            return None
+        cursor = find(limit)
+        count = 0
+        try:
+            self.write(encoder.begin())
+            while True:
+                documents = yield self._run_in_executor(self._fetch_chunk, cursor)
+                if not documents:
+                    break
+                self.write(encoder.encode(documents))
+                count += len(documents)
+                yield self.flush()
+            self.write(encoder.end())
+        except tornado.iostream.StreamClosedError:
+            self._logger.warning("Stream closed after %s document(s).", count)
+        finally:
+            cursor.close()
+        return count
+
+    def _fetch_chunk(self, cursor):
+        """
+        Fetches the next chunk of documents from the cursor.
+        """
+
+        return list(itertools.islice(cursor, self._GET_CHUNK_SIZE))
+
+    def _run_in_executor(self, fn, *args, **kwargs):
+        """
+        Runs the blocking database call in the executor.
+        """
+
+        def run():
+            with openwifi.helpers.metrics.DB_TIME.time(fn.__name__):
+                return fn(*args, **kwargs)
+
+        try:
+            return self._executor.submit(run)
+        except openwifi.helpers.executor.ExecutorBusyError as ex:
+            self._logger.warning("Executor is busy: %s", ex)
+            raise tornado.web.HTTPError(http.client.SERVICE_UNAVAILABLE)
+
     def _hash(self, string):
         return hashlib.sha1(bytes(string, "utf-8")).digest()
@@ -1,9 +1,8 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
-import json
-
 import openwifi.__version__
+import openwifi.helpers.json_codec
 import openwifi.web.handlers.api.base_handler
 
 
@@ -13,6 +12,6 @@ class InfoHandler(openwifi.web.handlers.api.base_handler.BaseHandler):
     """
 
     def get(self, *args, **kwargs):
-        self.write(json.dumps({
+        self.write(openwifi.helpers.json_codec.dumps({
             "version": openwifi.__version__.version,
         }))
@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import http.client
+import logging
+
+import openwifi.helpers.json_codec
+import openwifi.web.handlers.api.base_handler
+import openwifi.web.handlers.api.scan_results_handler
+
+
+class LocateHandler(openwifi.web.handlers.api.base_handler.BaseHandler):
+    """
+    Estimates the position from the observed networks.
+
+    The request body is {"networks": [{"bssid": ..., "level": ...}]} where
+    the level in dBm is optional. The response is {"loc": ..., "acc": ...}
+    or 404 if none of the networks is known.
+    """
+
+    # Maximum number of networks per request.
+    _MAX_NETWORKS = 100
+    # Valid levels in dBm.
+    _MIN_LEVEL, _MAX_LEVEL = -150, 0
+
+    # noinspection PyMethodOverriding
+    def initialize(self, cache, locator):
+        super(LocateHandler, self).initialize(cache)
+
+        self._locator = locator
+        self._logger = logging.getLogger(LocateHandler.__name__)
+
+    def post(self, *args, **kwargs):
+        if self._locator is None:
+            self.send_error(http.client.NOT_FOUND)
+            return
+        try:
+            # Check headers.
+            if not self._client_id:
+                raise ValueError("No client ID.")
+            # Parse the body.
+            observations = self._parse_observations(openwifi.helpers.json_codec.loads(self.request.body))
+        except ValueError as ex:
+            self._logger.warning("Value error: %s from client %s", ex, self._client_id)
+            self.send_error(http.client.BAD_REQUEST)
+            return
+        if not self._limit_rate("get", 1):
+            return
+        result = self._locator.locate(observations)
+        if result is None:
+            self.send_error(http.client.NOT_FOUND)
+            return
+        lat, lon, acc = result
+        self.write(openwifi.helpers.json_codec.dumps({
+            "loc": {"lat": lat, "lon": lon},
+            "acc": round(acc, 1),
+        }))
+
+    def _parse_observations(self, body):
+        """
+        Parses the observed networks into (bssid, level) pairs.
+        """
+
+        networks = body.get("networks") if isinstance(body, dict) else None
+        if not isinstance(networks, list) or not networks:
+            raise ValueError("No networks.")
+        if len(networks) > self._MAX_NETWORKS:
+            raise ValueError("Too many networks: %s." % len(networks))
+        observations = []
+        for network in networks:
+            if not isinstance(network, dict):
+                raise ValueError("Invalid network.")
+            bssid, level = network.get("bssid"), network.get("level", self._locator.DEFAULT_LEVEL)
+            if not openwifi.web.handlers.api.scan_results_handler._validate_bssid(bssid):
+                raise ValueError("Invalid BSSID: %s." % bssid)
+            if not isinstance(level, (int, float)) or not self._MIN_LEVEL <= level <= self._MAX_LEVEL:
+                raise ValueError("Invalid level: %s." % level)
+            observations.append((bssid, level))
+        return observations
@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import http.client
+import logging
+
+import openwifi.helpers.json_codec
+import openwifi.web.handlers.api.base_handler
+
+
+class NearestNetworksHandler(openwifi.web.handlers.api.base_handler.BaseHandler):
+    """
+    Gets the nearest known networks to the point from the spatial index.
+
+    The point is requested with "lat" and "lon" arguments. The "count"
+    argument limits the number of networks and the "radius" argument
+    limits the distance in meters.
+    """
+
+    # Maximum number of networks per request.
+    _MAX_COUNT = 100
+    _DEFAULT_COUNT = 10
+
+    # noinspection PyMethodOverriding
+    def initialize(self, cache, spatial_index):
+        super(NearestNetworksHandler, self).initialize(cache)
+
+        self._spatial_index = spatial_index
+        self._logger = logging.getLogger(NearestNetworksHandler.__name__)
+
+    def get(self, *args, **kwargs):
+        if self._spatial_index is None:
+            self.send_error(http.client.NOT_FOUND)
+            return
+        try:
+            # Check headers.
+            if not self._client_id:
+                raise ValueError("No client ID.")
+            # Parse parameters.
+            lat, lon = float(self.get_argument("lat")), float(self.get_argument("lon"))
+            if not (-90.0 <= lat <= 90.0 and -180.0 <= lon <= 180.0):
+                raise ValueError("Invalid point: %s, %s." % (lat, lon))
+            count = int(self.get_argument("count", self._DEFAULT_COUNT))
+            if not 0 < count <= self._MAX_COUNT:
+                raise ValueError("Invalid count: %s." % count)
+            radius = float(self.get_argument("radius", self._spatial_index.MAX_RADIUS))
+            if not 0.0 <= radius <= self._spatial_index.MAX_RADIUS:
+                raise ValueError("Invalid radius: %s." % radius)
+        except ValueError as ex:
+            self._logger.warning("Value error: %s", ex)
+            self.send_error(http.client.BAD_REQUEST)
+            return
+        if not self._limit_rate("get", 1):
+            return
+        networks = self._spatial_index.nearest(lat, lon, count, radius)
+        self.write(openwifi.helpers.json_codec.dumps({
+            "networks": [{
+                "bssid": bssid,
+                "loc": {"lat": network_lat, "lon": network_lon},
+                "distance": round(distance, 1),
+            } for distance, bssid, network_lat, network_lon in networks],
+        }))
@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import functools
+import http.client
+import logging
+
+# noinspection PyPackageRequirements
+import bson.objectid
+import tornado.gen
+
+import openwifi.helpers
+import openwifi.helpers.networks
+import openwifi.web.handlers.api.base_handler
+
+
+class NetworksHandler(openwifi.web.handlers.api.base_handler.BaseHandler):
+    """
+    Gets the networks changed after the specified sequence ID.
+
+    Unlike scan results, a network is sent again on every change, so a
+    client keeps one document per BSSID.
+    """
+
+    # noinspection PyMethodOverriding
+    def initialize(self, db, cache, executor):
+        super(NetworksHandler, self).initialize(cache)
+
+        self._db = db
+        self._executor = executor
+        self._logger = logging.getLogger(NetworksHandler.__name__)
+
+    @tornado.gen.coroutine
+    def get(self, last_seq=None, limit=None, *args, **kwargs):
+        try:
+            # Check headers.
+            if not self._client_id:
+                raise ValueError("No client ID.")
+            # Parse parameters.
+            limit = self._parse_limit(limit)
+            last_seq = bson.objectid.ObjectId(last_seq)
+        except (ValueError, bson.objectid.InvalidId) as ex:
+            self._logger.warning("Value error: %s", ex)
+            self.send_error(http.client.BAD_REQUEST)
+            return
+        count = yield self._write_page(
+            openwifi.helpers.JsonArrayEncoder(),
+            limit,
+            functools.partial(self._find_networks, last_seq, self._get_max_id()),
+        )
+        self._logger.debug("Got %s network(s).", count)
+
+    def _find_networks(self, last_seq, max_seq, limit):
+        """
+        Gets the cursor over the networks changed after the specified
+        sequence ID and before the maximum one.
+        """
+
+        return self._db.networks.find({
+            "seq": {"$gt": last_seq, "$lt": max_seq},
+        }).sort(
+            openwifi.helpers.networks.SEQ_INDEX,
+        ).limit(limit).batch_size(self._GET_CHUNK_SIZE)
@@ -3,178 +3,391 @@
 
 import calendar
 import datetime
+import functools
+import hashlib
 import http.client
-import json
+import itertools
 import logging
 import re
+import zlib
 
 # noinspection PyPackageRequirements
 import bson.objectid
 import pymongo
 import pymongo.errors
+import redis
+import tornado.gen
+import tornado.web
 
 import openwifi.helpers
+import openwifi.helpers.compact_format
+import openwifi.helpers.ingest_queue
+import openwifi.helpers.json_codec
+import openwifi.helpers.metrics
 import openwifi.web.handlers.api.base_handler
 
 
 _bssid_re = re.compile(r"([0-9a-f]{2}:){5}[0-9a-f]{2}")
 
 
-def _validate_bssid(value):
+def _validate_bssids(values, now):
     """
-    Validates BSSID.
+    Validates BSSIDs.
     """
 
-    return isinstance(value, str) and bool(_bssid_re.match(value))
+    return [isinstance(value, str) and _bssid_re.fullmatch(value) is not None for value in values]
 
 
-def _validate_ssid(value):
+def _validate_ssids(values, now):
     """
-    Validates SSID.
+    Validates SSIDs.
     """
 
-    return isinstance(value, str) and len(value) <= 32
+    return [isinstance(value, str) and 0 < len(value) <= 32 for value in values]
 
 
-def _validate_timestamp(value):
+def _validate_timestamps(values, now):
     """
-    Validates timestamp.
+    Validates timestamps.
     """
 
-    return (
-        isinstance(value, int) and
-        # value is stored in ms.
-        value / 1000 < calendar.timegm(datetime.datetime.utcnow().utctimetuple())
-    )
+    # value is stored in ms.
+    max_value = now * 1000
+    return [isinstance(value, int) and value < max_value for value in values]
 
 
-def _validate_accuracy(value):
+def _validate_accuracies(values, now):
     """
-    Validate accuracy.
+    Validates accuracies. Too large accuracy is not accepted.
     """
 
-    return (isinstance(value, int) and 0 <= value) or (isinstance(value, float) and 0.0 <= value)
+    return [isinstance(value, (int, float)) and 0 <= value <= 100.0 for value in values]
 
 
-def _validate_location(value):
-    # Check for the type.
-    if not isinstance(value, dict):
-        return False
-    # Extract values.
-    latitude, longitude = map(value.get, ("lat", "lon"))
-    # Check latitude.
-    if not isinstance(latitude, float) or latitude < -90.0 or latitude > +90.0:
-        return False
-    # Check longitude.
-    if not isinstance(longitude, float) or longitude < -180.0 or longitude > +180.0:
-        return False
-    # All validations passed.
-    return True
+def _validate_locations(values, now):
+    """
+    Validates locations.
+    """
+
+    return [
+        isinstance(value, dict) and
+        isinstance(value.get("lat"), float) and -90.0 <= value["lat"] <= +90.0 and
+        isinstance(value.get("lon"), float) and -180.0 <= value["lon"] <= +180.0
+        for value in values
+    ]
 
 
 _validators = {
-    "bssid": _validate_bssid,
-    "ssid": _validate_ssid,
-    "ts": _validate_timestamp,
-    "acc": _validate_accuracy,
-    "loc": _validate_location,
+    "bssid": _validate_bssids,
+    "ssid": _validate_ssids,
+    "ts": _validate_timestamps,
+    "acc": _validate_accuracies,
+    "loc": _validate_locations,
 }
 
 
-def _filter_scan_result(scan_result):
-    # Do not accept to large accuracy.
-    return scan_result["acc"] <= 100.0
+def _validate_bssid(value):
+    """
+    Validates BSSID.
+    """
+
+    return _validate_bssids([value], None)[0]
+
+
+def _validate_scan_results(scan_results):
+    """
+    Validates the batch of scan results field by field.
+    Returns the valid scan results and the list of (index, reason) rejections.
+    """
 
+    now = calendar.timegm(datetime.datetime.utcnow().utctimetuple())
+    # Check the document fields.
+    indexes = [
+        index
+        for index, scan_result in enumerate(scan_results)
+        if isinstance(scan_result, dict) and scan_result.keys() == _validators.keys()
+    ]
+    rejections = [
+        (index, "Invalid fields.")
+        for index in sorted(set(range(len(scan_results))) - set(indexes))
+    ]
+    # Validate the columns.
+    for key, validate in _validators.items():
+        results = validate([scan_results[index][key] for index in indexes], now)
+        rejections.extend(
+            (index, "Invalid %s." % key)
+            for index, is_valid in zip(indexes, results)
+            if not is_valid
+        )
+        indexes = list(itertools.compress(indexes, results))
+    rejections.sort()
+    return [scan_results[index] for index in indexes], rejections
 
+
+@tornado.web.stream_request_body
 class ScanResultsHandler(openwifi.web.handlers.api.base_handler.BaseHandler):
     """
     Scan results request handler.
+
+    Uploads are parsed while the body is arriving and ingested in chunks,
+    so a large upload is never held in memory as a whole.
     """
 
-    # Prevents the entire collection to be loaded into memory at once.
-    _GET_SCAN_RESULTS_LIMIT = 1024
+    # Suggested delay before retrying when the ingest queue is full in seconds.
+    _QUEUE_FULL_RETRY_AFTER = 5
+    # Number of uploaded documents validated and ingested at once.
+    _POST_CHUNK_SIZE = 1000
+    # Maximum size of an uploaded document in JSON.
+    _MAX_ITEM_SIZE = 64 * 1024
+    # Maximum size of decompressed data processed at once.
+    _DECOMPRESS_CHUNK_SIZE = 64 * 1024
 
     # noinspection PyMethodOverriding
-    def initialize(self, db, cache):
+    def initialize(self, db, cache, executor, ingestor, ingest_queue, watermark):
         super(ScanResultsHandler, self).initialize(cache)
 
         self._db = db
+        self._executor = executor
+        self._ingestor = ingestor
+        self._watermark = watermark
+        # Scan results are inserted synchronously if there is no queue.
+        self._ingest_queue = ingest_queue
         self._logger = logging.getLogger(ScanResultsHandler.__name__)
+        # Upload state.
+        self._decompressor = None
+        self._parser = None
+        self._compact_chunks = None
+        self._body_size = 0
+        self._pending_scan_results = []
+        self._received_count = 0
+        self._inserted_count = self._duplicate_count = self._queued_count = 0
+        self._rejected = []
 
+    @tornado.gen.coroutine
     def get(self, last_id=None, limit=None, *args, **kwargs):
         try:
             # Check headers.
             if not self._client_id:
                 raise ValueError("No client ID.")
             # Parse parameters.
-            limit = int(limit)
-            if limit < 0:
-                raise ValueError("Invalid limit: %s" % limit)
+            limit = self._parse_limit(limit)
             last_id = bson.objectid.ObjectId(last_id)
         except (ValueError, bson.objectid.InvalidId) as ex:
             self._logger.warning("Value error: %s", ex)
             self.send_error(http.client.BAD_REQUEST)
             return
-        # Perform query.
-        cursor = self._db.scan_results.find({
-            "_id": {"$gt": last_id},
-            "cid": {"$ne": self._client_id},
-        }, {
-            "cid": False,
-            "uid": False,
-        }).sort([("_id", pymongo.ASCENDING)]).limit(min(limit, self._GET_SCAN_RESULTS_LIMIT))
-        # Write response.
-        scan_results = list(cursor)
-        self._logger.debug("Got %s result(s).", len(scan_results))
-        self.write(json.dumps(scan_results, cls=openwifi.helpers.MongoEncoder))
+        # Negotiate the response format.
+        self.set_header("Vary", "Accept, %s" % self._X_CLIENT_ID_HEADER)
+        is_compact = openwifi.helpers.compact_format.MIME_TYPE in self.request.headers.get("Accept", "")
+        if is_compact:
+            self.set_header(self._CONTENT_TYPE_HEADER, openwifi.helpers.compact_format.MIME_TYPE)
+            encoder = openwifi.helpers.compact_format.Encoder(with_ids=True)
+        else:
+            encoder = openwifi.helpers.JsonArrayEncoder()
+        max_id = self._get_max_id()
+        # Check the watermark.
+        watermark_state = self._watermark.get()
+        if watermark_state is not None:
+            watermark, changes = watermark_state
+            # The page does not depend on time once the watermark is older than the bound.
+            self._set_page_etag(is_compact, last_id, limit, min(watermark, max_id), changes)
+            if self.check_etag_header():
+                self.set_status(http.client.NOT_MODIFIED)
+                return
+            if last_id >= min(watermark, max_id):
+                # Nothing has been inserted since the last ID or it is too recent.
+                self.write(encoder.begin())
+                self.write(encoder.end())
+                return
+        count = yield self._write_page(encoder, limit, functools.partial(self._find_scan_results, last_id, max_id))
+        self._logger.debug("Got %s result(s).", count)
 
-    def post(self, *args, **kwargs):
-        # Initialize with None as it will be used in except block.
-        scan_results = None
+    @tornado.gen.coroutine
+    def prepare(self):
+        yield super(ScanResultsHandler, self).prepare()
+
+        if self.request.method != "POST":
+            return
         try:
             # Check the headers.
             if not self._client_id:
                 raise ValueError("No client ID.")
             if not self._user_id:
                 raise ValueError("No user ID.")
-            # Deserialize the scan results.
-            scan_results = self.request.body.decode("utf-8")
-            scan_results = json.loads(scan_results)
-            if not isinstance(scan_results, list):
-                raise ValueError("Scan result is not a list.")
-            self._logger.debug("Got %s scan results.", len(scan_results))
-            for scan_result in scan_results:
-                # Validate the document.
-                if len(scan_result) != len(_validators):
-                    raise ValueError("Invalid document size.")
-                for key, value in scan_result.items():
-                    validate = _validators.get(key)
-                    # Check the value.
-                    if not validate or not validate(value):
-                        raise ValueError("Validation failed: %s" % repr((key, value)))
-                if not scan_result["ssid"]:
-                    self._logger.warning("Skipped empty SSID: [cid=%s].", self._client_id)
-                    continue
-                # Check the document value.
-                if _filter_scan_result(scan_result):
-                    # Attach the client ID and the user ID.
-                    scan_result.update({
-                        "cid": self._client_id,
-                        "uid": self._user_id,
-                    })
-                    # Insert the document.
-                    try:
-                        self._db.scan_results.insert(
-                            scan_result,
-                            # Generate _id on the client side.
-                            manipulate=True,
-                        )
-                    except pymongo.errors.DuplicateKeyError:
-                        # Perhaps, the (cid, ts, bssid) index was violated.
-                        self._logger.debug("Duplicate: %s", scan_result)
-                    else:
-                        self._logger.debug("Saved scan result: %s", scan_result)
+            content_encoding = self.request.headers.get("Content-Encoding", "identity")
+            if content_encoding == "gzip":
+                self._decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+            elif content_encoding != "identity":
+                raise ValueError("Unsupported content encoding: %s." % content_encoding)
+        except ValueError as ex:
+            self._logger.warning("Value error: %s from client %s", ex, self._client_id)
+            self.send_error(http.client.BAD_REQUEST)
+            return
+        content_type = self.request.headers.get(self._CONTENT_TYPE_HEADER, "")
+        if content_type.startswith(openwifi.helpers.compact_format.MIME_TYPE):
+            # The compact format is decoded at once.
+            self._compact_chunks = []
+        else:
+            self._parser = openwifi.helpers.json_codec.ArrayParser(self._MAX_ITEM_SIZE)
+        self.request.connection.set_max_body_size(self.settings["max_upload_size"])
+
+    @tornado.gen.coroutine
+    def data_received(self, chunk):
+        if self._finished or self.request.method != "POST":
+            return
+        try:
+            for data in self._decompress(chunk):
+                self._body_size += len(data)
+                if self._body_size > self.settings["max_upload_size"]:
+                    self._logger.warning("Too large upload from client %s.", self._client_id)
+                    self.send_error(http.client.REQUEST_ENTITY_TOO_LARGE)
+                    return
+                if self._parser is not None:
+                    self._pending_scan_results.extend(self._parser.feed(data))
+                else:
+                    self._compact_chunks.append(data)
+        except (ValueError, zlib.error) as ex:
+            self._logger.warning("Value error: %s from client %s", ex, self._client_id)
+            self.send_error(http.client.BAD_REQUEST)
+            return
+        # Ingest the complete chunks while the rest of the body is arriving.
+        try:
+            while len(self._pending_scan_results) >= self._POST_CHUNK_SIZE and not self._finished:
+                yield self._ingest_pending(self._POST_CHUNK_SIZE)
+        except Exception as ex:
+            self._handle_request_exception(ex)
+
+    @tornado.gen.coroutine
+    def post(self, *args, **kwargs):
+        if self._finished:
+            # The upload has been already rejected.
+            return
+        try:
+            if self._decompressor is not None:
+                if not self._decompressor.eof:
+                    raise ValueError("Compressed data is incomplete.")
+            if self._parser is not None:
+                self._parser.close()
+            else:
+                self._pending_scan_results.extend(
+                    openwifi.helpers.compact_format.decode(b"".join(self._compact_chunks)),
+                )
         except ValueError as ex:
-            self._logger.warning("Value error: %s from client %s on %s", ex, self._client_id, scan_results)
-            self.send_error(status_code=http.client.BAD_REQUEST)
+            self._logger.warning("Value error: %s from client %s", ex, self._client_id)
+            self.send_error(http.client.BAD_REQUEST)
+            return
+        while self._pending_scan_results and not self._finished:
+            yield self._ingest_pending(self._POST_CHUNK_SIZE)
+        if self._finished:
+            return
+        self._logger.debug("Got %s scan results.", self._received_count)
+        openwifi.helpers.metrics.INGEST_BATCH_SIZE.observe(self._received_count)
+        if self._rejected:
+            self._logger.warning(
+                "Rejected %s of %s scan results from client %s.",
+                len(self._rejected),
+                self._received_count,
+                self._client_id,
+            )
+        if self._ingest_queue is not None:
+            self.set_status(http.client.ACCEPTED)
+            self.write(openwifi.helpers.json_codec.dumps({
+                "queued": self._queued_count,
+                "rejected": self._rejected,
+            }))
+        else:
+            self.write(openwifi.helpers.json_codec.dumps({
+                "inserted": self._inserted_count,
+                "duplicates": self._duplicate_count,
+                "rejected": self._rejected,
+            }))
+
+    def _decompress(self, chunk):
+        """
+        Yields the decompressed data in bounded pieces.
+        """
+
+        if self._decompressor is None:
+            yield chunk
             return
+        yield self._decompressor.decompress(chunk, self._DECOMPRESS_CHUNK_SIZE)
+        while self._decompressor.unconsumed_tail:
+            yield self._decompressor.decompress(self._decompressor.unconsumed_tail, self._DECOMPRESS_CHUNK_SIZE)
+
+    @tornado.gen.coroutine
+    def _ingest_pending(self, count):
+        """
+        Validates and ingests up to count pending scan results.
+        """
+
+        scan_results = self._pending_scan_results[:count]
+        del self._pending_scan_results[:count]
+        offset, self._received_count = self._received_count, self._received_count + len(scan_results)
+        if not self._limit_rate("post", len(scan_results)):
+            return
+        # Validate the scan results.
+        valid_scan_results, rejections = _validate_scan_results(scan_results)
+        for index, reason in rejections:
+            self._logger.debug("Rejected %s: %s %r", offset + index, reason, scan_results[index])
+            self._rejected.append({"index": offset + index, "reason": reason})
+        openwifi.helpers.metrics.INGESTED_SCAN_RESULTS.inc("rejected", amount=len(rejections))
+        if not valid_scan_results:
+            return
+        # Attach the client ID and the user ID.
+        for scan_result in valid_scan_results:
+            scan_result.update({
+                "cid": self._client_id,
+                "uid": self._user_id,
+            })
+        if self._ingest_queue is not None:
+            # Queue the documents.
+            try:
+                with openwifi.helpers.metrics.CACHE_TIME.time("ingest_queue_push"):
+                    self._ingest_queue.push(valid_scan_results)
+            except (openwifi.helpers.ingest_queue.QueueFullError, redis.RedisError) as ex:
+                self._logger.warning("Ingest queue is unavailable: %s", ex)
+                openwifi.helpers.metrics.INGESTED_SCAN_RESULTS.inc("queue_full", amount=len(valid_scan_results))
+                self.send_error(http.client.SERVICE_UNAVAILABLE, retry_after=self._QUEUE_FULL_RETRY_AFTER)
+                return
+            openwifi.helpers.metrics.INGESTED_SCAN_RESULTS.inc("queued", amount=len(valid_scan_results))
+            self._queued_count += len(valid_scan_results)
+            return
+        # Insert the documents.
+        inserted_count, duplicate_count = yield self._run_in_executor(
+            self._ingestor.ingest,
+            valid_scan_results,
+        )
+        self._inserted_count += inserted_count
+        self._duplicate_count += duplicate_count
+
+    def _set_page_etag(self, is_compact, last_id, limit, bound, changes):
+        """
+        Sets the weak ETag of the page. The page is considered unchanged
+        while the upper bound of its IDs and the change counter are the same.
+        """
+
+        self.set_header("Cache-Control", "no-cache")
+        self.set_header("Etag", 'W/"%s"' % hashlib.sha1(":".join((
+            "compact" if is_compact else "json",
+            self._client_id,
+            str(last_id),
+            str(limit),
+            str(bound),
+            str(changes),
+        )).encode("utf-8")).hexdigest())
+
+    def _find_scan_results(self, last_id, max_id, limit):
+        """
+        Gets the cursor over the scan results that go after the specified ID
+        and before the maximum ID.
+        """
+
+        return self._db.scan_results.find({
+            "_id": {"$gt": last_id, "$lt": max_id},
+            "cid": {"$ne": self._client_id},
+        }, {
+            "cid": False,
+            "uid": False,
+        }).sort([
+            ("_id", pymongo.ASCENDING),
+        ]).limit(limit).batch_size(self._GET_CHUNK_SIZE)
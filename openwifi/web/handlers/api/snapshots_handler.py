@@ -0,0 +1,42 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import http.client
+import logging
+import os
+
+import openwifi.utils.build_snapshots
+import openwifi.web.handlers.api.base_handler
+
+
+class SnapshotsHandler(openwifi.web.handlers.api.base_handler.BaseHandler):
+    """
+    Gets the manifest of the dataset snapshots for the initial synchronization.
+    """
+
+    # Manifest modification times and contents by path.
+    _manifests = dict()
+
+    # noinspection PyMethodOverriding
+    def initialize(self, cache, snapshots_path):
+        super(SnapshotsHandler, self).initialize(cache)
+
+        self._logger = logging.getLogger(SnapshotsHandler.__name__)
+        self._manifest_path = os.path.join(
+            snapshots_path,
+            openwifi.utils.build_snapshots.BuildSnapshots.MANIFEST_NAME,
+        )
+
+    def get(self, *args, **kwargs):
+        try:
+            modified_time = os.stat(self._manifest_path).st_mtime
+        except FileNotFoundError:
+            self._logger.warning("No snapshots.")
+            self.send_error(http.client.NOT_FOUND)
+            return
+        manifest = self._manifests.get(self._manifest_path)
+        if manifest is None or manifest[0] != modified_time:
+            with open(self._manifest_path, "rb") as file:
+                manifest = self._manifests[self._manifest_path] = (modified_time, file.read())
+        # Tornado responds with 304 if the ETag matches.
+        self.write(manifest[1])
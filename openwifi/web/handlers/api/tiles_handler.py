@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import http.client
+import logging
+
+# noinspection PyPackageRequirements
+import bson.objectid
+import pymongo
+import tornado.gen
+
+import openwifi.helpers.json_codec
+import openwifi.helpers.metrics
+import openwifi.helpers.tiles
+import openwifi.web.handlers.api.base_handler
+
+
+class TilesHandler(openwifi.web.handlers.api.base_handler.BaseHandler):
+    """
+    Gets scan results by geographical tiles for micro-synchronization.
+
+    Tiles are requested with "tile" arguments as "<tile_id>" or
+    "<tile_id>:<last_id>", or with the "bbox" argument as
+    "lat_min,lon_min,lat_max,lon_max". Tile pages are cached and shared
+    between clients, so they include the client's own scan results.
+    """
+
+    # Maximum number of tiles per request.
+    _MAX_TILES = 64
+    # Maximum number of scan results per tile.
+    _TILE_LIMIT = 1024
+    # Cached tile page time to live in seconds.
+    _CACHE_TIME = 3600
+
+    _ZERO_ID = bson.objectid.ObjectId(b"\x00" * 12)
+
+    # noinspection PyMethodOverriding
+    def initialize(self, db, cache, executor):
+        super(TilesHandler, self).initialize(cache)
+
+        self._db = db
+        self._executor = executor
+        self._logger = logging.getLogger(TilesHandler.__name__)
+
+    @tornado.gen.coroutine
+    def get(self, *args, **kwargs):
+        try:
+            # Check headers.
+            if not self._client_id:
+                raise ValueError("No client ID.")
+            # Parse parameters.
+            cursors = self._parse_cursors()
+        except (ValueError, bson.objectid.InvalidId) as ex:
+            self._logger.warning("Value error: %s", ex)
+            self.send_error(http.client.BAD_REQUEST)
+            return
+        if not self._limit_rate("get", len(cursors)):
+            return
+        # Get the cached pages of the current tile versions.
+        with openwifi.helpers.metrics.CACHE_TIME.time("tiles_get"):
+            versions = self._cache.mget([
+                openwifi.helpers.tiles.get_version_key(tile_id)
+                for tile_id, _ in cursors
+            ])
+            keys = [
+                openwifi.helpers.tiles.get_page_key(tile_id, int(version or 0), last_id)
+                for (tile_id, last_id), version in zip(cursors, versions)
+            ]
+            pages = self._cache.mget(keys)
+        # Query the missing pages.
+        missing_indexes = [index for index, page in enumerate(pages) if page is None]
+        if missing_indexes:
+            missing_pages = yield self._run_in_executor(
+                self._find_pages,
+                [cursors[index] for index in missing_indexes],
+            )
+            with openwifi.helpers.metrics.CACHE_TIME.time("tiles_set"):
+                pipeline = self._cache.pipeline()
+                for index, page in zip(missing_indexes, missing_pages):
+                    pages[index] = page
+                    pipeline.set(keys[index], page, ex=self._CACHE_TIME)
+                pipeline.execute()
+        self._logger.debug("Got %s tile(s), %s cache miss(es).", len(pages), len(missing_indexes))
+        # Write response.
+        self.write(b'{"tiles": [' + b", ".join(pages) + b"]}")
+
+    def _parse_cursors(self):
+        """
+        Parses the requested tiles into (tile_id, last_id) pairs.
+        """
+
+        cursors = []
+        for value in self.get_arguments("tile"):
+            tile_id, _, last_id = value.partition(":")
+            cursors.append((
+                int(tile_id),
+                bson.objectid.ObjectId(last_id) if last_id else self._ZERO_ID,
+            ))
+        bbox = self.get_argument("bbox", None)
+        if bbox is not None:
+            lat_min, lon_min, lat_max, lon_max = map(float, bbox.split(","))
+            if not (-90.0 <= lat_min <= lat_max <= 90.0 and -180.0 <= lon_min <= lon_max <= 180.0):
+                raise ValueError("Invalid bounding box: %s" % bbox)
+            cursors.extend(
+                (tile_id, self._ZERO_ID)
+                for tile_id in openwifi.helpers.tiles.get_tile_ids(
+                    lat_min, lon_min, lat_max, lon_max,
+                    self._MAX_TILES,
+                )
+            )
+        if not cursors:
+            raise ValueError("No tiles.")
+        if len(cursors) > self._MAX_TILES:
+            raise ValueError("Too many tiles: %s." % len(cursors))
+        for tile_id, _ in cursors:
+            if not openwifi.helpers.tiles.validate_tile_id(tile_id):
+                raise ValueError("Invalid tile ID: %s." % tile_id)
+        return cursors
+
+    def _find_pages(self, cursors):
+        """
+        Finds the tile pages and returns them encoded.
+        """
+
+        max_id = self._get_max_id()
+        return [self._find_page(tile_id, last_id, max_id) for tile_id, last_id in cursors]
+
+    def _find_page(self, tile_id, last_id, max_id):
+        scan_results = list(self._db.scan_results.find(dict(
+            openwifi.helpers.tiles.get_spec(tile_id),
+            _id={"$gt": last_id, "$lt": max_id},
+        ), {
+            "cid": False,
+            "uid": False,
+        }).sort([("_id", pymongo.ASCENDING)]).limit(self._TILE_LIMIT))
+        return openwifi.helpers.json_codec.dumps({
+            "id": tile_id,
+            "last_id": scan_results[-1]["_id"] if scan_results else last_id,
+            "more": len(scan_results) == self._TILE_LIMIT,
+            "scan_results": scan_results,
+        })
@@ -0,0 +1,25 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import logging
+
+import openwifi.helpers.metrics
+import openwifi.web.handlers.base_handler
+
+
+class MetricsHandler(openwifi.web.handlers.base_handler.BaseHandler):
+    """
+    Exposes metrics of all the server processes for Prometheus.
+    """
+
+    def initialize(self, cache):
+        super(MetricsHandler, self).initialize()
+
+        self._logger = logging.getLogger(MetricsHandler.__name__)
+        self._cache = cache
+
+    def get(self, *args, **kwargs):
+        # Make the snapshot of this process up to date.
+        openwifi.helpers.metrics.publish(self._cache)
+        self.set_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.write(openwifi.helpers.metrics.render(openwifi.helpers.metrics.collect(self._cache)))
@@ -0,0 +1,19 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+
+import openwifi.web.handlers.static_file_handler
+
+
+class SnapshotFileHandler(openwifi.web.handlers.static_file_handler.StaticFileHandler):
+    """
+    Serves dataset snapshot files.
+
+    Snapshot file names are unique, so the name is used as the version
+    instead of hashing the whole file.
+    """
+
+    @classmethod
+    def get_content_version(cls, abspath):
+        return os.path.basename(abspath)
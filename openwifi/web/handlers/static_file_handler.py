@@ -1,24 +1,187 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
+import gzip
+import hashlib
+import logging
+import mimetypes
+import os
+
 import tornado.web
 
+try:
+    # noinspection PyUnresolvedReferences
+    import brotli
+except ImportError:
+    brotli = None
+
 
 class StaticFileHandler(tornado.web.StaticFileHandler):
     """
     StaticFileHandler wrapper. Improves Page Speed.
+
+    Small files and their precompressed variants are held in memory.
+    Large files are streamed from disk by the base class.
     """
 
     _CACHE_TIME = 60 * 60 * 24 * 10
 
+    # Files up to this size are held in memory.
+    _MAX_MEMORY_FILE_SIZE = 256 * 1024
+    # Compressed variant is kept only if it saves at least this ratio.
+    _MIN_COMPRESSION_RATIO = 0.1
+    # Compressible types in addition to text/*.
+    _COMPRESSIBLE_TYPES = {
+        "application/javascript",
+        "application/json",
+        "image/svg+xml",
+        "image/vnd.microsoft.icon",
+        "image/x-icon",
+    }
+
+    _URL_PREFIX = "/static/"
+
+    _root = None
+    # Content versions by absolute path.
+    _versions = dict()
+    # Content variants by absolute path and content encoding.
+    _variants = dict()
+
+    _logger = logging.getLogger("StaticFileHandler")
+
+    @classmethod
+    def preload(cls, root):
+        """
+        Reads small files into memory, precompresses them and computes
+        versions of all the files under the root.
+        """
+
+        cls._root = os.path.abspath(root)
+        memory_size = 0
+        for directory_path, directory_names, file_names in os.walk(cls._root):
+            for file_name in file_names:
+                abspath = os.path.join(directory_path, file_name)
+                cls._versions[abspath] = cls._hash_file(abspath)
+                if os.path.getsize(abspath) > cls._MAX_MEMORY_FILE_SIZE:
+                    continue
+                with open(abspath, "rb") as file:
+                    content = file.read()
+                cls._variants[abspath] = variants = {"identity": content}
+                if cls._is_compressible(abspath):
+                    compressed_variants = {"gzip": gzip.compress(content, 9)}
+                    if brotli is not None:
+                        compressed_variants["br"] = brotli.compress(content)
+                    for encoding, variant in compressed_variants.items():
+                        if len(variant) <= (1.0 - cls._MIN_COMPRESSION_RATIO) * len(content):
+                            variants[encoding] = variant
+                memory_size += sum(map(len, variants.values()))
+        cls._logger.info("Preloaded %s files, %.1f KiB in memory.", len(cls._variants), memory_size / 1024.0)
+
+    @classmethod
+    def get_url(cls, path):
+        """
+        Gets the content-hashed URL of the file relative to the root.
+        """
+
+        version = cls._versions.get(os.path.join(cls._root, path))
+        if version is None:
+            return cls._URL_PREFIX + path
+        return "%s%s?v=%s" % (cls._URL_PREFIX, path, version[:32])
+
+    def validate_absolute_path(self, root, absolute_path):
+        absolute_path = super(StaticFileHandler, self).validate_absolute_path(root, absolute_path)
+        self._content_encoding = self._negotiate_encoding(absolute_path)
+        return absolute_path
+
+    def get_content(self, abspath, start=None, end=None):
+        """
+        Gets the negotiated variant from memory if possible.
+        """
+
+        variants = self._variants.get(abspath)
+        if variants is None:
+            return super(StaticFileHandler, self).get_content(abspath, start, end)
+        return variants[self._content_encoding][start:end]
+
+    def get_content_size(self):
+        variants = self._variants.get(self.absolute_path)
+        if variants is None:
+            return super(StaticFileHandler, self).get_content_size()
+        return len(variants[self._content_encoding])
+
+    @classmethod
+    def get_content_version(cls, abspath):
+        version = cls._versions.get(abspath)
+        if version is None:
+            cls._versions[abspath] = version = cls._hash_file(abspath)
+        return version
+
+    def compute_etag(self):
+        etag = super(StaticFileHandler, self).compute_etag()
+        if etag is not None and self._content_encoding != "identity":
+            # Strong ETags should differ between encodings.
+            etag = '%s-%s"' % (etag[:-1], self._content_encoding)
+        return etag
+
     def get_cache_time(self, path, modified, mime_type):
         """
         Gets cache time in seconds.
         """
+
+        if self._is_versioned():
+            return self.CACHE_MAX_AGE
         return self._CACHE_TIME
 
     def set_extra_headers(self, path):
         self.set_header("Vary", "Accept-Encoding")
+        if self._content_encoding != "identity":
+            self.set_header("Content-Encoding", self._content_encoding)
+        if self._is_versioned():
+            # Content-hashed URL never changes its content.
+            self.set_header("Cache-Control", "max-age=%d, immutable" % self.CACHE_MAX_AGE)
         # Tell browser that our JSON is UTF-8 encoded.
         if path.endswith(".json"):
-            self.set_header("Content-Type", "application/json; charset=UTF-8")
\ No newline at end of file
+            self.set_header("Content-Type", "application/json; charset=UTF-8")
+
+    def _is_versioned(self):
+        """
+        Checks if the URL has the current content hash as get_url makes it.
+        """
+
+        version = self.get_query_argument("v", None)
+        return version is not None and version == self.get_content_version(self.absolute_path)[:32]
+
+    def _negotiate_encoding(self, abspath):
+        """
+        Chooses the best available variant accepted by the client.
+        """
+
+        variants = self._variants.get(abspath)
+        if not variants:
+            return "identity"
+        accepted_encodings = set()
+        for value in self.request.headers.get("Accept-Encoding", "").split(","):
+            encoding, _, parameters = value.partition(";")
+            if parameters.replace(" ", "") not in ("q=0", "q=0.0", "q=0.00", "q=0.000"):
+                accepted_encodings.add(encoding.strip())
+        for encoding in ("br", "gzip"):
+            if encoding in variants and encoding in accepted_encodings:
+                return encoding
+        return "identity"
+
+    @classmethod
+    def _is_compressible(cls, abspath):
+        mime_type, encoding = mimetypes.guess_type(abspath)
+        return (
+            encoding is None and
+            mime_type is not None and
+            (mime_type.startswith("text/") or mime_type in cls._COMPRESSIBLE_TYPES)
+        )
+
+    @staticmethod
+    def _hash_file(abspath):
+        hasher = hashlib.sha512()
+        with open(abspath, "rb") as file:
+            for chunk in iter(lambda: file.read(64 * 1024), b""):
+                hasher.update(chunk)
+        return hasher.hexdigest()
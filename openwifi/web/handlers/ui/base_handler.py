@@ -14,16 +14,35 @@ class BaseHandler(openwifi.web.handlers.base_handler.BaseHandler):
     Base request handler for user interface.
     """
 
+    _TEMPLATES_PATH = os.path.abspath(
+        os.path.join(
+            os.path.dirname(openwifi.static.__file__),
+            "templates",
+        ),
+    )
+    _TEMPLATE_EXTENSION = "mustache"
+
+    # Template sources by name. Used for partials.
+    _sources = dict()
+    # Parsed templates by name.
+    _templates = dict()
+
     _renderer = pystache.Renderer(
         file_encoding="utf-8",
         string_encoding="utf-8",
-        search_dirs=[
-            os.path.abspath(
-                os.path.join(
-                    os.path.dirname(openwifi.static.__file__),
-                    "templates",
-                ),
-            ),
-        ],
-        file_extension="mustache",
-    )
\ No newline at end of file
+        search_dirs=[_TEMPLATES_PATH],
+        file_extension=_TEMPLATE_EXTENSION,
+        partials=_sources,
+    )
+
+    @classmethod
+    def load_templates(cls):
+        """
+        Loads and parses all the templates.
+        """
+
+        for file_name in os.listdir(cls._TEMPLATES_PATH):
+            name, extension = os.path.splitext(file_name)
+            if extension == "." + cls._TEMPLATE_EXTENSION:
+                cls._sources[name] = cls._renderer.load_template(name)
+                cls._templates[name] = pystache.parse(cls._sources[name])
@@ -1,27 +1,38 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
+import hashlib
 import logging
 
 import tornado.locale
 import tornado.web
 
 import openwifi.helpers
+import openwifi.web.handlers.static_file_handler
 import openwifi.web.handlers.ui.base_handler
 
 
 class TemplateHandler(openwifi.web.handlers.ui.base_handler.BaseHandler):
     """
     Request handler that renders a template.
+
+    Rendered pages are cached by template, locale and statistics values.
     """
 
+    # Maximum number of cached pages.
+    _MAX_PAGES = 64
+
+    # Rendered pages and their ETags by (template name, locale code, statistics values).
+    _pages = dict()
+
     # noinspection PyMethodOverriding
-    def initialize(self, db, template_name):
+    def initialize(self, cache, template_name):
         super(TemplateHandler, self).initialize()
 
         self._logger = logging.getLogger(TemplateHandler.__name__)
         self._template_name = template_name
-        self._db = db
+        self._cache = cache
+        self._etag = None
 
     def prepare(self):
         super(TemplateHandler, self).prepare()
@@ -31,9 +42,32 @@ class TemplateHandler(openwifi.web.handlers.ui.base_handler.BaseHandler):
     @tornado.web.removeslash
     def get(self, *args, **kwargs):
         self._logger.debug("Request locale: %s", self.locale.code)
-        self.write(self._renderer.render_name(
+        statistics = openwifi.helpers.Statistics(self._cache)
+        key = (
             self._template_name,
-            # Translate function.
-            t=self.locale.translate,
-            statistics=openwifi.helpers.Statistics(self._db),
-        ))
+            self.locale.code,
+            statistics.ssid_count,
+            statistics.bssid_count,
+        )
+        page = self._pages.get(key)
+        if page is None:
+            self._logger.debug("Rendering %s.", key)
+            body = self._renderer.render(
+                self._templates[self._template_name],
+                # Translate function.
+                t=self.locale.translate,
+                # Content-hashed static file URL function.
+                static=openwifi.web.handlers.static_file_handler.StaticFileHandler.get_url,
+                statistics=statistics,
+            ).encode("utf-8")
+            page = (body, '"%s"' % hashlib.sha1(body).hexdigest())
+            if len(self._pages) >= self._MAX_PAGES:
+                # Pages of outdated statistics are never used again.
+                self._pages.clear()
+            self._pages[key] = page
+        body, self._etag = page
+        # Tornado responds with 304 if the ETag matches.
+        self.write(body)
+
+    def compute_etag(self):
+        return self._etag
@@ -6,18 +6,43 @@ import os
 
 import tornado.web
 
+import openwifi.helpers.metrics
 import openwifi.static
 import openwifi.web
 import openwifi.web.handlers.api.check_handler
 import openwifi.web.handlers.api.info_handler
+import openwifi.web.handlers.api.locate_handler
+import openwifi.web.handlers.api.nearest_networks_handler
+import openwifi.web.handlers.api.networks_handler
 import openwifi.web.handlers.api.scan_results_handler
+import openwifi.web.handlers.api.snapshots_handler
+import openwifi.web.handlers.api.tiles_handler
+import openwifi.web.handlers.metrics_handler
+import openwifi.web.handlers.snapshot_file_handler
 import openwifi.web.handlers.static_file_handler
 import openwifi.web.handlers.ui.template_handler
 
 
 class WebApplication(tornado.web.Application):
-    def __init__(self, db, cache, enable_gzip=False):
+    def __init__(
+        self,
+        db,
+        cache,
+        executor,
+        ingestor,
+        ingest_queue,
+        watermark,
+        rate_limiter,
+        spatial_index,
+        locator,
+        token_info_url,
+        max_upload_size,
+        snapshots_path,
+        enable_gzip=False,
+    ):
         static_files_path = os.path.abspath(os.path.dirname(openwifi.static.__file__))
+        openwifi.web.handlers.static_file_handler.StaticFileHandler.preload(static_files_path)
+        openwifi.web.handlers.ui.template_handler.TemplateHandler.load_templates()
 
         super(WebApplication, self).__init__(
             handlers=[(
@@ -26,11 +51,11 @@ class WebApplication(tornado.web.Application):
             ), (
                 r"/",
                 openwifi.web.handlers.ui.template_handler.TemplateHandler,
-                {"template_name": "home", "db": db},
+                {"template_name": "home", "cache": cache},
             ), (
                 r"/download",
                 openwifi.web.handlers.ui.template_handler.TemplateHandler,
-                {"template_name": "download", "db": db},
+                {"template_name": "download", "cache": cache},
             ), (
                 r"/(robots.txt)",
                 openwifi.web.handlers.static_file_handler.StaticFileHandler,
@@ -46,17 +71,62 @@ class WebApplication(tornado.web.Application):
             ), (
                 r"/api/scan-results/",
                 openwifi.web.handlers.api.scan_results_handler.ScanResultsHandler,
-                {"db": db, "cache": cache},
+                {
+                    "db": db,
+                    "cache": cache,
+                    "executor": executor,
+                    "ingestor": ingestor,
+                    "ingest_queue": ingest_queue,
+                    "watermark": watermark,
+                },
             ), (
                 r"/api/scan-results/([0-9a-fA-F]{24})/(\d+)/",
                 openwifi.web.handlers.api.scan_results_handler.ScanResultsHandler,
-                {"db": db, "cache": cache},
+                {
+                    "db": db,
+                    "cache": cache,
+                    "executor": executor,
+                    "ingestor": ingestor,
+                    "ingest_queue": ingest_queue,
+                    "watermark": watermark,
+                },
+            ), (
+                r"/api/locate/",
+                openwifi.web.handlers.api.locate_handler.LocateHandler,
+                {"cache": cache, "locator": locator},
+            ), (
+                r"/api/networks/nearest/",
+                openwifi.web.handlers.api.nearest_networks_handler.NearestNetworksHandler,
+                {"cache": cache, "spatial_index": spatial_index},
+            ), (
+                r"/api/networks/([0-9a-fA-F]{24})/(\d+)/",
+                openwifi.web.handlers.api.networks_handler.NetworksHandler,
+                {"db": db, "cache": cache, "executor": executor},
+            ), (
+                r"/api/tiles/",
+                openwifi.web.handlers.api.tiles_handler.TilesHandler,
+                {"db": db, "cache": cache, "executor": executor},
+            ), (
+                r"/api/snapshots/",
+                openwifi.web.handlers.api.snapshots_handler.SnapshotsHandler,
+                {"cache": cache, "snapshots_path": snapshots_path},
+            ), (
+                r"/snapshots/(.*)",
+                openwifi.web.handlers.snapshot_file_handler.SnapshotFileHandler,
+                {"path": snapshots_path},
+            ), (
+                r"/metrics",
+                openwifi.web.handlers.metrics_handler.MetricsHandler,
+                {"cache": cache},
             ), (
                 r"/api/info/",
                 openwifi.web.handlers.api.info_handler.InfoHandler,
                 {"cache": cache},
             )],
             gzip=enable_gzip,
+            max_upload_size=max_upload_size,
+            rate_limiter=rate_limiter,
+            token_info_url=token_info_url,
         )
 
         self._logger = logging.getLogger(WebApplication.__name__)
@@ -66,6 +136,12 @@ class WebApplication(tornado.web.Application):
         Overrides the default function in order to customize log messages.
         """
 
+        openwifi.helpers.metrics.REQUEST_TIME.observe(
+            handler.request.request_time(),
+            handler.__class__.__name__,
+            handler.request.method,
+            str(handler.get_status()),
+        )
         if "log_function" in self.settings:
             self.settings["log_function"](handler)
             return